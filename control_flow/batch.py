@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+  Batch analysis of directories of .py and .pyc files
+
+  Every code object found is analyzed in a pool of worker processes.
+  The largest code objects are scheduled first so that a big function
+  started late doesn't hold up the end of the run, and small code
+  objects are grouped into chunks so that they don't drown in
+  inter-process overhead. Results are streamed back as they finish.
+
+  The analysis keeps no global state, so a pool of threads can be used
+  instead. That pays off on a free-threaded (no-GIL) Python.
+
+  :copyright: (c) 2018 by Rocky Bernstein
+"""
+
+from __future__ import print_function
+
+import marshal
+import os
+import sys
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait)
+from multiprocessing import cpu_count
+from types import CodeType
+
+from control_flow.cache import code_key
+from control_flow.module import (
+    CodeAnalysis, analysis_record, analyze_code, code_objects, load_code)
+from control_flow.structured_cf import StructureStats
+
+# Code objects smaller than this many bytes of bytecode are grouped
+# into chunks of about this size. Each chunk is one task for a worker.
+CHUNK_SIZE = 4096
+
+# Tasks queued per worker beyond the one it is running. This keeps
+# the workers busy without packing the whole corpus into the queue.
+TASKS_AHEAD = 2
+
+
+def find_files(paths):
+    """Yield the .py and .pyc files in `paths`, recursing into
+    directories. A file reached more than once, as with overlapping
+    arguments like "pkg pkg/mod.py", is only yielded the first time."""
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(('.py', '.pyc')):
+                        found.append(os.path.join(dirpath, filename))
+                        pass
+                    pass
+                pass
+        else:
+            found = [path]
+            pass
+        for filename in found:
+            real_path = os.path.realpath(filename)
+            if real_path not in seen:
+                seen.add(real_path)
+                yield filename
+            pass
+        pass
+    return
+
+
+def pack_code(co):
+    """Code objects can't be pickled, so marshal native ones.
+    Cross-version code objects from xdis are plain objects and are
+    pickled as they are."""
+    if isinstance(co, CodeType):
+        return marshal.dumps(co)
+    return co
+
+
+def unpack_code(packed):
+    if isinstance(packed, bytes):
+        return marshal.loads(packed)
+    return packed
+
+
+def make_chunks(items, chunk_size=CHUNK_SIZE):
+    """Group `items`, a list of (size, ...) tuples, into chunks,
+    largest items first. An item of `chunk_size` or more is a chunk by
+    itself; smaller ones are packed until the chunk reaches
+    `chunk_size`."""
+    chunks = []
+    chunk = []
+    chunk_total = 0
+    for item in sorted(items, key=lambda item: item[0], reverse=True):
+        size = item[0]
+        if size >= chunk_size:
+            chunks.append([item])
+            continue
+        chunk.append(item)
+        chunk_total += size
+        if chunk_total >= chunk_size:
+            chunks.append(chunk)
+            chunk = []
+            chunk_total = 0
+            pass
+        pass
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def error_record(name, e):
+    analysis = CodeAnalysis(name, None)
+    analysis.error = e
+    return analysis_record(analysis)
+
+
+def analyze_chunk(chunk, collect_stats=False):
+    """Worker side: analyze a chunk of (path, name, version, is_pypy,
+    packed code, cache key) and return a list of (path, name, record,
+    cache key), and the StructureStats of the chunk if `collect_stats`
+    is true or else None. The cache key is just passed through."""
+    results = []
+    stats = StructureStats() if collect_stats else None
+    for path, name, version, is_pypy, packed, key in chunk:
+        if stats is not None:
+            stats.begin('%s: %s' % (path, name))
+        try:
+            analysis = analyze_code(name, unpack_code(packed), version, is_pypy,
+                                    tracer=stats)
+            record = analysis_record(analysis)
+        except Exception as e:
+            record = error_record(name, e)
+            pass
+        results.append((path, name, record, key))
+        pass
+    return results, stats
+
+
+def analyze_paths(paths, max_workers=None, chunk_size=CHUNK_SIZE,
+                  cache=None, use_threads=False, stats=None):
+    """Analyze every code object in the .py and .pyc files in `paths`.
+
+    This is a generator yielding (path, qualified name, record) as
+    results come in, where record is as described in
+    module.analysis_record(). A file that can't be loaded gives a
+    single result with name None and an error record.
+
+    If `cache` is an AnalysisCache, records found there are returned
+    straight away without being analyzed, and new records are added
+    to it.
+
+    If `use_threads` is true, work is done in a thread pool rather than
+    a process pool.
+
+    If `stats` is a StructureStats, the stats of control structuring in
+    the workers are merged into it. Code objects found in the cache
+    aren't counted.
+    """
+    items = []
+    for path in find_files(paths):
+        try:
+            version, is_pypy, code = load_code(path)
+        except Exception as e:
+            yield path, None, error_record(None, e)
+            continue
+        for name, co in code_objects(code):
+            key = None
+            if cache is not None:
+                key = code_key(co, version, is_pypy)
+                record = cache.get(key, name)
+                if record is not None:
+                    yield path, name, record
+                    continue
+                pass
+            items.append((len(co.co_code), path, name, version, is_pypy, co, key))
+            pass
+        pass
+
+    if not items:
+        return
+    if max_workers is None:
+        max_workers = cpu_count()
+    chunks = iter(make_chunks(items, chunk_size))
+    del items
+
+    if use_threads:
+        Executor = ThreadPoolExecutor
+        # Threads share the code objects; no need to marshal them.
+        pack = lambda co: co
+    else:
+        Executor = ProcessPoolExecutor
+        pack = pack_code
+
+    def submit(executor, chunk):
+        return executor.submit(analyze_chunk,
+                               [(path, name, version, is_pypy, pack(co), key)
+                                for size, path, name, version, is_pypy, co, key
+                                in chunk],
+                               stats is not None)
+
+    with Executor(max_workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(submit(executor, chunk))
+            if len(pending) >= max_workers * (1 + TASKS_AHEAD):
+                break
+            pass
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for chunk in chunks:
+                    pending.add(submit(executor, chunk))
+                    break
+                results, chunk_stats = future.result()
+                if stats is not None:
+                    stats.merge(chunk_stats)
+                for path, name, record, key in results:
+                    if key is not None:
+                        cache.put(key, record)
+                    yield path, name, record
+                    pass
+                pass
+            pass
+        pass
+    return
+
+
+def main(args=sys.argv[1:]):
+    """Analyze the files and directories in `args`. With --stats,
+    show a summary of control structuring at the end."""
+    stats = None
+    if '--stats' in args:
+        args = [arg for arg in args if arg != '--stats']
+        stats = StructureStats()
+    errors = count = 0
+    for path, name, record in analyze_paths(args, stats=stats):
+        count += 1
+        if record['error']:
+            errors += 1
+            print("%s: %s: %s" % (path, name, record['error']))
+        else:
+            print("%s: %s: %d blocks" % (path, name, len(record['blocks'])))
+            pass
+        pass
+    print("%d code objects, %d errors." % (count, errors))
+    if stats is not None:
+        print(stats.summary(), end='')
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,13 @@
 #!/usr/bin/env python
 import sys
-from xdis import PYTHON_VERSION, PYTHON3, next_offset
-from xdis.std import get_instructions
+from array import array
+from xdis import PYTHON3, next_offset
+from xdis.bytecode import get_instructions_bytes
 from control_flow.graph import (BB_POP_BLOCK, BB_SINGLE_POP_BLOCK, BB_STARTS_POP_BLOCK,
                                 BB_EXCEPT, BB_ENTRY, BB_TRY, BB_EXIT,
                                 BB_FINALLY, BB_END_FINALLY, BB_FOR, BB_BREAK,
                                 BB_JUMP_CONDITIONAL, BB_JUMP_UNCONDITIONAL, BB_JUMP_TO_FALLTHROUGH,
-                                BB_LOOP, BB_NOFOLLOW)
+                                BB_LOOP, BB_NOFOLLOW, flag_set)
 
 # The byte code versions we support
 PYTHON_VERSIONS = (# 1.5,
@@ -15,7 +16,25 @@ PYTHON_VERSIONS = (# 1.5,
                    # 3.0, 3.1, 3.2, 3.3
                    3.4, 3.5, 3.6, 3.7)
 
-end_bb = -1
+EMPTY_SET = frozenset()
+
+# Opcode classification bits. OpcodeInfo.classes gives these for
+# each opcode, so that basic_blocks() can classify an instruction
+# with a single table lookup.
+OP_LOOP               = 0x0001
+OP_BREAK              = 0x0002
+OP_JUMP_CONDITIONAL   = 0x0004
+OP_POP_BLOCK          = 0x0008
+OP_EXCEPT             = 0x0010
+OP_TRY                = 0x0020
+OP_END_FINALLY        = 0x0040
+OP_FOR                = 0x0080
+OP_JABS               = 0x0100
+OP_JREL               = 0x0200
+OP_JUMP_UNCONDITIONAL = 0x0400
+OP_FINALLY            = 0x0800
+OP_NOFOLLOW           = 0x1000
+OP_JUMP = OP_JABS | OP_JREL
 
 class BasicBlock(object):
   """Basic block from the bytecode.
@@ -27,16 +46,27 @@ class BasicBlock(object):
        * exception-targets offsets,
        * flags that classify flow information in the block,
        * a graph node,
-       * predecessor and successor sets, filled in a later phase
+       * predecessor and successor block numbers, filled in a later phase
        * some layout information for dot graphing
+
+     There can be a great many of these, so the representation is kept
+     compact: attributes are slots, flags are a shared FlagSet, and
+     offsets and edges are small tuples of ints.
   """
 
+  __slots__ = ('start_offset', 'end_offset', 'follow_offset', 'loop_offset',
+               'jump_offsets', 'exception_offsets', 'flags',
+               'predecessor_numbers', 'successor_numbers', 'bb_list',
+               'unreachable', 'number', 'edge_count',
+               # Filled in by the dominators module
+               'dom_set', 'pdom_set', 'doms', 'pdoms', 'reach_offset')
+
   def __init__(self, start_offset, end_offset, follow_offset,
                loop_offset,
                flags = set(),
-               jump_offsets=set()):
-
-    global end_bb
+               jump_offsets=set(),
+               bb_list=None,
+               number=None):
 
     # The offset of the first and last instructions of the basic block.
     self.start_offset = start_offset
@@ -59,32 +89,64 @@ class BasicBlock(object):
     # Jump offsets is the targets of all of the jump instructions
     # inside the basic block. Note that jump offsets can come from
     # things SETUP_.. operations as well as JUMP instructions
-    self.jump_offsets = jump_offsets
-    self.exception_offsets = set()
+    self.jump_offsets = tuple(sorted(jump_offsets))
+    self.exception_offsets = ()
 
     # flags is a set of interesting bits about the basic block.
     # Elements of the bits are BB_... constants
-    self.flags = flags
-    self.index = (start_offset, end_offset)
+    self.flags = flag_set(flags)
 
-    # Lists of predecessor and successor bacic blocks
-    # This is computed in cfg.
-    self.predecessors = set()
-    self.successors = set()
+    # Predecessor and successor basic block numbers, that is indices
+    # into bb_list. This is computed in cfg, in lists that are then
+    # frozen to tuples.
+    self.predecessor_numbers = ()
+    self.successor_numbers = ()
+    self.bb_list = bb_list
 
     # List of blocks we dominiate is empty
-    self.dom_set = set()
+    self.dom_set = EMPTY_SET
 
     # Set true if this is dead code, or unreachable
     self.unreachable = False
-    self.number = end_bb
-    self.edge_count = len(jump_offsets)
+    # Blocks are numbered in the order they are added to bb_list
+    if number is None:
+      number = -1 if bb_list is None else len(bb_list)
+    self.number = number
+    self.edge_count = len(self.jump_offsets)
     if (follow_offset is not None and not
         BB_NOFOLLOW in self.flags):
         self.edge_count += 1
 
-    end_bb += 1
-
+  @property
+  def index(self):
+      return (self.start_offset, self.end_offset)
+
+  @property
+  def flagbits(self):
+      """The flags as an int bitmask"""
+      return self.flags.bits
+
+  @property
+  def predecessors(self):
+      bb_list = self.bb_list
+      return tuple([bb_list[i] for i in self.predecessor_numbers])
+
+  @property
+  def successors(self):
+      bb_list = self.bb_list
+      return tuple([bb_list[i] for i in self.successor_numbers])
+
+  def add_successor(self, block):
+      """Record a flow edge from this block to ``block``. This is only
+      done while the flow graph is built, when the edges are lists, so
+      that a block with many predecessors isn't copied for each one."""
+      if block.number not in self.successor_numbers:
+          self.successor_numbers.append(block.number)
+          block.predecessor_numbers.append(self.number)
+
+  def add_exception_offset(self, offset):
+      if offset not in self.exception_offsets:
+          self.exception_offsets = tuple(sorted(self.exception_offsets + (offset,)))
 
   # A nice print routine for a Basic block
   def __repr__(self):
@@ -105,90 +167,125 @@ class BasicBlock(object):
                  self.edge_count, jump_text, exception_text))
 
 
-class BBMgr(object):
+def opcode_module(version, is_pypy):
+  """Return the xdis opcode module for bytecode `version`. PyPy has
+  some opcodes of its own, so use its variant of the module if there
+  is one."""
+  name = 'xdis.opcodes.opcode_%s' % str(version).replace('.', '')
+  if is_pypy:
+    try:
+      __import__(name + 'pypy')
+      return sys.modules[name + 'pypy']
+    except ImportError:
+      pass
+  __import__(name)
+  return sys.modules[name]
+
+
+def opmap_set(opcode, *names):
+  """The set of opcodes for those of `names` that `opcode` has"""
+  return set([opcode.opmap[name] for name in names if name in opcode.opmap])
+
+
+class OpcodeInfo(object):
+  """The classification of the opcodes of one bytecode version that
+  basic_blocks() uses.
+
+  Use get_opcode_info() rather than creating these directly; it
+  builds just one per bytecode version.
+  """
 
   def __init__(self, version, is_pypy):
-    global end_bb
-    end_bb = 0
+    # Pick up appropriate version. This is the version of the bytecode
+    # which need not be the version of the running interpreter.
+    if version not in PYTHON_VERSIONS:
+      raise RuntimeError("Version %s not supported yet" % version)
+    self.opcode = opcode = opcode_module(version, is_pypy)
+
+    # We classify intructions into various categories (even though
+    # many of the below contain just one instruction). This can
+    # isolate us from instruction changes in Python.
+    # The classifications are used in setting basic block flag bits
+    self.POP_BLOCK_INSTRUCTIONS   = set([opcode.opmap['POP_BLOCK']])
+    self.TRY_INSTRUCTIONS         = set([opcode.opmap['SETUP_EXCEPT']])
+    self.END_FINALLY_INSTRUCTIONS = set([opcode.opmap['END_FINALLY']])
+    self.FINALLY_INSTRUCTIONS     = set([opcode.opmap['SETUP_FINALLY']])
+    self.FOR_INSTRUCTIONS         = set([opcode.opmap['FOR_ITER']])
+    self.JREL_INSTRUCTIONS        = set(opcode.hasjrel)
+    self.JABS_INSTRUCTIONS        = set(opcode.hasjabs)
+    self.JUMP_INSTRUCTIONS        = self.JABS_INSTRUCTIONS | self.JREL_INSTRUCTIONS
+    self.JUMP_UNCONDITONAL        = set([opcode.opmap['JUMP_ABSOLUTE'],
+                                         opcode.opmap['JUMP_FORWARD']])
+    # Python 2.6 has JUMP_IF_FALSE and JUMP_IF_TRUE instead of the
+    # POP_JUMP_IF_... and ..._OR_POP instructions.
+    self.JUMP_CONDITONAL          = opmap_set(opcode,
+                                              'POP_JUMP_IF_FALSE',
+                                              'POP_JUMP_IF_TRUE',
+                                              'JUMP_IF_FALSE_OR_POP',
+                                              'JUMP_IF_TRUE_OR_POP',
+                                              'JUMP_IF_FALSE',
+                                              'JUMP_IF_TRUE')
+    self.LOOP_INSTRUCTIONS        = set([opcode.opmap['SETUP_LOOP']])
+    # ??
+    #                                   opcode.opmap['YIELD_VALUE'],
+    #                                   opcode.opmap['RAISE_VARARGS']])
+    self.BREAK_INSTRUCTIONS       = set([opcode.opmap['BREAK_LOOP']])
+
+    if version >= 3.0:
+      self.EXCEPT_INSTRUCTIONS    = set([opcode.opmap['POP_EXCEPT']])
+      self.NOFOLLOW_INSTRUCTIONS  = opcode.NOFOLLOW
+    else:
+      # In Python 2 a handler starts with POP_TOPs; see basic_blocks().
+      self.EXCEPT_INSTRUCTIONS    = set([opcode.opmap['POP_TOP']])
+      self.NOFOLLOW_INSTRUCTIONS  = set([opcode.opmap['RETURN_VALUE'],
+                                         opcode.opmap['YIELD_VALUE'],
+                                         opcode.opmap['RAISE_VARARGS']])
+      pass
+
+    # The above as a table of OP_... bits indexed by opcode
+    self.classes = classes = [0] * 256
+    for bit, ops in ((OP_LOOP,               self.LOOP_INSTRUCTIONS),
+                     (OP_BREAK,              self.BREAK_INSTRUCTIONS),
+                     (OP_JUMP_CONDITIONAL,   self.JUMP_CONDITONAL),
+                     (OP_POP_BLOCK,          self.POP_BLOCK_INSTRUCTIONS),
+                     (OP_EXCEPT,             self.EXCEPT_INSTRUCTIONS),
+                     (OP_TRY,                self.TRY_INSTRUCTIONS),
+                     (OP_END_FINALLY,        self.END_FINALLY_INSTRUCTIONS),
+                     (OP_FOR,                self.FOR_INSTRUCTIONS),
+                     (OP_JABS,               self.JABS_INSTRUCTIONS),
+                     (OP_JREL,               self.JREL_INSTRUCTIONS),
+                     (OP_JUMP_UNCONDITIONAL, self.JUMP_UNCONDITONAL),
+                     (OP_FINALLY,            self.FINALLY_INSTRUCTIONS),
+                     (OP_NOFOLLOW,           self.NOFOLLOW_INSTRUCTIONS)):
+      for op in ops:
+        classes[op] |= bit
+
+
+# OpcodeInfo for each (version, is_pypy) seen so far
+_opcode_infos = {}
+
+def get_opcode_info(version, is_pypy):
+  """Return the OpcodeInfo for bytecode `version`. This is built
+  once and then shared by everything in the process."""
+  key = (version, is_pypy)
+  opcode_info = _opcode_infos.get(key)
+  if opcode_info is None:
+    opcode_info = _opcode_infos.setdefault(key, OpcodeInfo(version, is_pypy))
+  return opcode_info
+
+
+class BBMgr(object):
+
+  def __init__(self, version, is_pypy, opcode_info=None):
     self.bb_list = []
     self.exit_block = None
 
-    # Pick up appropriate version
-    if version in PYTHON_VERSIONS:
-      if PYTHON3:
-        if PYTHON_VERSION in (3.4, 3.5, 3.6, 3.7):
-          if PYTHON_VERSION == 3.4:
-            import xdis.opcodes.opcode_34 as opcode
-          elif PYTHON_VERSION == 3.5:
-            import xdis.opcodes.opcode_35 as opcode
-          elif PYTHON_VERSION == 3.6:
-            import xdis.opcodes.opcode_36 as opcode
-          else:
-            import xdis.opcodes.opcode_37 as opcode
-          self.opcode = opcode
-          # We classify intructions into various categories (even though
-          # many of the below contain just one instruction). This can
-          # isolate us from instruction changes in Python.
-          # The classifications are used in setting basic block flag bits
-          self.POP_BLOCK_INSTRUCTIONS   = set([opcode.opmap['POP_BLOCK']])
-          self.EXCEPT_INSTRUCTIONS      = set([opcode.opmap['POP_EXCEPT']])
-          self.TRY_INSTRUCTIONS         = set([opcode.opmap['SETUP_EXCEPT']])
-          self.END_FINALLY_INSTRUCTIONS = set([opcode.opmap['END_FINALLY']])
-          self.FINALLY_INSTRUCTIONS     = set([opcode.opmap['SETUP_FINALLY']])
-          self.FOR_INSTRUCTIONS         = set([opcode.opmap['FOR_ITER']])
-          self.JREL_INSTRUCTIONS        = set(opcode.hasjrel)
-          self.JABS_INSTRUCTIONS        = set(opcode.hasjabs)
-          self.JUMP_INSTRUCTIONS        = self.JABS_INSTRUCTIONS | self.JREL_INSTRUCTIONS
-          self.JUMP_UNCONDITONAL        = set([opcode.opmap['JUMP_ABSOLUTE'],
-                                              opcode.opmap['JUMP_FORWARD']])
-          self.JUMP_CONDITONAL          = set([opcode.opmap['POP_JUMP_IF_FALSE'],
-                                               opcode.opmap['POP_JUMP_IF_TRUE'],
-                                               opcode.opmap['JUMP_IF_FALSE_OR_POP'],
-                                               opcode.opmap['JUMP_IF_TRUE_OR_POP']])
-
-          self.LOOP_INSTRUCTIONS        = set([opcode.opmap['SETUP_LOOP']])
-          # ??
-          #                                   opcode.opmap['YIELD_VALUE'],
-          #                                   opcode.opmap['RAISE_VARARGS']])
-          self.BREAK_INSTRUCTIONS       = set([opcode.opmap['BREAK_LOOP']])
-          self.NOFOLLOW_INSTRUCTIONS    = opcode.NOFOLLOW
-
-      else:
-        if PYTHON_VERSION in (2.6, 2.7):
-          if PYTHON_VERSION == 2.7:
-            import xdis.opcodes.opcode_27 as opcode
-          else:
-            import xdis.opcodes.opcode_26 as opcode
-          self.opcode = opcode
-          # We classify intructions into various categories (even though
-          # many of the below contain just one instruction). This can
-          # isolate us from instruction changes in Python.
-          # The classifications are used in setting basic block flag bits
-          self.POP_BLOCK_INSTRUCTIONS  = set([opcode.opmap['POP_BLOCK']])
-          self.EXCEPT_INSTRUCTIONS     = set([opcode.opmap['POP_TOP']])
-          self.TRY_INSTRUCTIONS        = set([opcode.opmap['SETUP_EXCEPT']])
-          self.FINALLY_INSTRUCTIONS    = set([opcode.opmap['SETUP_FINALLY']])
-          self.END_FINALLY_INSTRUCTIONS = set([opcode.opmap['END_FINALLY']])
-          self.FOR_INSTRUCTIONS        = set([opcode.opmap['FOR_ITER']])
-          self.JREL_INSTRUCTIONS       = set(opcode.hasjrel)
-          self.JABS_INSTRUCTIONS       = set(opcode.hasjabs)
-          self.JUMP_INSTRUCTIONS       = self.JABS_INSTRUCTIONS | self.JREL_INSTRUCTIONS
-          self.JUMP_UNCONDITONAL       = set([opcode.opmap['JUMP_ABSOLUTE'],
-                                             opcode.opmap['JUMP_FORWARD']])
-          self.JUMP_CONDITONAL         = set([opcode.opmap['POP_JUMP_IF_FALSE'],
-                                              opcode.opmap['POP_JUMP_IF_TRUE'],
-                                              opcode.opmap['JUMP_IF_FALSE_OR_POP'],
-                                              opcode.opmap['JUMP_IF_TRUE_OR_POP']])
-          self.LOOP_INSTRUCTIONS       = set([opcode.opmap['SETUP_LOOP']])
-          # ??
-          #                                   opcode.opmap['YIELD_VALUE'],
-          #                                  opcode.opmap['RAISE_VARARGS']])
-          self.BREAK_INSTRUCTIONS      = set([opcode.opmap['BREAK_LOOP']])
-          self.NOFOLLOW_INSTRUCTIONS   = set([opcode.opmap['RETURN_VALUE'],
-                                             opcode.opmap['YIELD_VALUE'],
-                                             opcode.opmap['RAISE_VARARGS']])
-    else:
-      raise RuntimeError("Version %s not supported yet" % PYTHON_VERSION)
+    if opcode_info is None:
+      opcode_info = get_opcode_info(version, is_pypy)
+    self.opcode_info = opcode_info
+    # Make the opcode classification sets, e.g. JUMP_INSTRUCTIONS,
+    # available directly.
+    self.__dict__.update(opcode_info.__dict__)
 
   def add_bb(self, start_offset, end_offset, loop_offset, follow_offset, flags,
              jump_offsets):
@@ -201,7 +298,8 @@ class BBMgr(object):
                         follow_offset,
                         flags = flags,
                         jump_offsets = jump_offsets,
-                        loop_offset = loop_offset)
+                        loop_offset = loop_offset,
+                        bb_list = self.bb_list)
       self.bb_list.append(block)
 
       if BB_EXIT in flags:
@@ -214,16 +312,251 @@ class BBMgr(object):
       return block, flags, jump_offsets
 
 
-def basic_blocks(version, is_pypy, fn):
-    """Create a list of basic blocks found in a code object
+def get_code(fn):
+    """Return the code object for a function, method or code object"""
+    return getattr(fn, '__code__', fn)
+
+def decode_instructions(co_code, opc):
+    """Decode the raw bytes of a code object without creating
+    per-instruction objects.
+
+    Returns three parallel sequences: ``offsets``, ``ops`` and ``args``.
+    ``offsets`` has one more entry than ``ops``, so the offset of the
+    instruction after instruction ``i`` is always ``offsets[i+1]``.
+    ``args`` has any EXTENDED_ARG prefix folded in; its value is
+    meaningless for instructions that do not take an argument.
+    """
+    code = memoryview(co_code) if PYTHON3 else bytearray(co_code)
+    n = len(code)
+    extended_arg_op = opc.EXTENDED_ARG
+
+    if opc.version >= 3.6:
+        # Wordcode: every instruction is two bytes, so we can slice
+        # the opcodes and arguments out and only need to do more work
+        # when an EXTENDED_ARG is around.
+        ops = code[0::2]
+        args = code[1::2]
+        if extended_arg_op in ops:
+            args = array('l', args)
+            extended_arg = 0
+            for i, op in enumerate(ops):
+                arg = args[i] | extended_arg
+                args[i] = arg
+                extended_arg = (arg << 8) if op == extended_arg_op else 0
+                pass
+            pass
+        return range(0, n + 1, 2), ops, args
+
+    have_argument = opc.HAVE_ARGUMENT
+    offsets = array('l')
+    ops = array('B')
+    args = array('l')
+    extended_arg = 0
+    i = 0
+    while i < n:
+        op = code[i]
+        offsets.append(i)
+        ops.append(op)
+        if op >= have_argument:
+            arg = code[i+1] + code[i+2] * 256 + extended_arg
+            extended_arg = arg * 65536 if op == extended_arg_op else 0
+            i += 3
+        else:
+            arg = 0
+            i += 1
+        args.append(arg)
+        pass
+    offsets.append(n)
+    return offsets, ops, args
+
+
+def basic_blocks(version, is_pypy, fn, opcode_info=None):
+    """Create a list of basic blocks found in a code object.
+
+    The bytecode is decoded straight from co_code; no xdis Instruction
+    objects are created. The result is the same as
+    xdis_basic_blocks().
+
+    `opcode_info` is the OpcodeInfo for `version`; by default the
+    shared one from get_opcode_info() is used.
+    """
+
+    BB = BBMgr(version, is_pypy, opcode_info)
+    offsets, ops, args = decode_instructions(get_code(fn).co_code, BB.opcode)
+    classes = BB.classes
+
+    # Get jump targets
+    jump_targets = set()
+    for i, op in enumerate(ops):
+        op_class = classes[op]
+        if op_class & OP_JABS:
+            jump_targets.add(args[i])
+        elif op_class & OP_JREL:
+            jump_targets.add(offsets[i+1] + args[i])
+            pass
+        pass
+
+    start_offset = 0
+    end_offset = -1
+    jump_offsets = set()
+    prev_offset = -1
+    endloop_offsets = [-1]
+    flags = set([BB_ENTRY])
+    try_stack = []
+    loop_offset = None
+    is_python2 = version < 3.0
+    pop_top = BB.opcode.opmap['POP_TOP']
+
+    for i, op in enumerate(ops):
+        op_class = classes[op]
+        prev_offset = end_offset
+        offset = end_offset = offsets[i]
+        follow_offset = offsets[i+1]
+
+        if op_class & OP_LOOP:
+            endloop_offsets.append(follow_offset + args[i])
+            loop_offset = offset
+            flags.add(BB_LOOP)
+        else:
+            if offset == endloop_offsets[-1]:
+                endloop_offsets.pop()
+            if op_class & OP_BREAK:
+                flags.add(BB_BREAK)
+                jump_offsets.add(endloop_offsets[-1])
+                block, flags, jump_offsets = BB.add_bb(start_offset, end_offset,
+                                                       loop_offset, follow_offset,
+                                                       flags, jump_offsets)
+                loop_offset = None
+                if BB_TRY in block.flags:
+                    try_stack.append(block)
+                start_offset = follow_offset
+                pass
+            pass
+
+        if offset in jump_targets:
+            # Fallthrough path and jump target path.
+            # This instruction definitely starts a new basic block
+            # Close off any prior basic block
+            if start_offset < end_offset:
+                block, flags, jump_offsets = BB.add_bb(start_offset, prev_offset,
+                                                       loop_offset, end_offset,
+                                                       flags, jump_offsets)
+                loop_offset = None
+                if BB_TRY in block.flags:
+                    try_stack.append(block)
+                    pass
+                start_offset = end_offset
+                pass
+
+        if not op_class:
+            # Most instructions don't affect basic blocks.
+            continue
+
+        # Add block flags for certain classes of instructions
+        if op_class & OP_JUMP_CONDITIONAL:
+            flags.add(BB_JUMP_CONDITIONAL)
+
+        if op_class & OP_POP_BLOCK:
+            if start_offset == offset:
+                flags.add(BB_STARTS_POP_BLOCK)
+            else:
+                flags.add(BB_POP_BLOCK)
+        elif op_class & OP_EXCEPT:
+            if is_python2:
+                # See the comment in xdis_basic_blocks().
+                if (len(try_stack) == 0 or start_offset != offset
+                    or ops[i+1] != pop_top or ops[i+2] != pop_top):
+                  continue
+            flags.add(BB_EXCEPT)
+            try_stack[-1].add_exception_offset(start_offset)
+        elif op_class & OP_TRY:
+            flags.add(BB_TRY)
+        elif op_class & OP_END_FINALLY:
+            flags.add(BB_END_FINALLY)
+            try_stack[-1].add_exception_offset(start_offset)
+        elif op_class & OP_FOR:
+            flags.add(BB_FOR)
+            jump_offsets.add(follow_offset + args[i])
+            block, flags, jump_offsets = BB.add_bb(start_offset, end_offset,
+                                                   loop_offset, follow_offset,
+                                                   flags, jump_offsets)
+            loop_offset = None
+            start_offset = follow_offset
+        elif op_class & OP_JUMP:
+            if op_class & OP_JABS:
+                jump_offset = args[i]
+            else:
+                jump_offset = follow_offset + args[i]
+
+            jump_offsets.add(jump_offset)
+            if op_class & OP_JUMP_UNCONDITIONAL:
+                flags.add(BB_JUMP_UNCONDITIONAL)
+                if jump_offset == follow_offset:
+                    flags.add(BB_JUMP_TO_FALLTHROUGH)
+                    pass
+                block, flags, jump_offsets = BB.add_bb(start_offset, end_offset,
+                                                       loop_offset, follow_offset,
+                                                       flags, jump_offsets)
+                loop_offset = None
+                if BB_TRY in block.flags:
+                    try_stack.append(block)
+                    pass
+                start_offset = follow_offset
+            elif not op_class & OP_LOOP:
+                if op_class & OP_FINALLY:
+                    flags.add(BB_FINALLY)
+
+                block, flags, jump_offsets = BB.add_bb(start_offset, end_offset,
+                                                       loop_offset, follow_offset,
+                                                       flags, jump_offsets)
+                loop_offset = None
+                if BB_TRY in block.flags:
+                    try_stack.append(block)
+                start_offset = follow_offset
+                pass
+        elif op_class & OP_NOFOLLOW:
+            flags.add(BB_NOFOLLOW)
+            last_block, flags, jump_offsets = BB.add_bb(start_offset, end_offset,
+                                                        loop_offset, follow_offset,
+                                                        flags, jump_offsets)
+            loop_offset = None
+            start_offset = follow_offset
+            pass
+        pass
+
+    if len(BB.bb_list):
+      BB.bb_list[-1].follow_offset = None
+      BB.start_block = BB.bb_list[0]
+
+    # Add remaining instructions?
+    if start_offset <= end_offset:
+        BB.bb_list.append(BasicBlock(start_offset, end_offset, loop_offset, None,
+                                     flags=flags, jump_offsets=jump_offsets,
+                                     bb_list=BB.bb_list))
+        loop_offset = None
+        pass
+
+    # Add an artificial block where we can link the exits of other blocks
+    # to. This helps in computing reverse dominators.
+    BB.add_bb(end_offset+1, end_offset+1, None, None, set([BB_EXIT]), [])
+    return BB
+
+
+def xdis_basic_blocks(version, is_pypy, fn, opcode_info=None):
+    """Create a list of basic blocks found in a code object.
+
+    This is the original, straightforward implementation that walks
+    xdis Instruction objects. It is kept as a reference for
+    basic_blocks() which gives the same result directly from the
+    bytecode.
     """
 
 
-    BB = BBMgr(version, is_pypy)
+    BB = BBMgr(version, is_pypy, opcode_info)
 
     # Get jump targets
     jump_targets = set()
-    instructions = list(get_instructions(fn))
+    instructions = list(get_instructions_bytes(get_code(fn).co_code, BB.opcode))
     for inst in instructions:
         op = inst.opcode
         offset = inst.offset
@@ -309,7 +642,7 @@ def basic_blocks(version, is_pypy, fn):
                 flags.add(BB_STARTS_POP_BLOCK)
                 flags.remove(BB_POP_BLOCK)
         elif op in BB.EXCEPT_INSTRUCTIONS:
-            if (sys.version_info[0:2] <= (2, 7)):
+            if version < 3.0:
                 # In Python up to 2.7, thre'POP_TOP'S at the beginning of a block
                 # indicate an exception handler. We also check
                 # that we are nested inside a "try".
@@ -320,14 +653,14 @@ def basic_blocks(version, is_pypy, fn):
                     instructions[i+2].opcode != BB.opcode.opmap['POP_TOP']):
                   continue
             flags.add(BB_EXCEPT)
-            try_stack[-1].exception_offsets.add(start_offset)
+            try_stack[-1].add_exception_offset(start_offset)
             pass
         elif op in BB.TRY_INSTRUCTIONS:
             end_try_offset_stack.append(inst.argval)
             flags.add(BB_TRY)
         elif op in BB.END_FINALLY_INSTRUCTIONS:
             flags.add(BB_END_FINALLY)
-            try_stack[-1].exception_offsets.add(start_offset)
+            try_stack[-1].add_exception_offset(start_offset)
         elif op in BB.FOR_INSTRUCTIONS:
             flags.add(BB_FOR)
             jump_offsets.add(inst.argval)
@@ -390,7 +723,8 @@ def basic_blocks(version, is_pypy, fn):
     # Add remaining instructions?
     if start_offset <= end_offset:
         BB.bb_list.append(BasicBlock(start_offset, end_offset, loop_offset, None,
-                                     flags=flags, jump_offsets=jump_offsets))
+                                     flags=flags, jump_offsets=jump_offsets,
+                                     bb_list=BB.bb_list))
         loop_offset = None
         pass
 
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+  Content-addressed on-disk cache of analysis records
+
+  Records, as produced by module.analysis_record(), are stored under a
+  hash of everything the analysis depends on: the bytecode, the shape
+  of the constants, the bytecode version and the version of this
+  library. So an unchanged code object is found again no matter which
+  file, or which name, it comes from.
+
+  Each record is a file in a two-level directory tree. Files are
+  written to a temporary name and renamed into place, so concurrent
+  readers never see a partial record, and any number of processes can
+  share a cache directory. Reading a record updates its modification
+  time, and when the cache grows past its size limit the least
+  recently used records are removed.
+
+  :copyright: (c) 2018 by Rocky Bernstein
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from control_flow.version import VERSION
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# When evicting, remove records until the cache is this fraction of
+# its maximum size, so that we don't have to evict on every write.
+EVICT_TO = 0.9
+
+replace = getattr(os, 'replace', os.rename)
+
+
+def consts_shape(co):
+    """A string describing the types in co_consts, with nested code
+    objects shown as "code" rather than by their contents."""
+    return ','.join([('code' if hasattr(const, 'co_code')
+                      else type(const).__name__)
+                     for const in co.co_consts])
+
+
+def code_key(co, version, is_pypy):
+    """The cache key for analyzing code object `co` of bytecode
+    `version`"""
+    h = hashlib.sha256()
+    h.update(('%s %s %s %s\n' % (VERSION, version, is_pypy,
+                                 consts_shape(co))).encode('utf-8'))
+    h.update(bytes(co.co_code))
+    return h.hexdigest()
+
+
+class AnalysisCache(object):
+    """
+      A directory of analysis records, at most about `max_size` bytes
+      in total.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        # Our estimate of the total size of the records. Other
+        # processes may be writing too, so this is only a hint as to
+        # when to look at the directory again.
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key, name=None):
+        """Return the record stored under `key`, with its name set to
+        `name`, or None if there is none."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                record = pickle.load(f)
+            os.utime(path, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except Exception:
+            # A record we can't read is as good as no record.
+            self.misses += 1
+            self.remove(path)
+            return None
+        self.hits += 1
+        record['name'] = name
+        return record
+
+    def put(self, key, record):
+        path = self.path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Another process got there first.
+                if not os.path.isdir(dirname):
+                    raise
+                pass
+            pass
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            replace(tmp_path, path)
+        except Exception:
+            self.remove(tmp_path)
+            raise
+
+        if self.size is None:
+            self.size = self.total_size()
+        else:
+            self.size += size
+        if self.size > self.max_size:
+            self.evict()
+        return
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            # Somebody else removed it.
+            pass
+        return
+
+    def entries(self):
+        """Return a list of (mtime, size, path) for the records in
+        the cache."""
+        result = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+                pass
+            pass
+        return result
+
+    def total_size(self):
+        return sum(size for mtime, size, path in self.entries())
+
+    def evict(self):
+        """Remove the least recently used records until the cache is
+        below EVICT_TO of its maximum size."""
+        entries = sorted(self.entries())
+        total = sum(size for mtime, size, path in entries)
+        limit = self.max_size * EVICT_TO
+        for mtime, size, path in entries:
+            if total <= limit:
+                break
+            self.remove(path)
+            total -= size
+            pass
+        self.size = total
+        return
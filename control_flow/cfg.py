@@ -1,26 +1,39 @@
 from operator import attrgetter
-from control_flow.dominators import DominatorTree
+from control_flow.components import StrongComponents
+from control_flow.dominators import DominatorTree, dfs_forest
+from control_flow.loops import LoopForest
+from control_flow.traversals import DepthFirst
 from control_flow.graph import (
-  DiGraph, jump_flags, BB_LOOP, BB_NOFOLLOW, BB_TRY,
-  BB_EXIT, BB_END_FINALLY)
+  EDGE2NAME, FlowGraph, jump_flags, BB_LOOP, BB_NOFOLLOW, BB_TRY,
+  BB_EXIT, BB_END_FINALLY,
+  EDGE_FALLTHROUGH, EDGE_NO_FALLTHROUGH, EDGE_EXIT, EDGE_FORWARD,
+  EDGE_FORWARD_SCOPE, EDGE_BACKWARD, EDGE_SELF_LOOP, EDGE_EXCEPTION)
 
 class ControlFlowGraph(object):
   """
     Performs the control-flow analysis on set of basic blocks. It
     iterates over its bytecode and builds basic blocks with flag
-    annotations. The final representation leverages the ``DiGraph``
-    structure, and contains an instance of the ``DominatorTree``.
+    annotations. The final representation is a ``FlowGraph`` over
+    block numbers, and contains an instance of the ``DominatorTree``.
+    A ``DiGraph`` of the flow graph, for drawing, is made on demand.
   """
 
   def __init__(self, bb_mgr):
       self.seen_blocks = set()
       self.blocks = bb_mgr.bb_list
-      self.offset2block = {}
-      self.block_nodes = {}
-      self.graph = None
+      self.block_offsets = {}
+      self.flow = None
+      self._graph = None
+      self._drawn_edges = None
+      self._block_nodes = None
+      self._offset2block = None
+      self._depth_first = {}
       self.entry_node = None
       self.exit_node = bb_mgr.exit_block
       self.dom = None
+      self._dom_trees = {}
+      self._loops = None
+      self._components = None
       self.analyze(self.blocks, bb_mgr.exit_block)
 
   def dominators(self, blocks):
@@ -35,6 +48,228 @@ class ControlFlowGraph(object):
           pass
       return self.dom
 
+  @property
+  def dom_tree(self):
+      """The dominator tree as a ``TreeGraph``, for drawing"""
+      return self.tree_graph(False)
+
+  @property
+  def pdom_tree(self):
+      """The post-dominator tree as a ``TreeGraph``, for drawing"""
+      return self.tree_graph(True)
+
+  def tree_graph(self, post_dom):
+      """Make the ``TreeGraph`` of the dominator or post-dominator
+      tree on first use. Analysis works on the arrays of the
+      ``DominatorTree``; these are only needed for DOT output."""
+      tree = self._dom_trees.get(post_dom)
+      if tree is None:
+          tree = self.dominators(self.blocks).tree(post_dom)
+          dfs_forest(tree, post_dom)
+          self._dom_trees[post_dom] = tree
+          pass
+      return tree
+
+  def add_edge(self, source, dest, kind=None):
+      """
+        Add a flow edge from basic block `source` to basic block
+        `dest`. If the dominators have been computed, they are
+        updated rather than computed again. `kind` is the EDGE_...
+        kind of the edge drawn; by default it is forward or backward
+        by offset.
+      """
+      if dest.number in source.successor_numbers:
+          raise ValueError("There is already an edge from %s to %s"
+                           % (source, dest))
+      if kind is None:
+          if dest is source:
+              kind = EDGE_SELF_LOOP
+          elif dest.start_offset > source.start_offset:
+              kind = EDGE_FORWARD
+          else:
+              kind = EDGE_BACKWARD
+              pass
+          pass
+      dom = self.dom
+      if dom is not None:
+          self.trees_changed(dom.start_edits())
+      self.flow.insert_edge(source.number, dest.number)
+      self.flow.add_edge(source.number, dest.number, kind)
+      if self._graph is not None:
+          drawn = self.drawn_edges().setdefault((source.number, dest.number), [])
+          drawn.append(self._graph.make_add_edge(self.block_nodes[source],
+                                                 self.block_nodes[dest],
+                                                 EDGE2NAME[kind]))
+          pass
+      self.edited(source, dest, True)
+      if dom is not None:
+          self.trees_changed(dom.insert_edge(source, dest))
+      return
+
+  def remove_edge(self, source, dest):
+      """
+        Remove the flow edge from basic block `source` to basic block
+        `dest`, and the edges drawn between them. If the dominators
+        have been computed, they are updated rather than computed
+        again.
+      """
+      if dest.number not in source.successor_numbers:
+          raise ValueError("There is no edge from %s to %s" % (source, dest))
+      dom = self.dom
+      if dom is not None:
+          self.trees_changed(dom.start_edits())
+      self.flow.remove_edge(source.number, dest.number)
+      self.flow.remove_edges(source.number, dest.number)
+      if self._graph is not None:
+          for edge in self.drawn_edges().pop((source.number, dest.number), ()):
+              self._graph.remove_edge(edge)
+              pass
+          pass
+      self.edited(source, dest, False)
+      if dom is not None:
+          self.trees_changed(dom.delete_edge(source, dest))
+      return
+
+  def drawn_edges(self):
+      """Map from (source, dest) block numbers to the ``Edge``s
+      between them in ``graph``, made on the first edit after
+      ``graph`` is"""
+      if self._drawn_edges is None:
+          self._drawn_edges = {}
+          for edge in self._graph.edges:
+              self._drawn_edges.setdefault(
+                  (edge.source.number, edge.dest.number), []).append(edge)
+              pass
+          pass
+      return self._drawn_edges
+
+  def trees_changed(self, post_doms):
+      """Drop the drawings of the dominator trees that changed"""
+      for post_dom in post_doms:
+          self._dom_trees.pop(post_dom, None)
+          pass
+      return
+
+  def edited(self, source, dest, inserted):
+      """Bring the blocks and what is made from the flow graph up to
+      date after the edge from `source` to `dest` was inserted or, if
+      `inserted` is false, removed. Only what the edge can change is
+      dropped: searches that don't reach it, and the loops found
+      from the search from the entry block, stay as they are."""
+      flow = self.flow
+      v, w = source.number, dest.number
+      source.successor_numbers = tuple(flow.successors(v))
+      dest.predecessor_numbers = tuple(flow.predecessors(w))
+      dest.unreachable = (dest is not self.entry_node and
+                          not set(dest.predecessor_numbers) - set([w]))
+      forward = self._depth_first.get(False)
+      if forward is None or forward.pre_number[v] >= 0:
+          self._depth_first.pop(False, None)
+          self._loops = None
+          pass
+      backward = self._depth_first.get(True)
+      if backward is not None and backward.pre_number[w] >= 0:
+          del self._depth_first[True]
+          pass
+      if (self._components is not None and
+          not self.update_components(v, w, inserted)):
+          self._components = None
+          pass
+      return
+
+  def update_components(self, v, w, inserted):
+      """Update the strongly connected components for the edge from
+      block number `v` to block number `w`. Returns False if they
+      have to be found again: the edge may join components into a
+      cycle, or its removal may split one."""
+      scc = self._components
+      c, d = scc.component[v], scc.component[w]
+      if c == d:
+          if scc.size(c) == 1:
+              # A block with or without an edge to itself
+              scc.cyclic[c] = 1 if inserted else 0
+              return True
+          return inserted
+      if c > d:
+          return False
+      dag = scc.dag
+      if inserted:
+          if d not in dag.successors(c):
+              dag.insert_edge(c, d)
+      else:
+          component, flow = scc.component, self.flow
+          if not any(component[x] == d for u in scc.members(c)
+                     for x in flow.successors(u)):
+              dag.remove_edge(c, d)
+          pass
+      return True
+
+  def loops(self):
+      """
+        Returns the ``LoopForest`` of the flow graph: its loops, found
+        from the edges, how they nest, and their exits.
+        This is lazily computed.
+      """
+      if self._loops is None:
+          self._loops = LoopForest(self.flow, self.entry_node.number,
+                                   self.depth_first())
+          pass
+      return self._loops
+
+  def components(self):
+      """
+        Returns the ``StrongComponents`` of the flow graph, numbered
+        in topological order.
+        This is lazily computed.
+      """
+      if self._components is None:
+          self._components = StrongComponents(self.flow)
+          pass
+      return self._components
+
+  def depth_first(self, post_dom=False):
+      """
+        Returns the ``DepthFirst`` search of the flow graph from the
+        entry block, or with `post_dom` backwards from the exit block.
+        This is computed once and shared by the analyses.
+      """
+      dfs = self._depth_first.get(post_dom)
+      if dfs is None:
+          root = self.exit_node if post_dom else self.entry_node
+          dfs = DepthFirst(self.flow, root.number, post_dom)
+          self._depth_first[post_dom] = dfs
+          pass
+      return dfs
+
+  @property
+  def graph(self):
+      """The flow graph as a ``DiGraph`` of ``Node``s and ``Edge``s"""
+      if self._graph is None:
+          self._graph = self.flow.to_digraph(self.blocks)
+          pass
+      return self._graph
+
+  @property
+  def block_nodes(self):
+      """Map from basic block to its node in ``graph``"""
+      if self._block_nodes is None:
+          nodes = dict((node.number, node) for node in self.graph.nodes)
+          self._block_nodes = dict((block, nodes[block.number])
+                                   for block in self.blocks)
+          pass
+      return self._block_nodes
+
+  @property
+  def offset2block(self):
+      """Map from offset to the node in ``graph`` of the basic block
+      starting there"""
+      if self._offset2block is None:
+          block_nodes = self.block_nodes
+          self._offset2block = dict((offset, block_nodes[block])
+                                    for offset, block in self.block_offsets.items())
+          pass
+      return self._offset2block
+
   def analyze(self, blocks, exit_block):
       """
       Performs the Control-Flow Analysis and stores the resulting
@@ -44,101 +279,91 @@ class ControlFlowGraph(object):
       self.build_flowgraph(blocks, exit_block)
 
   def build_flowgraph(self, blocks, exit_block):
-    g = DiGraph()
-
     self.block_offsets = {}
-    self.block_nodes = {}
 
-    # Add nodes
     for block in self.blocks:
         self.block_offsets[block.start_offset] = block
-        block_node = g.make_add_node(block)
-        self.block_nodes[block] = block_node
-        self.offset2block[block.index[0]] = block_node
         pass
 
-    self.exit_block = block_node
+    exit_number = block.number
     # Compute a block's immediate predecessors and successors
 
+    for block in self.blocks:
+        block.successor_numbers = []
+        block.predecessor_numbers = []
+        pass
+
     for block in self.blocks:
 
-        for jump_offset in set(block.jump_offsets) | block.exception_offsets:
+        for jump_offset in set(block.jump_offsets) | set(block.exception_offsets):
             try:
                 assert jump_offset in self.block_offsets
             except:
                 from trepan.api import debug; debug()
-            successor_block = self.block_offsets[jump_offset]
-            successor_block.predecessors.add(block)
-            block.successors.add(successor_block)
+            block.add_successor(self.block_offsets[jump_offset])
         if BB_NOFOLLOW in block.flags:
-            exit_block.predecessors.add(block)
-            block.successors.add(exit_block)
+            block.add_successor(exit_block)
             pass
         elif ( block.follow_offset
                 and (not (jump_flags & block.flags)) ):
             assert block.follow_offset in self.block_offsets
-            successor_block = self.block_offsets[block.follow_offset]
-            successor_block.predecessors.add(block)
-            block.successors.add(successor_block)
+            block.add_successor(self.block_offsets[block.follow_offset])
+        pass
+
+    for block in self.blocks:
+        block.successor_numbers = tuple(block.successor_numbers)
+        block.predecessor_numbers = tuple(block.predecessor_numbers)
         pass
 
     assert(len(self.blocks) > 0)
     self.entry_node = self.blocks[0]
+    g = FlowGraph([block.successor_numbers for block in self.blocks])
 
     sorted_blocks = sorted(self.blocks, key=attrgetter('index'))
     for i, block in enumerate(sorted_blocks):
 
       # Is this this dead code? (Remove self loops in calculation)
       # Entry node, blocks[0] is never unreachable
-      if not block.predecessors - set([block]) and block != blocks[0]:
+      if (not set(block.predecessor_numbers) - set([block.number])
+          and block != blocks[0]):
           block.unreachable = True
 
       block = sorted_blocks[i]
       if block.follow_offset:
           if BB_NOFOLLOW in block.flags:
-              kind = 'no fallthrough'
-              g.make_add_edge(self.block_nodes[block],
-                              self.exit_block, 'exit edge')
+              kind = EDGE_NO_FALLTHROUGH
+              g.add_edge(block.number, exit_number, EDGE_EXIT)
           else:
-              kind = 'fallthrough'
-          g.make_add_edge(
-              self.block_nodes[block],
-              self.block_nodes[self.block_offsets[block.follow_offset]],
-              kind)
+              kind = EDGE_FALLTHROUGH
+          g.add_edge(block.number,
+                     self.block_offsets[block.follow_offset].number,
+                     kind)
       elif BB_EXIT not in block.flags:
-          g.make_add_edge(self.block_nodes[block],
-                          self.exit_block, 'exit edge')
+          g.add_edge(block.number, exit_number, EDGE_EXIT)
 
       # Connect the current block to its jump targets
       for jump_index in block.jump_offsets:
           target_block = self.block_offsets[jump_index]
           if jump_index > block.start_offset:
               if BB_LOOP in block.flags:
-                  edge_type = 'forward_scope'
+                  edge_type = EDGE_FORWARD_SCOPE
               else:
-                  edge_type = 'forward'
+                  edge_type = EDGE_FORWARD
           else:
-              edge_type = 'backward'
+              edge_type = EDGE_BACKWARD
               pass
 
-          if self.block_nodes[target_block] == self.block_nodes[block]:
-              edge_type = 'self-loop'
+          if target_block.number == block.number:
+              edge_type = EDGE_SELF_LOOP
 
-          g.make_add_edge(
-              self.block_nodes[block],
-              self.block_nodes[target_block],
-              edge_type)
+          g.add_edge(block.number, target_block.number, edge_type)
           pass
       for jump_index in block.exception_offsets:
           target_block = self.block_offsets[jump_index]
           assert jump_index >= block.start_offset
-          edge_type = 'exception'
-          g.make_add_edge(
-              self.block_nodes[block],
-              self.block_nodes[target_block],
-              edge_type)
+          g.add_edge(block.number, target_block.number, EDGE_EXCEPTION)
           pass
       pass
 
-    self.graph = g
+    self.flow = g
     return
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+  Strongly connected components
+
+  Splits a flow graph into its strongly connected components: maximal
+  sets of blocks that can each reach all the others. A component of
+  more than one block, or of a block with an edge to itself, is a
+  cycle. Collapsing each component to a single vertex leaves an
+  acyclic graph, the condensation, so the acyclic parts of a function
+  can be gone over once in topological order, iterating only inside
+  cycles.
+
+  This is Tarjan's algorithm, "Depth-First Search and Linear Graph
+  Algorithms", SIAM J. Computing 1972, with an explicit stack instead
+  of recursion.
+
+  :copyright: (c) 2018 by Rocky Bernstein
+"""
+
+from array import array
+
+from control_flow.graph import FlowGraph
+
+
+class StrongComponents(object):
+    """
+      The strongly connected components of FlowGraph `graph`, all of
+      its vertices, unreached ones included.
+
+      Components are numbered 0..count-1 in a topological order: every
+      edge between two components goes from a lower number to a higher
+      one. ``component[v]`` is the component of vertex v, and
+      ``blocks`` lists the vertices component by component, so that
+      the vertices of component c are
+      ``blocks[start[c]:start[c+1]]``, in vertex order.
+
+      ``dag`` is the condensation, a FlowGraph whose vertices are the
+      components, with one edge for each pair of components that
+      there is an edge between.
+    """
+    __slots__ = ('count', 'component', 'start', 'blocks', 'cyclic', 'dag')
+
+    def __init__(self, graph):
+        n = graph.n
+        succ_start, succ = graph.succ_start, graph.succ
+        index = array('i', [-1]) * n
+        low = array('i', [0]) * n
+        on_stack = array('b', [0]) * n
+        # The next successor edge of each vertex to look at
+        position = succ_start[:n]
+        component = array('i', [-1]) * n
+        stack = []
+        found = 0
+        counter = 0
+
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            path = [root]
+            while path:
+                v = path[-1]
+                i = position[v]
+                if i < succ_start[v+1]:
+                    position[v] = i + 1
+                    w = succ[i]
+                    if index[w] < 0:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        path.append(w)
+                    elif on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+                path.pop()
+                if path and low[v] < low[path[-1]]:
+                    low[path[-1]] = low[v]
+                if low[v] == index[v]:
+                    # v roots a component. Components are found sinks
+                    # first, so this numbering is renumbered below.
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component[w] = found
+                        if w == v:
+                            break
+                        pass
+                    found += 1
+                pass
+            pass
+
+        self.count = count = found
+        for v in range(n):
+            component[v] = count - 1 - component[v]
+            pass
+        self.component = component
+
+        # Vertices by component, with a counting sort
+        self.start = start = array('i', [0]) * (count + 1)
+        for v in range(n):
+            start[component[v]+1] += 1
+            pass
+        for c in range(count):
+            start[c+1] += start[c]
+            pass
+        self.blocks = blocks = array('i', [0]) * n
+        fill = start[:count]
+        for v in range(n):
+            c = component[v]
+            blocks[fill[c]] = v
+            fill[c] += 1
+            pass
+
+        self.cyclic = cyclic = array('b', [0]) * count
+        successors = [set() for c in range(count)]
+        for v in range(n):
+            c = component[v]
+            for i in range(succ_start[v], succ_start[v+1]):
+                d = component[succ[i]]
+                if d == c:
+                    cyclic[c] = 1
+                else:
+                    successors[c].add(d)
+                pass
+            pass
+        self.dag = FlowGraph([sorted(dests) for dests in successors])
+        return
+
+    def members(self, c):
+        """The vertices in component `c`"""
+        return self.blocks[self.start[c]:self.start[c+1]]
+
+    def size(self, c):
+        return self.start[c+1] - self.start[c]
+
+    def is_cyclic(self, c):
+        """Is there a path with at least one edge from a vertex of
+        component `c` back to itself?"""
+        return self.cyclic[c] == 1
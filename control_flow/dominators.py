@@ -6,115 +6,268 @@
   Copyright (c) 2014 by Romain Gaucher (@rgaucher)
 """
 
-from control_flow.graph import TreeGraph
-from control_flow.traversals import dfs_postorder_nodes
+from array import array
+from heapq import heappop, heappush
+
+from control_flow.graph import FlowGraph, TreeGraph
+from control_flow.traversals import DepthFirst
+
+# Entries of the immediate dominator arrays for a block that has
+# no dominator recorded, and for one whose dominator came out as None.
+UNSET = -2
+NONE = -1
+
+# The ways we can compute dominators:
+#  "chk" is the iterative algorithm of Cooper, Harvey and Kennedy,
+#  "semi-nca" is the near-linear SEMI-NCA algorithm, a simplification
+#     of Lengauer-Tarjan,
+#  "auto" picks one by the size of the flow graph.
+ENGINES = ('auto', 'chk', 'semi-nca')
+
+# With the "auto" engine, flow graphs with at least this many blocks
+# use SEMI-NCA. Below this CHK converges in a couple of cheap passes
+# and wins; see test/bench-dominators.py.
+SEMI_NCA_MIN_BLOCKS = 32
 
 
 class DominatorTree(object):
     """
       Handles the dominator trees (dominator/post-dominator), and the
       computation of the dominance/post-dominance frontier.
+
+      `engine` is one of ENGINES. Each engine gives the same result.
     """
 
-    def __init__(self, cfg):
+    def __init__(self, cfg, engine='auto'):
+        if engine not in ENGINES:
+            raise ValueError("Unknown dominator engine %r" % (engine,))
         self.cfg = cfg
+        self.engine = engine
         self.doms = {}  # map of note to its dominator
         self.pdoms = {} # map of node to its post-dominator
-        self.df = {}    # dominator frontier
+        # The same as doms and pdoms, as arrays indexed by block number
+        self.idom = None
+        self.ipdom = None
+        # IndexTrees and dominance frontiers, made when first needed.
+        # These are keyed by post_dom.
+        self._index_trees = {}
+        self._frontiers = {}
+        # DynamicDominators, keyed by post_dom, once the flow graph
+        # is being edited
+        self._dynamic = {}
         self.build()
 
 
     def build(self):
-        graph = self.cfg.graph
-        entry = self.cfg.entry_node
-        self.build_dominators(graph, entry)
-        entry = self.cfg.exit_node
-        self.build_dominators(graph, entry, post_dom=True)
+        cfg = self.cfg
+        graph = cfg.flow
+        self.build_dominators(graph, cfg.entry_node,
+                              dfs=cfg.depth_first(False))
+        self.build_dominators(graph, cfg.exit_node, post_dom=True,
+                              dfs=cfg.depth_first(True))
 
 
-    def build_dominators(self, graph, entry, post_dom=False):
+    def build_dominators(self, graph, entry, post_dom=False, dfs=None):
         """
-          Builds the dominator tree based on:
-            http://www.cs.rice.edu/~keith/Embed/dom.pdf
+          Builds the dominator tree, or with `post_dom` the
+          post-dominator tree, of `graph`, a FlowGraph. `dfs` is the
+          DepthFirst search of `graph` from `entry`, if there is one
+          already.
 
-          Also used to build the post-dominator tree.
+          The result is put in an array of immediate dominator
+          numbers, and then in the doms or pdoms dict, in the order
+          the blocks were first given a dominator.
         """
+        blocks = self.cfg.blocks
+        engine = self.engine
+        if engine == 'auto':
+            if graph.n >= SEMI_NCA_MIN_BLOCKS:
+                engine = 'semi-nca'
+            else:
+                engine = 'chk'
+        if dfs is None:
+            dfs = DepthFirst(graph, entry.number, post_dom)
+        result = None
+        if engine == 'semi-nca':
+            result = semi_nca_dominators(graph, entry.number, post_dom, dfs)
+        if result is None:
+            result = chk_dominators(graph, entry.number, post_dom, blocks, dfs)
+        idom, order = result
+
         doms = self.doms if not post_dom else self.pdoms
-        doms[entry] = entry
-        post_order = dfs_postorder_nodes(graph, entry, post_dom)
-
-        post_order_number = {}
-        for i, n in enumerate(post_order):
-            post_order_number[n] = i
-
-        def intersec(b1, b2):
-            finger1 = b1
-            finger2 = b2
-            po_finger1 = post_order_number[finger1]
-            po_finger2 = post_order_number[finger2]
-
-            while po_finger1 != po_finger2:
-                no_solution = False
-                while po_finger1 < po_finger2:
-                    finger1 = doms.get(finger1, None)
-                    if finger1 is None:
-                        no_solution = True
-                        break
-                    po_finger1 = post_order_number[finger1]
-                    pass
-                while po_finger2 < po_finger1:
-                    finger2 = doms.get(finger2, None)
-                    try:
-                        po_finger2 = post_order_number[finger2]
-                    except:
-                        no_solution = True
-                        break
-                    if finger2 is None:
-                        no_solution = True
-                        break
-                    pass
-                if no_solution:
-                    break
+        for b in order:
+            d = idom[b]
+            doms[blocks[b]] = blocks[d] if d != NONE else None
+            pass
+        if post_dom:
+            self.ipdom = idom
+        else:
+            self.idom = idom
+        return
 
-            return finger1
+    def start_edits(self):
+        """Get ready to follow edits of cfg.flow, as it is now, with
+        insert_edge() and delete_edge(). From here on the trees are
+        exact, loop back edges of irreducible flow graphs included,
+        which build() doesn't see. Returns the post_dom values of the
+        trees that changed."""
+        cfg = self.cfg
+        changed = []
+        for post_dom, root in ((False, cfg.entry_node), (True, cfg.exit_node)):
+            if post_dom in self._dynamic:
+                continue
+            dynamic = DynamicDominators(cfg.flow, root.number, post_dom)
+            self._dynamic[post_dom] = dynamic
+            old = self.ipdom if post_dom else self.idom
+            if self._set_idom(post_dom, dynamic.idom,
+                              [v for v in range(cfg.flow.n)
+                               if old[v] != dynamic.idom[v]]):
+                changed.append(post_dom)
+            pass
+        return changed
 
-        changed = True
+    def insert_edge(self, source, dest):
+        """Update both trees for a flow edge from basic block `source`
+        to basic block `dest` just added to cfg.flow. Returns the
+        post_dom values of the trees that changed."""
+        forward, backward = self._dynamic[False], self._dynamic[True]
+        changed = []
+        if self._set_idom(False, forward.idom,
+                          forward.insert(source.number, dest.number)):
+            changed.append(False)
+        if self._set_idom(True, backward.idom,
+                          backward.insert(dest.number, source.number)):
+            changed.append(True)
+        return changed
 
-        while changed:
-            changed = False
-            for b in reversed(post_order):
+    def delete_edge(self, source, dest):
+        """Update both trees for the flow edge from basic block
+        `source` to basic block `dest` just removed from cfg.flow.
+        Returns the post_dom values of the trees that changed."""
+        forward, backward = self._dynamic[False], self._dynamic[True]
+        changed = []
+        if self._set_idom(False, forward.idom,
+                          forward.delete(source.number, dest.number)):
+            changed.append(False)
+        if self._set_idom(True, backward.idom,
+                          backward.delete(dest.number, source.number)):
+            changed.append(True)
+        return changed
 
-                # Skip start node which doesn't have a predecessor
-                # and was initialized above.
-                if b == entry:
-                    continue
+    def _set_idom(self, post_dom, idom, changed):
+        """Take the immediate dominator array `idom`, where the blocks
+        numbered in `changed` are different. Returns whether any
+        are."""
+        blocks = self.cfg.blocks
+        if post_dom:
+            self.ipdom = idom
+            doms = self.pdoms
+        else:
+            self.idom = idom
+            doms = self.doms
+        for v in changed:
+            if idom[v] == UNSET:
+                doms.pop(blocks[v], None)
+            else:
+                doms[blocks[v]] = blocks[idom[v]]
+            pass
+        if changed:
+            self._index_trees.pop(post_dom, None)
+            self._frontiers.pop(post_dom, None)
+            pass
+        return bool(changed)
 
-                new_idom = None
-                # Find a processed predecessor
-                if post_dom:
-                    predecessors = list(b.successors)
-                else:
-                    predecessors = [p for p in b.predecessors
-                                    if post_order_number.get(p, -1) > post_order_number[b]]
-                if len(predecessors) == 0:
-                    continue
+    def index_tree(self, post_dom=False):
+        """The IndexTree of the dominator or post-dominator tree"""
+        tree = self._index_trees.get(post_dom)
+        if tree is None:
+            tree = IndexTree(self.ipdom if post_dom else self.idom)
+            self._index_trees[post_dom] = tree
+            pass
+        return tree
 
-                new_idom = next(iter(predecessors))
-                for p in predecessors:
-                    if p == new_idom:
-                        continue
-                    if p in doms:
-                        new_idom = intersec(p, new_idom)
-                        pass
-                    pass
+    def dominates(self, a, b):
+        """Does basic block `a` dominate basic block `b`? A block
+        dominates itself, and a block that can't be reached dominates
+        nothing. This takes two comparisons."""
+        return self.index_tree(False).contains(a.number, b.number)
 
-                if b not in doms or doms[b] != new_idom:
-                    doms[b] = new_idom
-                    changed = True
-                    pass
-                pass
+    def strictly_dominates(self, a, b):
+        """Does basic block `a` dominate basic block `b` and isn't `b`?"""
+        return a is not b and self.dominates(a, b)
+
+    def post_dominates(self, a, b):
+        """Does basic block `a` post-dominate basic block `b`?"""
+        return self.index_tree(True).contains(a.number, b.number)
+
+    def nearest_common_dominator(self, blocks, post_dom=False):
+        """Return the nearest basic block that dominates, or with
+        `post_dom` post-dominates, each of the basic blocks in
+        `blocks`. This is None if there isn't one. Each block after
+        the first takes constant time."""
+        tree = self.index_tree(post_dom)
+        v = None
+        for block in blocks:
+            if v is None:
+                v = block.number
+                if tree.level[v] < 0:
+                    return None
+            else:
+                v = tree.nca(v, block.number)
+                if v < 0:
+                    return None
             pass
-        return
+        if v is None:
+            return None
+        return self.cfg.blocks[v]
+
+    def nearest_common_post_dominator(self, blocks):
+        """Return the nearest basic block that post-dominates each of
+        the basic blocks in `blocks`, or None"""
+        return self.nearest_common_dominator(blocks, True)
+
+    def frontiers(self, post_dom=False):
+        """The dominance frontier, or with `post_dom` the
+        post-dominance frontier, of each block: a list indexed by
+        block number of lists of block numbers"""
+        frontiers = self._frontiers.get(post_dom)
+        if frontiers is None:
+            frontiers = dominance_frontiers(
+                self.cfg.flow, self.ipdom if post_dom else self.idom,
+                post_dom, self.index_tree(post_dom))
+            self._frontiers[post_dom] = frontiers
+            pass
+        return frontiers
+
+    @property
+    def df(self):
+        """Dominance frontiers: map of block to the set of blocks in
+        its dominance frontier"""
+        return self._frontier_sets(self.doms, False)
+
+    @property
+    def pdf(self):
+        """Post-dominance frontiers: map of block to the set of blocks
+        in its post-dominance frontier"""
+        return self._frontier_sets(self.pdoms, True)
+
+    def _frontier_sets(self, doms, post_dom):
+        blocks = self.cfg.blocks
+        frontiers = self.frontiers(post_dom)
+        return dict((block, set([blocks[v] for v in frontiers[block.number]]))
+                    for block in doms)
+
+    def iterated_frontier(self, blocks, post_dom=False):
+        """Return the iterated dominance frontier, or with `post_dom`
+        the iterated post-dominance frontier, of `blocks`, a list of
+        basic blocks. This is where values defined in `blocks` meet.
+        The result is a list of basic blocks in block number order."""
+        all_blocks = self.cfg.blocks
+        return [all_blocks[v] for v in
+                iterated_frontier(self.cfg.flow,
+                                  self.ipdom if post_dom else self.idom,
+                                  [block.number for block in blocks],
+                                  post_dom, self.index_tree(post_dom))]
 
     def tree(self, do_pdoms=False):
         """Makes a the dominator tree"""
@@ -147,65 +300,809 @@ class DominatorTree(object):
             pass
         return t
 
-def build_dom_set(t, do_pdoms):
-    """Makes a the dominator set for each node in the tree"""
-    seen = set()
-    for node in t.nodes:
-        if node not in seen:
-            seen.add(node)
-            build_dom_set1(node, do_pdoms)
+def chk_dominators(graph, entry, post_dom, blocks, dfs=None):
+    """
+      Compute the dominators of FlowGraph `graph` from block number
+      `entry`, based on:
+        http://www.cs.rice.edu/~keith/Embed/dom.pdf
+
+      With `post_dom`, compute post-dominators. `blocks` are used only
+      in reporting errors. `dfs` is the DepthFirst search of `graph`
+      from `entry`; it is done here if not given.
+
+      Returns (idom, order): an array of the immediate dominator of
+      each block, and a list of the blocks in the order that they were
+      first given one.
+
+      Forward, only predecessors earlier in reverse post-order are
+      looked at, so loop back edges don't count.
+    """
+    idom = array('i', [UNSET]) * graph.n
+    idom[entry] = entry
+    order = [entry]
+    if dfs is None:
+        dfs = DepthFirst(graph, entry, post_dom)
+    post_order = dfs.postorder
+    post_order_number = dfs.post_number
+
+    def number(b):
+        """The post-order number of `b`, raising KeyError if
+        `b` isn't in post_order"""
+        if b < 0 or post_order_number[b] < 0:
+            raise KeyError(blocks[b] if b >= 0 else None)
+        return post_order_number[b]
+
+    def intersec(b1, b2):
+        finger1 = b1
+        finger2 = b2
+        po_finger1 = number(finger1)
+        po_finger2 = number(finger2)
+
+        while po_finger1 != po_finger2:
+            no_solution = False
+            while po_finger1 < po_finger2:
+                finger1 = idom[finger1]
+                if finger1 < 0:
+                    finger1 = NONE
+                    no_solution = True
+                    break
+                po_finger1 = number(finger1)
+                pass
+            while po_finger2 < po_finger1:
+                finger2 = idom[finger2]
+                if finger2 < 0 or post_order_number[finger2] < 0:
+                    no_solution = True
+                    break
+                po_finger2 = post_order_number[finger2]
+                pass
+            if no_solution:
+                break
+
+        return finger1
+
+    if post_dom:
+        start, predecessors = graph.succ_start, graph.succ
+    else:
+        start, predecessors = graph.pred_start, graph.pred
+    changed = True
+
+    while changed:
+        changed = False
+        for b in reversed(post_order):
+
+            # Skip start node which doesn't have a predecessor
+            # and was initialized above.
+            if b == entry:
+                continue
+
+            # Find a processed predecessor
+            new_idom = UNSET
+            for i in range(start[b], start[b+1]):
+                p = predecessors[i]
+                if (not post_dom and
+                    post_order_number[p] <= post_order_number[b]):
+                    continue
+                if new_idom == UNSET:
+                    new_idom = p
+                    continue
+                if p == new_idom:
+                    continue
+                if idom[p] != UNSET:
+                    new_idom = intersec(p, new_idom)
+                    pass
+                pass
+            if new_idom == UNSET:
+                continue
+
+            if idom[b] != new_idom:
+                if idom[b] == UNSET:
+                    order.append(b)
+                idom[b] = new_idom
+                changed = True
+                pass
+            pass
+        pass
+    return idom, order
+
+
+def semi_nca_dominators(graph, entry, post_dom, dfs=None, exact=False):
+    """
+      Compute the same (idom, order) as chk_dominators() using
+      SEMI-NCA, which takes near-linear time:
+        Loukas Georgiadis, "Linear-Time Algorithms for Dominators
+        and Related Problems", Princeton 2005.
+
+      Returns None for a post-dominator tree where some block that
+      reaches the exit has a successor that doesn't.
+      chk_dominators() has its own notion of the result there.
+
+      With `exact`, give the dominators by their definition instead:
+      loop back edges count, which matters only in an irreducible flow
+      graph, and edges from blocks that aren't reached are ignored.
+    """
+    if dfs is None:
+        dfs = DepthFirst(graph, entry, post_dom)
+    preorder, parent, post_order = dfs.preorder, dfs.parent, dfs.postorder
+    if post_dom:
+        start, predecessors = graph.succ_start, graph.succ
+    else:
+        start, predecessors = graph.pred_start, graph.pred
+    n = graph.n
+    count = len(preorder)
+
+    # Preorder number of each block, or -1 if it isn't reached
+    number = dfs.pre_number
+    post_order_number = dfs.post_number
+    if post_dom and not exact:
+        for v in preorder:
+            for k in range(start[v], start[v+1]):
+                if number[predecessors[k]] < 0:
+                    return None
+                pass
+            pass
+
+    # Everything below is indexed by preorder number. ancestor[] starts
+    # out as the DFS tree parent and is compressed by evaluation.
+    semi = array('i', range(count))
+    label = array('i', range(count))
+    tree_parent = array('i', [-1]) * count
+    for i in range(1, count):
+        tree_parent[i] = number[parent[preorder[i]]]
+        pass
+    ancestor = array('i', tree_parent)
+    path = []
+
+    for w in range(count - 1, 0, -1):
+        v = preorder[w]
+        po_v = post_order_number[v]
+        s = tree_parent[w]
+        for k in range(start[v], start[v+1]):
+            p = predecessors[k]
+            u = number[p]
+            if u < 0:
+                continue
+            if not (post_dom or exact) and post_order_number[p] <= po_v:
+                continue
+            # Evaluate u: the vertex with least semi on the path to it
+            # from the root of its tree in the forest of vertices
+            # processed so far, that is those numbered above w.
+            if ancestor[u] > w:
+                x = u
+                while ancestor[x] > w:
+                    path.append(x)
+                    x = ancestor[x]
+                    pass
+                x_label = label[x]
+                while path:
+                    y = path.pop()
+                    ancestor[y] = ancestor[x]
+                    if semi[x_label] < semi[label[y]]:
+                        label[y] = x_label
+                    else:
+                        x_label = label[y]
+                        pass
+                    x = y
+                    pass
+                pass
+            semi_u = semi[label[u]]
+            if semi_u < s:
+                s = semi_u
+                pass
+            pass
+        semi[w] = s
+        pass
+
+    # The immediate dominator is the nearest common ancestor of the
+    # parent and the semidominator.
+    dom = tree_parent
+    for w in range(1, count):
+        d = dom[w]
+        while d > semi[w]:
+            d = dom[d]
+            pass
+        dom[w] = d
+        pass
+
+    idom = array('i', [UNSET]) * n
+    idom[entry] = entry
+    for w in range(1, count):
+        idom[preorder[w]] = preorder[dom[w]]
+        pass
+    order = [entry]
+    order.extend([v for v in reversed(post_order) if v != entry])
+    return idom, order
+
+
+class IndexTree(object):
+    """
+      The tree given by an immediate dominator array `idom`, as arrays
+      indexed by block number.
+
+      ``parent[v]`` is the parent of block v, or -1 for a root or a
+      block not in the tree. The children of block v are
+      ``children[child_start[v]:child_start[v+1]]``, in block number
+      order. ``level[v]`` is the depth of v in the tree, 0 for a
+      root, and -1 for a block not in the tree.
+
+      The blocks are numbered in a depth-first preorder of the tree:
+      ``pre_number[v]`` is the number of v and ``end_number[v]`` the
+      largest number in the subtree of v, so that subtree is the
+      interval between them. Both are -1 for a block not in the tree.
+
+      nca() answers nearest common ancestor queries in constant time
+      from an Euler tour of the tree and a sparse table of the
+      shallowest block in each power-of-two stretch of it. These are
+      made on the first query.
+    """
+    __slots__ = ('parent', 'child_start', 'children', 'level', 'roots',
+                 'preorder', 'pre_number', 'end_number',
+                 'first_visit', 'sparse')
+
+    def __init__(self, idom):
+        n = len(idom)
+        self.parent = parent = array('i', [-1]) * n
+        self.child_start = child_start = array('i', [0]) * (n + 1)
+        for v in range(n):
+            d = idom[v]
+            if d >= 0 and d != v:
+                parent[v] = d
+                child_start[d + 1] += 1
+            pass
+        for v in range(n):
+            child_start[v+1] += child_start[v]
+            pass
+        self.children = children = array('i', [0]) * child_start[n]
+        fill = child_start[:n]
+        for v in range(n):
+            d = parent[v]
+            if d >= 0:
+                children[fill[d]] = v
+                fill[d] += 1
+            pass
+
+        # The roots are blocks without a parent which are either given
+        # a dominator or are the dominator of some other block.
+        self.roots = roots = [v for v in range(n)
+                              if parent[v] < 0 and
+                              (idom[v] != UNSET or child_start[v] != child_start[v+1])]
+
+        self.level = level = array('i', [-1]) * n
+        self.pre_number = pre_number = array('i', [-1]) * n
+        self.preorder = preorder = []
+        stack = []
+        for root in reversed(roots):
+            level[root] = 0
+            stack.append(root)
+            pass
+        while stack:
+            v = stack.pop()
+            pre_number[v] = len(preorder)
+            preorder.append(v)
+            for i in range(child_start[v+1] - 1, child_start[v] - 1, -1):
+                w = children[i]
+                level[w] = level[v] + 1
+                stack.append(w)
+                pass
+            pass
+
+        self.end_number = end_number = pre_number[:]
+        for v in reversed(preorder):
+            d = parent[v]
+            if d >= 0 and end_number[d] < end_number[v]:
+                end_number[d] = end_number[v]
+            pass
+        self.first_visit = None
+        self.sparse = None
+        return
+
+    def index_tour(self):
+        """Make the Euler tour and its sparse table for nca()"""
+        child_start, children, level = self.child_start, self.children, self.level
+        self.first_visit = first_visit = array('i', [-1]) * len(level)
+        tour = array('i')
+        for root in self.roots:
+            first_visit[root] = len(tour)
+            tour.append(root)
+            # Each entry is a block and the index of its next child
+            stack = [[root, child_start[root]]]
+            while stack:
+                top = stack[-1]
+                v, i = top
+                if i < child_start[v+1]:
+                    top[1] = i + 1
+                    w = children[i]
+                    first_visit[w] = len(tour)
+                    tour.append(w)
+                    stack.append([w, child_start[w]])
+                else:
+                    stack.pop()
+                    if stack:
+                        tour.append(stack[-1][0])
+                pass
+            pass
+
+        # sparse[k][i] is the shallowest block in tour[i:i + 2**k]
+        self.sparse = sparse = [tour]
+        half = 1
+        while 2 * half <= len(tour):
+            last = sparse[-1]
+            sparse.append(array('i', [v if level[v] <= level[w] else w
+                                      for v, w in zip(last, last[half:])]))
+            half *= 2
+            pass
+        return
+
+    def nca(self, a, b):
+        """The nearest common ancestor of block numbers `a` and `b`:
+        the nearest block that dominates both. This is -1 if there is
+        none, when a block is not in the tree or they are in different
+        trees."""
+        if self.sparse is None:
+            self.index_tour()
+        i, j = self.first_visit[a], self.first_visit[b]
+        if i < 0 or j < 0:
+            return -1
+        if i > j:
+            i, j = j, i
+        k = (j - i + 1).bit_length() - 1
+        table = self.sparse[k]
+        v, w = table[i], table[j - (1 << k) + 1]
+        if self.level[w] < self.level[v]:
+            v = w
+        if self.level[v] == 0 and not (self.contains(v, a) and self.contains(v, b)):
+            # The two are under different roots
+            return -1
+        return v
+
+    def postorder(self):
+        """Yield the block numbers of the tree children first, with
+        children in block number order"""
+        child_start, children = self.child_start, self.children
+        for root in self.roots:
+            # Each entry is a block and the index of its next child
+            stack = [[root, child_start[root]]]
+            while stack:
+                top = stack[-1]
+                v, i = top
+                if i < child_start[v+1]:
+                    top[1] = i + 1
+                    stack.append([children[i], child_start[children[i]]])
+                else:
+                    stack.pop()
+                    yield v
+                pass
+            pass
+        return
+
+    def contains(self, a, b):
+        """Is block number `b` in the subtree of block number `a`?
+        That is, does `a` dominate `b`?"""
+        pre_number = self.pre_number
+        return 0 <= pre_number[a] <= pre_number[b] <= self.end_number[a]
+
+
+def dominance_frontiers(graph, idom, post_dom=False, tree=None):
+    """
+      Return the dominance frontier of each block of FlowGraph `graph`
+      given its immediate dominator array `idom`, as a list indexed by
+      block number of lists of block numbers. With `post_dom`, `idom`
+      has the immediate post-dominators, and the result is the
+      post-dominance frontiers. `tree` is the IndexTree of `idom`, if
+      there is one already.
+
+      This uses the "runner" of Cooper, Harvey and Kennedy: a block is
+      in the frontier of each block on the way up the tree from each
+      of its predecessors to its immediate dominator. Each frontier is
+      appended to directly, so there are no set unions.
+    """
+    if tree is None:
+        tree = IndexTree(idom)
+    level = tree.level
+    n = graph.n
+    if post_dom:
+        start, predecessors = graph.succ_start, graph.succ
+    else:
+        start, predecessors = graph.pred_start, graph.pred
+    frontiers = [[] for v in range(n)]
+    # The block last added to each frontier, to avoid duplicates
+    last = array('i', [-1]) * n
+    for b in range(n):
+        if level[b] < 0:
+            continue
+        # A root can be in its own frontier, so run to the top
+        d = idom[b] if level[b] > 0 else NONE
+        for i in range(start[b], start[b+1]):
+            runner = predecessors[i]
+            # Levels go down on the way up, so this stops
+            while runner != d and level[runner] >= 0:
+                if last[runner] != b:
+                    last[runner] = b
+                    frontiers[runner].append(b)
+                    pass
+                if level[runner] == 0:
+                    break
+                runner = idom[runner]
+                pass
             pass
         pass
+    return frontiers
 
-def build_dom_set1(node, do_pdoms):
-    """Build dominator sets from dominator node"""
 
-    if do_pdoms:
-        node.bb.pdom_set = set(node.bb.pdoms)
+def iterated_frontier(graph, idom, nodes, post_dom=False, tree=None):
+    """
+      Return the iterated dominance frontier of the block numbers in
+      `nodes`, as a sorted list of block numbers. `graph`, `idom` and
+      `post_dom` are as in dominance_frontiers(). `tree` is the
+      IndexTree of `idom`, if there is one already.
+
+      This is Sreedhar and Gao's linear-time algorithm, "A Linear Time
+      Algorithm for Placing phi-Nodes", POPL 1995. It walks the DJ
+      graph, the dominator tree plus the flow edges that aren't tree
+      edges ("J-edges"), from the deepest nodes up, visiting each
+      node once.
+    """
+    if tree is None:
+        tree = IndexTree(idom)
+    if post_dom:
+        start, targets = graph.pred_start, graph.pred
     else:
-        node.bb.dom_set = set(node.bb.doms)
+        start, targets = graph.succ_start, graph.succ
+    child_start, children, level = tree.child_start, tree.children, tree.level
+    n = graph.n
+    in_result = bytearray(n)
+    in_bank = bytearray(n)
+    visited = bytearray(n)
+    result = []
+
+    # The "piggy bank" of nodes to visit, by level
+    bank = [[] for i in range(max(level) + 1)] if n else []
+    for v in nodes:
+        if level[v] >= 0 and not in_bank[v]:
+            in_bank[v] = 1
+            bank[level[v]].append(v)
+            pass
+        pass
+
+    current_level = len(bank) - 1
+    stack = []
+    while current_level >= 0:
+        if not bank[current_level]:
+            current_level -= 1
+            continue
+        root = bank[current_level].pop()
+        visited[root] = 1
+        stack.append(root)
+        while stack:
+            x = stack.pop()
+            for i in range(start[x], start[x+1]):
+                y = targets[i]
+                if (idom[y] == x and y != x) or level[y] < 0:
+                    # A tree edge, or a block not in the tree
+                    continue
+                if level[y] <= current_level and not in_result[y]:
+                    in_result[y] = 1
+                    result.append(y)
+                    if not in_bank[y]:
+                        in_bank[y] = 1
+                        bank[level[y]].append(y)
+                        pass
+                    pass
+                pass
+            for i in range(child_start[x], child_start[x+1]):
+                y = children[i]
+                if not visited[y]:
+                    visited[y] = 1
+                    stack.append(y)
+                    pass
+                pass
+            pass
+        pass
+    result.sort()
+    return result
+
+
+class DynamicDominators(object):
+    """
+      Keeps the immediate dominators of FlowGraph `graph`, rooted at
+      block number `root`, up to date as flow edges are added and
+      removed. With `post_dom` these are the post-dominators, and the
+      graph is followed backwards from `root`.
+
+      The dominators are computed exactly to begin with (see
+      semi_nca_dominators()), and ``idom`` is then changed in place by
+      insert() and delete(). These follow the depth-based search (DBS)
+      of Georgiadis, Italiano, Laura and Santaroni, "An Experimental
+      Study of Dynamic Dominators", ESA 2012: the work done is in
+      proportion to the part of the dominator tree that changes, not
+      to the size of the graph.
+
+      ``depth[v]`` is the depth of v in the tree, or -1 if v isn't
+      reached, and ``kids[v]`` lists its children.
+    """
+    __slots__ = ('graph', 'root', 'post_dom', 'idom', 'depth', 'kids')
+
+    def __init__(self, graph, root, post_dom=False):
+        self.graph = graph
+        self.root = root
+        self.post_dom = post_dom
+        self.idom, order = semi_nca_dominators(graph, root, post_dom,
+                                               exact=True)
+        tree = IndexTree(self.idom)
+        self.depth = tree.level
+        self.kids = kids = [[] for v in range(graph.n)]
+        for v in tree.preorder:
+            if tree.parent[v] >= 0:
+                kids[tree.parent[v]].append(v)
+            pass
+        return
+
+    def successors(self, v):
+        """The blocks after v in the direction the graph is followed"""
+        if self.post_dom:
+            return self.graph.predecessors(v)
+        return self.graph.successors(v)
+
+    def predecessors(self, v):
+        if self.post_dom:
+            return self.graph.successors(v)
+        return self.graph.predecessors(v)
+
+    def dominates(self, a, b):
+        """Does block number `a` dominate block number `b`?"""
+        idom, depth = self.idom, self.depth
+        if depth[a] < 0 or depth[b] < 0:
+            return False
+        while depth[b] > depth[a]:
+            b = idom[b]
+            pass
+        return a == b
+
+    def insert(self, x, y):
+        """Update for an edge from block number `x` to block number
+        `y`, in the direction the graph is followed, which the graph
+        already has. Returns the block numbers whose immediate dominator
+        changed."""
+        depth = self.depth
+        if depth[x] < 0:
+            return []
+        if depth[y] < 0:
+            return self._reach(x, y)
+        return self._insert_reached(x, y)
+
+    def delete(self, x, y):
+        """Update for the removal of the edge from block number `x` to
+        block number `y`, in the direction the graph is followed,
+        which the graph no longer has. Returns the block numbers whose
+        immediate dominator changed."""
+        depth = self.depth
+        if depth[x] < 0 or y == self.root or self.dominates(y, x):
+            # Nothing was reached through the edge that can't be
+            # reached without it.
+            return []
+        for p in self.predecessors(y):
+            if depth[p] >= 0 and not self.dominates(y, p):
+                # y is still reached, so only blocks under its
+                # immediate dominator can change.
+                return self._recompute(self.idom[y])
+
+        # y and the blocks it dominates are no longer reached. Blocks
+        # they have edges to are, but maybe with new dominators.
+        idom, kids = self.idom, self.kids
+        kids[idom[y]].remove(y)
+        gone = self._subtree(y)
+        for v in gone:
+            idom[v] = UNSET
+            depth[v] = -1
+            pass
+        top = None
+        for v in gone:
+            for w in self.successors(v):
+                if depth[w] >= 0:
+                    top = idom[w] if top is None else self._nca(top, idom[w])
+                pass
+            pass
+        for v in gone:
+            kids[v] = []
+            pass
+        if top is None:
+            return gone
+        return gone + self._recompute(top)
+
+    def _nca(self, a, b):
+        """The nearest common ancestor of `a` and `b` in the tree"""
+        idom, depth = self.idom, self.depth
+        while a != b:
+            if depth[a] > depth[b]:
+                a = idom[a]
+            else:
+                b = idom[b]
+            pass
+        return a
+
+    def _subtree(self, v):
+        """The blocks in the subtree of `v`, in preorder"""
+        kids = self.kids
+        result = []
+        stack = [v]
+        while stack:
+            v = stack.pop()
+            result.append(v)
+            stack.extend(kids[v])
+            pass
+        return result
+
+    def _set_depths(self, v):
+        """Recompute the depths of the blocks under `v`"""
+        depth, kids = self.depth, self.kids
+        stack = [v]
+        while stack:
+            v = stack.pop()
+            for w in kids[v]:
+                depth[w] = depth[v] + 1
+                stack.append(w)
+                pass
+            pass
+        return
+
+    def _reach(self, x, y):
+        """y, not reached before, is now reached from x. Make the
+        blocks newly reached a tree by a search from y, and then add
+        the other edges from them one by one."""
+        idom, depth, kids = self.idom, self.depth, self.kids
+        idom[y] = x
+        depth[y] = depth[x] + 1
+        kids[x].append(y)
+        changed = [y]
+        edges = []
+        stack = [y]
+        while stack:
+            u = stack.pop()
+            for w in self.successors(u):
+                if depth[w] < 0:
+                    idom[w] = u
+                    depth[w] = depth[u] + 1
+                    kids[u].append(w)
+                    changed.append(w)
+                    stack.append(w)
+                else:
+                    edges.append((u, w))
+                pass
+            pass
+        for u, w in edges:
+            changed += self._insert_reached(u, w)
+            pass
+        return changed
+
+    def _insert_reached(self, x, y):
+        """Add an edge between blocks that are both reached. A block w
+        gets the nearest common ancestor of x and y as its immediate
+        dominator if it is deeper than its children, and y reaches it
+        through blocks no shallower than w. These are found deepest
+        first."""
+        idom, depth, kids = self.idom, self.depth, self.kids
+        nca = self._nca(x, y)
+        floor = depth[nca] + 1
+        if depth[y] <= floor:
+            return []
+        affected = []
+        seen = set([y])
+        heap = [(-depth[y], y)]
+        while heap:
+            level, z = heappop(heap)
+            level = -level
+            affected.append(z)
+            stack = [z]
+            while stack:
+                u = stack.pop()
+                for w in self.successors(u):
+                    if w in seen:
+                        continue
+                    if depth[w] > level:
+                        seen.add(w)
+                        stack.append(w)
+                    elif depth[w] > floor:
+                        seen.add(w)
+                        heappush(heap, (-depth[w], w))
+                    pass
+                pass
+            pass
+        for w in affected:
+            kids[idom[w]].remove(w)
+            idom[w] = nca
+            kids[nca].append(w)
+            depth[w] = floor
+            self._set_depths(w)
+            pass
+        return affected
+
+    def _recompute(self, c):
+        """Recompute the dominators of the blocks under `c`. Paths to
+        them all go through c, so this is done on the subgraph of those
+        blocks alone."""
+        idom, depth, kids = self.idom, self.depth, self.kids
+        region = self._subtree(c)
+        local = dict((v, i) for i, v in enumerate(region))
+        successors = [[local[w] for w in self.successors(v) if w in local]
+                      for v in region]
+        local_idom = semi_nca_dominators(FlowGraph(successors), 0, False,
+                                         exact=True)[0]
+        changed = []
+        for v in region:
+            kids[v] = []
+            pass
+        for i in range(1, len(region)):
+            v = region[i]
+            # Every block under c is still reached from it
+            assert local_idom[i] != UNSET
+            d = region[local_idom[i]]
+            kids[d].append(v)
+            if d != idom[v]:
+                idom[v] = d
+                changed.append(v)
+            pass
+        self._set_depths(c)
+        return changed
+
+
+def tree_postorder(t):
+    """Yield the nodes of TreeGraph `t` children first, starting from
+    each node of t.nodes not yet seen. Uses an explicit stack, so
+    there is no limit on the depth of the tree."""
+    seen = set()
+    for root in t.nodes:
+        if root in seen:
+            continue
+        seen.add(root)
+        stack = [(root, iter(root.children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child not in seen:
+                    seen.add(child)
+                    stack.append((child, iter(child.children)))
+                    break
+                pass
+            else:
+                stack.pop()
+                yield node
+            pass
         pass
+    return
 
-    for child in node.children:
-        build_dom_set1(child, do_pdoms)
+def build_dom_set(t, do_pdoms):
+    """Makes a the dominator set for each node in the tree.
+
+    The sets take space quadratic in the depth of the tree; to ask
+    whether one block dominates another use
+    DominatorTree.dominates() or post_dominates() instead."""
+    for node in tree_postorder(t):
         if do_pdoms:
-            node.bb.pdom_set |= child.bb.pdom_set
+            node.bb.pdom_set = set(node.bb.pdoms)
+            for child in node.children:
+                node.bb.pdom_set |= child.bb.pdom_set
         else:
-            node.bb.dom_set |= child.bb.dom_set
+            node.bb.dom_set = set(node.bb.doms)
+            for child in node.children:
+                node.bb.dom_set |= child.bb.dom_set
+        pass
+    return
 
 # Note: this has to be done after calling tree
 def dfs_forest(t, do_pdoms):
     """
     Builds data flow graph using Depth-First search.
     """
-
-    def dfs(seen, node, do_pdoms):
-        if node in seen:
-            return
-        seen.add(node)
+    for node in tree_postorder(t):
         if do_pdoms:
             node.bb.pdoms = node.pdoms = set([node])
         else:
             node.bb.doms = node.doms = set([node])
             node.bb.reach_offset = node.reach_offset = node.bb.end_offset
-
-        for n in node.children:
-            dfs(seen, n, do_pdoms)
-            if do_pdoms:
-                node.pdoms |= node.pdoms
-                node.bb.pdoms |= node.pdoms
-            else:
-                node.doms |= node.doms
-                node.bb.doms |= node.doms
+            for n in node.children:
                 if node.reach_offset < n.reach_offset:
                     node.bb.reach_offset = node.reach_offset = n.reach_offset
                     pass
                 pass
-        # print("node %d has children %s" %
-        #       (node.number, [n.number for n in node.children]))
-
-    seen = set([])
-    for node in t.nodes:
-        if node not in seen:
-            dfs(seen, node, do_pdoms)
+            pass
+        pass
     return
@@ -6,6 +6,8 @@
   :copyright: (c) 2014 by Romain Gaucher (@rgaucher)
 """
 
+from io import StringIO
+
 from control_flow.graph import (
     DiGraph, BB_ENTRY, BB_EXIT, BB_END_FINALLY,
     BB_JUMP_TO_FALLTHROUGH,
@@ -28,30 +30,54 @@ FEL = len(flags_prefix)
 NODE_TEXT_WIDTH = 26 + FEL
 
 class DotConverter(object):
-  def __init__(self, graph):
+  """
+    Writes DiGraph `graph` in dot format to `out`, a writable file-like
+    object, a node or edge at a time.
+  """
+  def __init__(self, graph, out, components=None):
       self.g = graph
-      self.buffer = ''
+      self.out = out
       self.node_ids = {}
+      # Cycles of blocks to collapse into a single node, those drawn
+      # so far, and the edges already drawn to or from them
+      self.components = components
+      self.cycle_ids = set()
+      self.collapsed_edges = set()
 
   @staticmethod
-  def process(graph, show_exit):
-      converter = DotConverter(graph)
-      converter.run(show_exit)
-      return converter.buffer
+  def process(graph, show_exit, components=None, out=None):
+      """Write `graph` to `out`, or if that is None, return it as a
+      string"""
+      if out is None:
+          buffer = StringIO()
+          DotConverter(graph, buffer, components).run(show_exit)
+          return buffer.getvalue()
+      DotConverter(graph, out, components).run(show_exit)
+      return None
 
   # See Stackoverflow link below for information on how imporve
   # layout of graph. It's a mess and not very well understood.
   def run(self, show_exit):
-    self.buffer += 'digraph G {'
-    self.buffer += DOT_STYLE
+    self.out.write('digraph G {')
+    self.out.write(DOT_STYLE)
 
     if isinstance(self.g, DiGraph):
-        self.buffer += "\n  # basic blocks:\n"
+        self.out.write("\n  # basic blocks:\n")
+        components = self.components
         for node in sorted(self.g.nodes, key=lambda n: n.number):
+            if components is not None:
+                c = components.component[node.number]
+                if components.size(c) > 1:
+                    cycle_id = 'cycle_%d' % c
+                    if cycle_id not in self.cycle_ids:
+                        self.cycle_ids.add(cycle_id)
+                        self.add_cycle_node(cycle_id, components.members(c))
+                    self.node_ids[node] = cycle_id
+                    continue
             self.node_ids[node] = 'block_%d' % node.number
             self.add_node(node, show_exit)
 
-        self.buffer += """
+        self.out.write("""
   # Edges should be ordered from innermost block edges to outmost.
   # If layout gives ugly edge crossing, change the order or the edges
   # and/or add port directions on nodes For example:
@@ -59,7 +85,7 @@ class DotConverter(object):
   #  block_0 -> block_3:ne
   # See https://stackoverflow.com/questions/53468814/how-can-i-influence-graphviz-dot-to-prefer-which-edges-can-cross/53472852#53472852
 
-"""
+""")
         # FIXME: We really want in reverse dominiator order but I think this is
         # close approximation.
         seen_edge = set()
@@ -69,7 +95,7 @@ class DotConverter(object):
             self.add_edge(edge, show_exit, edge_pair in seen_edge)
             seen_edge.add(edge_pair)
 
-    self.buffer += '}\n'
+    self.out.write('}\n')
 
 
   def add_edge(self, edge, show_exit, edge_seen):
@@ -178,10 +204,18 @@ class DotConverter(object):
 
       nid1 = self.node_ids[edge.source]
       nid2 = self.node_ids[edge.dest]
+      if nid1 in self.cycle_ids or nid2 in self.cycle_ids:
+          # Edges within a cycle aren't drawn, and edges in or out of
+          # it are drawn once, visibly and without ports
+          if (nid1 == nid2 or 'invis' in style
+              or (nid1, nid2) in self.collapsed_edges):
+              return
+          self.collapsed_edges.add((nid1, nid2))
+          source_port = dest_port = edge_port = ''
 
-      self.buffer += ('  %s%s -> %s%s [weight=%d]%s%s;\n' %
-                        (nid1, source_port, nid2, dest_port,
-                         weight, style, edge_port))
+      self.out.write('  %s%s -> %s%s [weight=%d]%s%s;\n' %
+                     (nid1, source_port, nid2, dest_port,
+                      weight, style, edge_port))
 
   @staticmethod
   def node_repr(node, align, is_exit):
@@ -215,6 +249,11 @@ class DotConverter(object):
             % (offset_text, flag_text, jump_text, reach_offset_text))
 
 
+  def add_cycle_node(self, cycle_id, numbers):
+      label = ('[label="Basic Blocks %s\lin a cycle\l"]' %
+               ', '.join(str(number) for number in numbers))
+      self.out.write('  %s [shape = "box3d"]%s;\n' % (cycle_id, label))
+
   def add_node(self, node, show_exit):
 
       if not show_exit and BB_EXIT in node.bb.flags:
@@ -237,4 +276,4 @@ class DotConverter(object):
       label = ('[label="Basic Block %d%s%s%s"]' %
                (node.number, align, self.node_repr(node.bb, align, is_exit),
                 align))
-      self.buffer += '  block_%d %s%s;\n' % (node.number, style, label)
+      self.out.write('  block_%d %s%s;\n' % (node.number, style, label))
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+  Exporting analysis records
+
+  Records, as made by module.analysis_record(), are written with the
+  path of the file they came from, so that other tools can use the
+  results without running the analysis again. There are two forms:
+
+  JSON lines: one JSON object per line, per code object. The object
+  is the record with a "path" added.
+
+  Binary: a file header, then one record after another. Everything is
+  a little-endian 32-bit integer, or bytes padded to a multiple of 4,
+  so that the arrays of a memory-mapped file can be used where they
+  are without copying. A record is:
+
+    its length in bytes, not counting this word,
+    the strings of STRINGS, each a byte length, -1 for None, then its
+      UTF-8 bytes,
+    the arrays of ARRAYS, each a length, -1 if the record doesn't have
+      it, then its integers.
+
+  "blocks" has BLOCK_FIELDS integers per block: start offset, end
+  offset, follow offset, loop offset and flags bitmask, with -1 for a
+  missing offset. The jump offsets of block b are
+  ``jumps[jump_start[b]:jump_start[b+1]]``, and the same goes for
+  exception offsets and successors. "structure" is the structure
+  tree in preorder: a ControlStructure is its index in "kinds" (a
+  newline-separated string), its block number and its number of
+  children; a list is STRUCTURE_LIST and its length; None is
+  STRUCTURE_NONE.
+
+  :copyright: (c) 2018 by Rocky Bernstein
+"""
+
+from __future__ import print_function
+
+import json
+import struct
+import sys
+from array import array
+
+from control_flow.batch import analyze_paths
+
+MAGIC = b'CFGR'
+FORMAT_VERSION = 1
+
+STRINGS = ('path', 'name', 'error', 'kinds')
+ARRAYS = ('blocks', 'jump_start', 'jumps', 'exception_start', 'exceptions',
+          'succ_start', 'succ', 'doms', 'pdoms', 'loop_depth', 'structure')
+BLOCK_FIELDS = 5
+
+STRUCTURE_LIST = -1
+STRUCTURE_NONE = -2
+
+BIG_ENDIAN = sys.byteorder == 'big'
+INT = struct.Struct('<i')
+
+
+def export_record(record, path):
+    """The record as exported, with `path` added"""
+    result = dict(record)
+    result['path'] = path
+    return result
+
+
+def write_json_lines(results, out):
+    """Write each (path, name, record) of `results`, as yielded by
+    batch.analyze_paths(), to text file `out` as a line of JSON."""
+    for path, name, record in results:
+        out.write(json.dumps(export_record(record, path), sort_keys=True,
+                             separators=(',', ':')))
+        out.write('\n')
+        pass
+    return
+
+
+def read_json_lines(f):
+    """Yield the exported records in JSON lines file `f`"""
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+        pass
+    return
+
+
+def csr(lists):
+    """The (start, items) arrays of a list of lists"""
+    start = array('i', [0])
+    items = array('i')
+    for values in lists:
+        items.extend(values)
+        start.append(len(items))
+        pass
+    return start, items
+
+
+def encode_structure(structure, kinds):
+    """The structure tree of a record as an array in preorder, adding
+    the kinds seen to list `kinds`"""
+    kind_index = dict((kind, i) for i, kind in enumerate(kinds))
+    tokens = array('i')
+    stack = [structure]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            tokens.extend((STRUCTURE_LIST, len(item)))
+            stack.extend(reversed(item))
+        elif item is None:
+            tokens.append(STRUCTURE_NONE)
+        else:
+            kind = item['kind']
+            if kind not in kind_index:
+                kind_index[kind] = len(kinds)
+                kinds.append(kind)
+            tokens.extend((kind_index[kind], item['block'],
+                           len(item['children'])))
+            stack.extend(reversed(item['children']))
+        pass
+    return tokens
+
+
+def decode_structure(tokens, kinds):
+    """The inverse of encode_structure()"""
+    root = []
+    # Each entry is a list to add to and the number of items still to
+    # go in it
+    stack = [[root, 1]]
+    i = 0
+    while stack:
+        if stack[-1][1] == 0:
+            stack.pop()
+            continue
+        stack[-1][1] -= 1
+        parent = stack[-1][0]
+        token = tokens[i]
+        if token == STRUCTURE_LIST:
+            item = []
+            stack.append([item, tokens[i+1]])
+            i += 2
+        elif token == STRUCTURE_NONE:
+            item = None
+            i += 1
+        else:
+            item = {'kind': kinds[token], 'block': tokens[i+1], 'children': []}
+            stack.append([item['children'], tokens[i+2]])
+            i += 3
+        parent.append(item)
+        pass
+    return root[0]
+
+
+def encode_binary(record, path):
+    """The (strings, arrays) of the binary form of `record`"""
+    strings = {'path': path, 'name': record['name'],
+               'error': record['error'], 'kinds': None}
+    arrays = {}
+    blocks = record.get('blocks')
+    if blocks is not None:
+        fields = array('i')
+        for block in blocks:
+            fields.extend(-1 if value is None else value
+                          for value in block[:BLOCK_FIELDS])
+            pass
+        arrays['blocks'] = fields
+        arrays['jump_start'], arrays['jumps'] = csr(block[5] for block in blocks)
+        arrays['exception_start'], arrays['exceptions'] = csr(
+            block[6] for block in blocks)
+    if 'successors' in record:
+        arrays['succ_start'], arrays['succ'] = csr(record['successors'])
+    for key in ('doms', 'pdoms', 'loop_depth'):
+        if key in record:
+            arrays[key] = array('i', record[key])
+        pass
+    if 'structure' in record:
+        kinds = []
+        arrays['structure'] = encode_structure(record['structure'], kinds)
+        strings['kinds'] = '\n'.join(kinds)
+    return strings, arrays
+
+
+def padded(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def write_binary(results, out):
+    """Write each (path, name, record) of `results`, as yielded by
+    batch.analyze_paths(), to binary file `out`."""
+    out.write(MAGIC + INT.pack(FORMAT_VERSION))
+    for path, name, record in results:
+        strings, arrays = encode_binary(record, path)
+        parts = []
+        for key in STRINGS:
+            if strings[key] is None:
+                parts.append(INT.pack(-1))
+            else:
+                data = strings[key].encode('utf-8')
+                parts.append(INT.pack(len(data)) + padded(data))
+            pass
+        for key in ARRAYS:
+            values = arrays.get(key)
+            if values is None:
+                parts.append(INT.pack(-1))
+                continue
+            if BIG_ENDIAN:
+                values = array('i', values)
+                values.byteswap()
+            parts.append(INT.pack(len(values)) + values.tobytes())
+            pass
+        data = b''.join(parts)
+        out.write(INT.pack(len(data)))
+        out.write(data)
+        pass
+    return
+
+
+def iter_binary(buffer):
+    """Yield a (strings, arrays) pair of dicts for each record in
+    `buffer`, the contents of a binary export, such as an mmap. The
+    arrays are memoryviews of integers into `buffer`, or None."""
+    view = memoryview(buffer)
+    if bytes(view[:4]) != MAGIC:
+        raise ValueError("Not a binary export of analysis records")
+    version = INT.unpack_from(view, 4)[0]
+    if version != FORMAT_VERSION:
+        raise ValueError("Binary export format %d, not %d"
+                         % (version, FORMAT_VERSION))
+    offset = 8
+    while offset < len(view):
+        offset += 4
+        strings = {}
+        arrays = {}
+        for key in STRINGS:
+            length = INT.unpack_from(view, offset)[0]
+            offset += 4
+            if length < 0:
+                strings[key] = None
+                continue
+            strings[key] = bytes(view[offset:offset+length]).decode('utf-8')
+            offset += length + (-length % 4)
+            pass
+        for key in ARRAYS:
+            length = INT.unpack_from(view, offset)[0]
+            offset += 4
+            if length < 0:
+                arrays[key] = None
+                continue
+            values = view[offset:offset + 4*length].cast('i')
+            if BIG_ENDIAN:
+                values = array('i', values)
+                values.byteswap()
+            arrays[key] = values
+            offset += 4*length
+            pass
+        yield strings, arrays
+        pass
+    return
+
+
+def decode_binary(strings, arrays):
+    """The exported record, as written in JSON lines, from the
+    (strings, arrays) of a binary record"""
+    record = {'path': strings['path'], 'name': strings['name'],
+              'error': strings['error']}
+    fields = arrays['blocks']
+    if fields is not None:
+        blocks = []
+        jump_start, jumps = arrays['jump_start'], arrays['jumps']
+        exception_start, exceptions = arrays['exception_start'], arrays['exceptions']
+        for b in range(len(fields) // BLOCK_FIELDS):
+            block = [None if value < 0 else value
+                     for value in fields[b*BLOCK_FIELDS:(b+1)*BLOCK_FIELDS]]
+            block.append(list(jumps[jump_start[b]:jump_start[b+1]]))
+            block.append(list(exceptions[exception_start[b]:exception_start[b+1]]))
+            blocks.append(block)
+            pass
+        record['blocks'] = blocks
+    if arrays['succ'] is not None:
+        succ_start, succ = arrays['succ_start'], arrays['succ']
+        record['successors'] = [list(succ[succ_start[v]:succ_start[v+1]])
+                                for v in range(len(succ_start) - 1)]
+    for key in ('doms', 'pdoms', 'loop_depth'):
+        if arrays[key] is not None:
+            record[key] = list(arrays[key])
+        pass
+    if arrays['structure'] is not None:
+        kinds = strings['kinds'].split('\n') if strings['kinds'] else []
+        record['structure'] = decode_structure(arrays['structure'], kinds)
+    return record
+
+
+def main(args=sys.argv[1:]):
+    """export.py [--binary] OUTPUT PATH...
+
+    Analyze the files and directories in PATH... and write the records
+    to OUTPUT as JSON lines, or in binary with --binary."""
+    binary = '--binary' in args
+    args = [arg for arg in args if arg != '--binary']
+    if len(args) < 2:
+        print(main.__doc__.strip(), file=sys.stderr)
+        return 1
+    output, paths = args[0], args[1:]
+    if binary:
+        with open(output, 'wb') as out:
+            write_binary(analyze_paths(paths), out)
+    else:
+        with open(output, 'w') as out:
+            write_json_lines(analyze_paths(paths), out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,10 @@
   :copyright: (c) 2014 by Romain Gaucher (@rgaucher)
 """
 
+from array import array
+from bisect import insort
+from itertools import count
+
 # First or Basic block that we entered on. Usually
 # at offset 0.
 # Does this need to be a set?
@@ -94,9 +98,77 @@ FLAG2NAME = {
 }
 
 
+# Kinds of edges in a flow graph
+EDGE_FALLTHROUGH    = 0
+EDGE_NO_FALLTHROUGH = 1
+EDGE_EXIT           = 2
+EDGE_FORWARD        = 3
+EDGE_FORWARD_SCOPE  = 4
+EDGE_BACKWARD       = 5
+EDGE_SELF_LOOP      = 6
+EDGE_EXCEPTION      = 7
+EDGE_DOM            = 8
+EDGE_PDOM           = 9
+
+# The names of the edge kinds; these are the "kind"s of DiGraph Edges
+EDGE2NAME = {
+  EDGE_FALLTHROUGH:    'fallthrough',
+  EDGE_NO_FALLTHROUGH: 'no fallthrough',
+  EDGE_EXIT:           'exit edge',
+  EDGE_FORWARD:        'forward',
+  EDGE_FORWARD_SCOPE:  'forward_scope',
+  EDGE_BACKWARD:       'backward',
+  EDGE_SELF_LOOP:      'self-loop',
+  EDGE_EXCEPTION:      'exception',
+  EDGE_DOM:            'dom-edge',
+  EDGE_PDOM:           'pdom-edge',
+}
+
+
 jump_flags = set([BB_JUMP_UNCONDITIONAL, BB_BREAK])
 nofollow_flags = set([BB_NOFOLLOW])
 
+
+class FlagSet(frozenset):
+    """
+      An immutable set of BB_... flags that also carries the flags as an
+      int bitmask in ``bits``.
+
+      There is only one FlagSet for a given bitmask, so a basic block
+      storing its flags costs just a reference. Use flag_set() to
+      get one.
+    """
+    __slots__ = ('bits',)
+
+    def __reduce__(self):
+        return (flag_set, (self.bits,))
+
+    def __repr__(self):
+        return 'FlagSet(%s)' % sorted(self)
+
+_flag_sets = {}
+
+def flag_set(flags):
+    """Return the shared FlagSet for ``flags``, which is either an int
+    bitmask or an iterable of BB_... flags."""
+    if isinstance(flags, FlagSet):
+        return flags
+    if isinstance(flags, int):
+        bits = flags
+    else:
+        bits = 0
+        for flag in flags:
+            bits |= 1 << flag
+            pass
+        pass
+    result = _flag_sets.get(bits)
+    if result is None:
+        result = FlagSet([flag for flag in range(bits.bit_length())
+                          if bits & (1 << flag)])
+        result.bits = bits
+        result = _flag_sets.setdefault(bits, result)
+    return result
+
 def format_flags(flags):
     return ', '.join([FLAG2NAME[flag] for flag in FLAG2NAME if flag in flags])
 
@@ -127,21 +199,20 @@ def format_flags_with_width(flags, max_width, newline):
 
 
 class Node(object):
-    GLOBAL_COUNTER = 0
+    __slots__ = ('number', 'flags', 'bb',
+                 # Filled in by TreeGraph and dominators.dfs_forest()
+                 'children', 'parent', 'doms', 'pdoms', 'reach_offset')
 
-    def __init__(self, bb):
-        Node.GLOBAL_COUNTER += 1
+    def __init__(self, bb, number=None):
+        # A node takes the number of its basic block. `number` is
+        # used only for a block without one.
         if bb.number is None:
-          self.number = Node.GLOBAL_COUNTER
+          self.number = number
         else:
           self.number = bb.number
         self.flags = bb.flags
         self.bb = bb
 
-    @classmethod
-    def reset(self):
-        self.GLOBAL_COUNTER = 0
-
     def __ne__(self, obj):
         return not self == obj
 
@@ -149,28 +220,27 @@ class Node(object):
         return isinstance(obj, Node) and obj.number == self.number
 
     def __hash__(self):
-        return hash('node-' + str(self.number))
+        return hash(self.number)
 
     def __repr__(self):
         return 'Node%d(flags=%s, bb=%s)' % (self.number, repr(self.flags), repr(self.bb))
 
 
-class Edge(object):
-    GLOBAL_COUNTER = 0
+# Ids for edges created outside of a graph
+_edge_ids = count(1)
 
+class Edge(object):
+    __slots__ = ('id', 'source', 'dest', 'kind', 'data')
 
-    def __init__(self, source, dest, kind, data):
-        Edge.GLOBAL_COUNTER += 1
-        self.id = Edge.GLOBAL_COUNTER
+    def __init__(self, source, dest, kind, data, id=None):
+        if id is None:
+            id = next(_edge_ids)
+        self.id = id
         self.source = source
         self.dest = dest
         self.kind = kind
         self.data = data
 
-    @classmethod
-    def reset(self):
-       self.GLOBAL_COUNTER = 0
-
     def __ne__(self, obj):
         return not self == obj
 
@@ -178,7 +248,7 @@ class Edge(object):
         return isinstance(obj, Edge) and obj.id == self.id
 
     def __hash__(self):
-        return hash('edge-' + str(self.id))
+        return hash(self.id)
 
     def __repr__(self):
         return 'Edge%d(source=%s, dest=%s, kind=%s, data=%s)' \
@@ -191,10 +261,12 @@ class DiGraph(object):
     """
 
     def __init__(self):
-        Node.reset()
-        Edge.reset()
         self.nodes = set()
         self.edges = set()
+        # Node and edge numbering is per graph, so graphs can be built
+        # concurrently.
+        self.node_count = 0
+        self.edge_count = 0
 
     def add_edge(self, edge):
         if edge in self.edges:
@@ -208,26 +280,36 @@ class DiGraph(object):
     def add_node(self, node):
         self.nodes.add(node)
 
-    def to_dot(self, show_exit=False):
+    def remove_edge(self, edge):
+        self.edges.remove(edge)
+
+    def to_dot(self, show_exit=False, components=None, out=None):
+        """Return the graph in dot format, or write it to `out`, a
+        writable file-like object, if that is given. If `components`
+        is the StrongComponents of the flow graph, each cycle of blocks
+        is drawn as a single node."""
         from control_flow.dotio import DotConverter
-        return DotConverter.process(self, show_exit)
+        return DotConverter.process(self, show_exit, components, out)
 
     @staticmethod
-    def make_node(bb):
-        return Node(bb)
+    def make_node(bb, number=None):
+        return Node(bb, number)
 
     @staticmethod
-    def make_edge(source=None, dest=None, kind=None, data=None):
-        return Edge(source=source, dest=dest, kind=kind, data=data)
+    def make_edge(source=None, dest=None, kind=None, data=None, id=None):
+        return Edge(source=source, dest=dest, kind=kind, data=data, id=id)
 
     # Some helpers
     def make_add_node(self, bb):
-        node = DiGraph.make_node(bb)
+        self.node_count += 1
+        node = DiGraph.make_node(bb, self.node_count)
         self.add_node(node)
         return node
 
     def make_add_edge(self, source=None, dest=None, kind=None, data=None):
-        edge = DiGraph.make_edge(source=source, dest=dest, kind=kind, data=data)
+        self.edge_count += 1
+        edge = DiGraph.make_edge(source=source, dest=dest, kind=kind, data=data,
+                                 id=self.edge_count)
         self.add_edge(edge)
         return edge
 
@@ -238,11 +320,13 @@ class TreeGraph(DiGraph):
     """
 
     def __init__(self, root):
-        Node.reset()
-        Edge.reset()
         self.root = root
         self.nodes = []
         self.edges = set()
+        self.node_count = 0
+        self.edge_count = 0
+        # The basic blocks of self.nodes, for add_node()
+        self.node_bbs = set()
 
     def add_edge(self, edge):
         if edge in self.edges:
@@ -256,21 +340,249 @@ class TreeGraph(DiGraph):
         dest_node.parent = set([source_node])
 
     def add_node(self, node):
-        if not node.bb in [n.bb for n in self.nodes]:
+        if node.bb not in self.node_bbs:
             node.children = set([])
             node.parent = None
             self.nodes.append(node)
+            self.node_bbs.add(node.bb)
 
-    def postorder_traverse(self):
+    def preorder_traverse(self):
         """Traverse the tree in preorder"""
         if self.nodes:
-            return self.postorder_traverse1(self.nodes[0])
+            stack = [self.nodes[0]]
+            while stack:
+                node = stack.pop()
+                yield node
+                stack.extend(node.children)
+                pass
+            pass
+        return
 
+    def postorder_traverse(self):
+        """Traverse the tree in postorder"""
+        if self.nodes:
+            stack = [(self.nodes[0], iter(self.nodes[0].children))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    stack.append((child, iter(child.children)))
+                    break
+                else:
+                    stack.pop()
+                    yield node
+                pass
+            pass
+        return
 
-    def postorder_traverse1(self, node):
-        """Traverse the tree in preorder"""
 
-        for child in node.children:
-            self.postorder_traverse1(child)
-            yield child
-        yield node
+class FlowGraph(object):
+    """
+      A compact directed graph whose vertices are the block numbers
+      0..n-1.
+
+      The successors of vertex v are
+      ``succ[succ_start[v]:succ_start[v+1]]`` and its predecessors are
+      ``pred[pred_start[v]:pred_start[v+1]]``, in the order that the
+      edges were given. All four are array('i')s, so going over them
+      creates no objects. These are the edges that the analyses
+      follow.
+
+      Separately, the edges drawn in a picture of the graph are kept,
+      each with an EDGE_... kind. There can be more of these, for
+      example a fallthrough that is never taken.
+
+      Once the graph is edited, see start_edits(), the edges are kept
+      in a list per vertex instead, so that an edit costs about the
+      degree of the vertices it touches. The four arrays are then
+      packed again only when they are asked for.
+    """
+    __slots__ = ('n', '_succ_start', '_succ', '_pred_start', '_pred',
+                 'edge_source', 'edge_dest', 'edge_kind',
+                 # Set by start_edits()
+                 'succ_lists', 'pred_lists', 'drawn', 'drawn_pairs',
+                 'drawn_count', 'packed')
+
+    def __init__(self, successors):
+        """`successors` gives, for each vertex, a sequence of the
+        vertices it has an edge to."""
+        self.n = n = len(successors)
+        self._succ_start = succ_start = array('i', [0]) * (n + 1)
+        self._succ = succ = array('i')
+        for v, dests in enumerate(successors):
+            succ.extend(dests)
+            succ_start[v+1] = len(succ)
+            pass
+
+        # Predecessors by counting sort on the destination. Sources
+        # are visited in order, so each predecessor list is ordered
+        # by source vertex.
+        self._pred_start = pred_start = array('i', [0]) * (n + 1)
+        for w in succ:
+            pred_start[w+1] += 1
+            pass
+        for v in range(n):
+            pred_start[v+1] += pred_start[v]
+            pass
+        self._pred = pred = array('i', [0]) * len(succ)
+        fill = pred_start[:n]
+        for v in range(n):
+            for i in range(succ_start[v], succ_start[v+1]):
+                w = succ[i]
+                pred[fill[w]] = v
+                fill[w] += 1
+                pass
+            pass
+
+        self.edge_source = array('i')
+        self.edge_dest = array('i')
+        self.edge_kind = array('b')
+        self.succ_lists = self.pred_lists = None
+        self.drawn = self.drawn_pairs = None
+        self.drawn_count = 0
+        self.packed = True
+
+    def start_edits(self):
+        """Get ready for insert_edge(), remove_edge() and their drawn
+        edge counterparts. The edges go into a list per vertex, and
+        the drawn edges into a dict keyed by a serial number, in the
+        order they were added, with ``drawn_pairs`` mapping each
+        (source, dest) to the serial numbers of its drawn edges. This
+        is done once; later calls do nothing."""
+        if self.succ_lists is not None:
+            return
+        n = self.n
+        succ_start, succ = self._succ_start, self._succ
+        pred_start, pred = self._pred_start, self._pred
+        self.succ_lists = [succ[succ_start[v]:succ_start[v+1]].tolist()
+                           for v in range(n)]
+        self.pred_lists = [pred[pred_start[v]:pred_start[v+1]].tolist()
+                           for v in range(n)]
+        self.drawn = drawn = {}
+        self.drawn_pairs = drawn_pairs = {}
+        for serial, edge in enumerate(zip(self.edge_source, self.edge_dest,
+                                          self.edge_kind)):
+            drawn[serial] = edge
+            drawn_pairs.setdefault(edge[:2], []).append(serial)
+            pass
+        self.drawn_count = len(drawn)
+        self.edge_source = self.edge_dest = self.edge_kind = None
+        return
+
+    def pack(self):
+        """Make the four arrays from the lists of an edited graph"""
+        if self.packed:
+            return
+        for lists, start_name, items_name in (
+                (self.succ_lists, '_succ_start', '_succ'),
+                (self.pred_lists, '_pred_start', '_pred')):
+            start = array('i', [0]) * (self.n + 1)
+            items = array('i')
+            for v, vertices in enumerate(lists):
+                items.extend(vertices)
+                start[v+1] = len(items)
+                pass
+            setattr(self, start_name, start)
+            setattr(self, items_name, items)
+            pass
+        self.packed = True
+        return
+
+    @property
+    def succ_start(self):
+        self.pack()
+        return self._succ_start
+
+    @property
+    def succ(self):
+        self.pack()
+        return self._succ
+
+    @property
+    def pred_start(self):
+        self.pack()
+        return self._pred_start
+
+    @property
+    def pred(self):
+        self.pack()
+        return self._pred
+
+    def successors(self, v):
+        if self.succ_lists is not None:
+            return self.succ_lists[v][:]
+        return self._succ[self._succ_start[v]:self._succ_start[v+1]]
+
+    def predecessors(self, v):
+        if self.pred_lists is not None:
+            return self.pred_lists[v][:]
+        return self._pred[self._pred_start[v]:self._pred_start[v+1]]
+
+    def out_degree(self, v):
+        if self.succ_lists is not None:
+            return len(self.succ_lists[v])
+        return self._succ_start[v+1] - self._succ_start[v]
+
+    def in_degree(self, v):
+        if self.pred_lists is not None:
+            return len(self.pred_lists[v])
+        return self._pred_start[v+1] - self._pred_start[v]
+
+    def insert_edge(self, source, dest):
+        """Add a flow edge from vertex `source` to vertex `dest`. It
+        goes last among the successors of `source`, and the
+        predecessors of `dest` stay ordered by source vertex."""
+        self.start_edits()
+        self.succ_lists[source].append(dest)
+        insort(self.pred_lists[dest], source)
+        self.packed = False
+        return
+
+    def remove_edge(self, source, dest):
+        """Remove the flow edge from vertex `source` to vertex `dest`.
+        ValueError is raised if there is no such edge."""
+        self.start_edits()
+        try:
+            self.succ_lists[source].remove(dest)
+        except ValueError:
+            raise ValueError("No flow edge %d -> %d" % (source, dest))
+        self.pred_lists[dest].remove(source)
+        self.packed = False
+        return
+
+    def remove_edges(self, source, dest):
+        """Remove the edges to draw from vertex `source` to vertex
+        `dest`, and return their kinds"""
+        self.start_edits()
+        drawn = self.drawn
+        return [drawn.pop(serial)[2]
+                for serial in self.drawn_pairs.pop((source, dest), ())]
+
+    def add_edge(self, source, dest, kind):
+        """Add an edge to draw from vertex `source` to vertex `dest`
+        of EDGE_... `kind`"""
+        if self.drawn is None:
+            self.edge_source.append(source)
+            self.edge_dest.append(dest)
+            self.edge_kind.append(kind)
+            return
+        serial = self.drawn_count
+        self.drawn_count += 1
+        self.drawn[serial] = (source, dest, kind)
+        self.drawn_pairs.setdefault((source, dest), []).append(serial)
+        return
+
+    def edges(self):
+        """Yield (source, dest, kind) for the edges to draw"""
+        if self.drawn is not None:
+            return iter(list(self.drawn.values()))
+        return zip(self.edge_source, self.edge_dest, self.edge_kind)
+
+    def to_digraph(self, blocks):
+        """Return the edges to draw as a DiGraph whose nodes are for
+        `blocks`, which are indexed by vertex number"""
+        g = DiGraph()
+        nodes = [g.make_add_node(block) for block in blocks]
+        for source, dest, kind in self.edges():
+            g.make_add_edge(nodes[source], nodes[dest], EDGE2NAME[kind])
+            pass
+        return g
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+  Loop nesting forest
+
+  Finds the loops of a flow graph from its edges alone, so it doesn't
+  depend on SETUP_LOOP instructions or on jumps going backwards by
+  offset. Loops nest in a forest; each loop is named by its header
+  block. Irreducible loops, which can be entered at more than one
+  block, are found too.
+
+  This is Havlak's algorithm, "Nesting of Reducible and Irreducible
+  Loops", TOPLAS 1997, with Ramalingam's correction from "Identifying
+  Loops in Almost Linear Time", TOPLAS 1999.
+
+  :copyright: (c) 2018 by Rocky Bernstein
+"""
+
+from array import array
+
+from control_flow.dominators import IndexTree, UNSET
+from control_flow.traversals import DepthFirst
+
+# Kinds of block in a LoopForest
+LOOP_NONE = 0         # not a loop header
+LOOP_SELF = 1         # a header whose loop is just itself
+LOOP_REDUCIBLE = 2    # a header with one way into its loop
+LOOP_IRREDUCIBLE = 3  # a header of a loop that can be entered elsewhere
+
+LOOP2NAME = {
+    LOOP_NONE: 'none',
+    LOOP_SELF: 'self',
+    LOOP_REDUCIBLE: 'reducible',
+    LOOP_IRREDUCIBLE: 'irreducible',
+}
+
+
+class LoopForest(object):
+    """
+      The loop nesting forest of FlowGraph `graph` from vertex `root`,
+      as arrays indexed by block number:
+
+        ``kind[v]`` is a LOOP_... kind, not LOOP_NONE if v heads a loop,
+        ``loop[v]`` is the header of the innermost loop that v is in,
+          which is v itself for a header, or -1,
+        ``parent_loop[h]`` is the header of the loop around the loop
+          headed by h, or -1,
+        ``depth[v]`` is the number of loops that v is in.
+
+      ``headers`` lists the loop headers in depth-first preorder,
+      ``back_edges`` the (source, dest) edges that close a loop, and
+      ``exits`` maps a header to the (source, dest) edges that leave
+      its loop. Blocks not reached from `root` are in no loop.
+
+      `dfs` is the DepthFirst search of `graph` from `root`, if there
+      is one already.
+    """
+    __slots__ = ('kind', 'loop', 'parent_loop', 'depth', 'headers',
+                 'back_edges', 'exits', 'tree')
+
+    def __init__(self, graph, root, dfs=None):
+        n = graph.n
+        if dfs is None:
+            dfs = DepthFirst(graph, root)
+        preorder, number = dfs.preorder, dfs.pre_number
+        count = len(preorder)
+
+        # last[w] is the largest preorder number in the depth-first
+        # subtree of w, so w is an ancestor of v when
+        # number[w] <= number[v] <= last[w]. Everything below is
+        # indexed by preorder number.
+        last = array('i', range(count))
+        for w in range(count - 1, 0, -1):
+            p = number[dfs.parent[preorder[w]]]
+            if last[p] < last[w]:
+                last[p] = last[w]
+            pass
+
+        pred_start, pred = graph.pred_start, graph.pred
+        back_preds = [[] for w in range(count)]
+        non_back_preds = [set() for w in range(count)]
+        self.back_edges = back_edges = []
+        for w in range(count):
+            vertex = preorder[w]
+            for i in range(pred_start[vertex], pred_start[vertex+1]):
+                v = number[pred[i]]
+                if v < 0:
+                    continue
+                if w <= v <= last[w]:
+                    back_preds[w].append(v)
+                    back_edges.append((pred[i], vertex))
+                else:
+                    non_back_preds[w].add(v)
+                pass
+            pass
+
+        # Union-find of blocks collapsed into the loops around them
+        union = array('i', range(count))
+        path = []
+
+        def find(v):
+            while union[v] != v:
+                path.append(v)
+                v = union[v]
+                pass
+            while path:
+                union[path.pop()] = v
+                pass
+            return v
+
+        header = array('i', [-1]) * count
+        kind = array('b', [LOOP_NONE]) * count
+        for w in range(count - 1, -1, -1):
+            body = set()
+            for v in back_preds[w]:
+                if v == w:
+                    kind[w] = LOOP_SELF
+                else:
+                    body.add(find(v))
+                pass
+            if not body:
+                continue
+            kind[w] = LOOP_REDUCIBLE
+            worklist = list(body)
+            while worklist:
+                x = worklist.pop()
+                for y in non_back_preds[x]:
+                    y = find(y)
+                    if not (w <= y <= last[w]):
+                        # An entry into the loop that doesn't go
+                        # through w
+                        kind[w] = LOOP_IRREDUCIBLE
+                        non_back_preds[w].add(y)
+                    elif y != w and y not in body:
+                        body.add(y)
+                        worklist.append(y)
+                    pass
+                pass
+            for x in body:
+                header[x] = w
+                union[x] = w
+                pass
+            pass
+
+        # Back to block numbers
+        self.kind = kinds = array('b', [LOOP_NONE]) * n
+        self.loop = loop = array('i', [-1]) * n
+        self.parent_loop = parent_loop = array('i', [-1]) * n
+        self.headers = headers = []
+        for w in range(count):
+            v = preorder[w]
+            h = header[w]
+            kinds[v] = kind[w]
+            if kind[w] != LOOP_NONE:
+                headers.append(v)
+                loop[v] = v
+                if h >= 0:
+                    parent_loop[v] = preorder[h]
+            elif h >= 0:
+                loop[v] = preorder[h]
+            pass
+
+        # The forest as a tree of blocks, to find loop bodies and
+        # nesting with IndexTree. A block's parent is the header of
+        # its innermost loop, or for a header, of the loop around it.
+        parent = array('i', [UNSET]) * n
+        for v in preorder:
+            if kinds[v] != LOOP_NONE:
+                parent[v] = v if parent_loop[v] < 0 else parent_loop[v]
+            elif loop[v] >= 0:
+                parent[v] = loop[v]
+            pass
+        self.tree = tree = IndexTree(parent)
+
+        self.depth = depth = array('i', [0]) * n
+        for v in tree.preorder:
+            if kinds[v] != LOOP_NONE:
+                depth[v] = 1 if parent_loop[v] < 0 else depth[parent_loop[v]] + 1
+            else:
+                depth[v] = depth[loop[v]]
+            pass
+
+        self.exits = exits = dict((h, []) for h in headers)
+        succ_start, succ = graph.succ_start, graph.succ
+        for u in preorder:
+            for i in range(succ_start[u], succ_start[u+1]):
+                x = succ[i]
+                h = loop[u]
+                while h >= 0 and not tree.contains(h, x):
+                    exits[h].append((u, x))
+                    h = parent_loop[h]
+                    pass
+                pass
+            pass
+        return
+
+    def is_header(self, v):
+        """Does block number `v` head a loop?"""
+        return self.kind[v] != LOOP_NONE
+
+    def is_irreducible(self, h):
+        """Is the loop headed by block number `h` irreducible?"""
+        return self.kind[h] == LOOP_IRREDUCIBLE
+
+    def in_loop(self, v, h):
+        """Is block number `v` in the loop headed by block number `h`,
+        either directly or in a loop inside it?"""
+        return self.kind[h] != LOOP_NONE and self.tree.contains(h, v)
+
+    def body(self, h):
+        """The block numbers of the loop headed by `h`, inner loops
+        included, in preorder of the forest"""
+        tree = self.tree
+        return tree.preorder[tree.pre_number[h]:tree.end_number[h] + 1]
@@ -3,54 +3,67 @@ from __future__ import print_function
 from xdis import PYTHON_VERSION, IS_PYPY
 from control_flow.bb import basic_blocks
 from control_flow.cfg import ControlFlowGraph
-from control_flow.dominators import DominatorTree, dfs_forest, build_dom_set
+from control_flow.dominators import DominatorTree
+from control_flow.render import Renderer
 from control_flow.structured_cf import (
-    print_structured_flow, build_control_structure, cs_tree_to_str
+    print_structured_flow, build_control_structure, cs_tree_to_str,
+    PrintTracer
 )
 
 import dis
-import os
 import sys
 
-def doit(fn, name):
+def doit(fn, name, verbose=False, renderer=None):
+    """Analyze function `fn`, writing its graphs under /tmp and
+    printing its control structure. With `verbose`, the basic blocks,
+    the disassembly and each block visited in structuring are printed
+    too.
+
+    The graphs are rendered to png by `renderer`, a Renderer, without
+    waiting for them. If there is none, one is made, waited for, and
+    its failures printed."""
+    if renderer is None:
+        with Renderer() as renderer:
+            cs_str = doit(fn, name, verbose, renderer)
+        for result in renderer.failures:
+            print("%s: %s" % (result.dot_path, result.error))
+        return cs_str
     print(name)
 
     bb_mgr = basic_blocks(PYTHON_VERSION, IS_PYPY, fn)
-    for bb in bb_mgr.bb_list:
-      print("\t", bb)
-    dis.dis(fn)
+    if verbose:
+        for bb in bb_mgr.bb_list:
+          print("\t", bb)
+        dis.dis(fn)
     cfg = ControlFlowGraph(bb_mgr)
     dot_path = '/tmp/flow-%s.dot' % name
     png_path = '/tmp/flow-%s.png' % name
-    open(dot_path, 'w').write(cfg.graph.to_dot(False))
+    with open(dot_path, 'w') as out:
+        cfg.graph.to_dot(False, out=out)
     print("%s written" % dot_path)
-
-    os.system("dot -Tpng %s > %s" % (dot_path, png_path))
+    renderer.render(dot_path, png_path)
     try:
-        dt = DominatorTree(cfg)
+        cfg.dom = DominatorTree(cfg)
 
-        cfg.dom_tree = dt.tree(False)
-        dfs_forest(cfg.dom_tree, False)
-        build_dom_set(cfg.dom_tree, False)
         dot_path = '/tmp/flow-dom-%s.dot' % name
         png_path = '/tmp/flow-dom-%s.png' % name
-        open(dot_path, 'w').write(cfg.dom_tree.to_dot())
+        with open(dot_path, 'w') as out:
+            cfg.dom_tree.to_dot(out=out)
         print("%s written" % dot_path)
-        os.system("dot -Tpng %s > %s" % (dot_path, png_path))
+        renderer.render(dot_path, png_path)
 
         print('*' * 30)
 
-        cfg.pdom_tree = dt.tree(True)
-        dfs_forest(cfg.pdom_tree, True)
-        build_dom_set(cfg.pdom_tree, True)
         dot_path = '/tmp/flow-pdom-%s.dot' % name
         png_path = '/tmp/flow-pdom-%s.png' % name
-        open(dot_path, 'w').write(cfg.pdom_tree.to_dot())
+        with open(dot_path, 'w') as out:
+            cfg.pdom_tree.to_dot(out=out)
         print("%s written" % dot_path)
-        os.system("dot -Tpng %s > %s" % (dot_path, png_path))
+        renderer.render(dot_path, png_path)
 
         print('=' * 30)
-        cs  = build_control_structure(cfg, cfg.entry_node)
+        cs  = build_control_structure(cfg, cfg.entry_node,
+                                      PrintTracer() if verbose else None)
         cs_marks = {}
         cs_str = cs_tree_to_str(cs, cs_marks)
         print(cs_str)
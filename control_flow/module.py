@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+  Whole-module analysis
+
+  Runs basic block, control-flow graph, dominator and control-structure
+  analysis over a module's code object and every code object nested in
+  it: functions, methods, classes, closures, lambdas and comprehensions.
+
+  :copyright: (c) 2018 by Rocky Bernstein
+"""
+
+from collections import OrderedDict
+from types import CodeType
+
+from xdis import PYTHON_VERSION, IS_PYPY
+
+from control_flow.bb import basic_blocks, get_opcode_info
+from control_flow.cfg import ControlFlowGraph
+from control_flow.dominators import DominatorTree
+from control_flow.structured_cf import build_control_structure
+
+# co_flags bit set on function-like code objects. Names nested inside
+# these get a "<locals>" component in their qualified name, the same
+# as Python's __qualname__.
+CO_OPTIMIZED = 0x0001
+
+
+class CodeAnalysis(object):
+    """
+      The results of analyzing a single code object.
+
+      If some phase of the analysis fails, ``error`` is the exception
+      raised and the results of that phase and later ones are None.
+    """
+
+    def __init__(self, name, code):
+        self.name = name
+        self.code = code
+        self.bb_mgr = None
+        self.cfg = None
+        self.dom = None
+        self.cs = None
+        self.error = None
+
+    def __repr__(self):
+        if self.error is not None:
+            status = 'error=%r' % (self.error,)
+        else:
+            status = 'blocks=%d' % len(self.bb_mgr.bb_list)
+        return 'CodeAnalysis(%s, %s)' % (self.name, status)
+
+
+def structure_record(cs):
+    """Convert a control-structure tree, as returned by
+    build_control_structure(), to plain data. ControlStructures become
+    dicts with "kind", "block" (the block number) and "children";
+    the nested lists of children stay lists."""
+    records = []
+    # Each entry is something to convert and the list to add its
+    # record to. Children are pushed last first, so they come off the
+    # stack in order.
+    stack = [(cs, records)]
+    while stack:
+        cs, parent = stack.pop()
+        if isinstance(cs, list):
+            record = []
+            stack.extend((child, record) for child in reversed(cs))
+        elif cs is None:
+            record = None
+        else:
+            record = {'kind': cs.kind, 'block': cs.block.number,
+                      'children': []}
+            stack.extend((child, record['children'])
+                         for child in reversed(cs.children))
+            pass
+        parent.append(record)
+        pass
+    return records[0]
+
+
+def analysis_record(analysis):
+    """Return the results in `analysis` as plain data (dicts, lists,
+    ints and strings) that can be pickled, cached or written as JSON.
+
+    "blocks" has, for each basic block: start offset, end offset,
+    follow offset, loop offset, flags bitmask, jump offsets and exception
+    offsets. "successors" has the successor block numbers of each
+    block. "doms" and "pdoms" give the immediate dominator and
+    post-dominator block number of each block, or -1 if it has none.
+    "loop_depth" gives the number of loops that each block is in.
+    """
+    record = {'name': analysis.name,
+              'error': None}
+    if analysis.error is not None:
+        record['error'] = '%s: %s' % (type(analysis.error).__name__, analysis.error)
+
+    if analysis.bb_mgr is not None:
+        bb_list = analysis.bb_mgr.bb_list
+        record['blocks'] = [[bb.start_offset, bb.end_offset, bb.follow_offset,
+                             bb.loop_offset, bb.flagbits,
+                             list(bb.jump_offsets), list(bb.exception_offsets)]
+                            for bb in bb_list]
+    if analysis.cfg is not None:
+        record['successors'] = [list(bb.successor_numbers) for bb in bb_list]
+        record['loop_depth'] = list(analysis.cfg.loops().depth)
+    if analysis.dom is not None:
+        for key, doms in (('doms', analysis.dom.doms), ('pdoms', analysis.dom.pdoms)):
+            idoms = [-1] * len(bb_list)
+            for bb, dom in doms.items():
+                idoms[bb.number] = dom.number
+                pass
+            record[key] = idoms
+            pass
+    if analysis.cs is not None:
+        record['structure'] = structure_record(analysis.cs)
+    return record
+
+
+def is_code(obj):
+    """True if `obj` is a code object, either a native one or one
+    produced by xdis' cross-version unmarshaller."""
+    return isinstance(obj, CodeType) or hasattr(obj, 'co_code')
+
+
+def load_code(source):
+    """Return (version, is_pypy, code) for `source`.
+
+    `source` is a code object or the path of a .py or .pyc file.
+    Source files are compiled by the running interpreter. A .pyc file
+    may be from any Python version in bb.PYTHON_VERSIONS; it is read
+    with xdis' cross-version unmarshaller.
+    """
+    if is_code(source):
+        return PYTHON_VERSION, IS_PYPY, source
+    if source.endswith('.py'):
+        with open(source) as f:
+            text = f.read()
+        return PYTHON_VERSION, IS_PYPY, compile(text, source, 'exec')
+    from xdis.load import load_module
+    version, timestamp, magic_int, co, is_pypy, source_size = load_module(source)
+    return version, is_pypy, co
+
+
+def code_objects(code, qualname=None):
+    """Yield (qualified name, code object) for `code` and every code
+    object nested within it, parents before children.
+
+    The top-level code object is named by its co_name, "<module>" for a
+    module. Qualified names follow Python's __qualname__ convention. A
+    name that has been used already gets a "#2", "#3", ... suffix, so
+    the names are unique.
+    """
+    seen = set()
+    names = set()
+    if qualname is None:
+        qualname = code.co_name
+    stack = [(qualname, code)]
+    while stack:
+        qualname, co = stack.pop()
+        if id(co) in seen:
+            continue
+        seen.add(id(co))
+        name = qualname
+        i = 1
+        while name in names:
+            i += 1
+            name = '%s#%d' % (qualname, i)
+            pass
+        names.add(name)
+        yield name, co
+
+        if co.co_flags & CO_OPTIMIZED:
+            prefix = name + '.<locals>.'
+        elif name == '<module>':
+            prefix = ''
+        else:
+            prefix = name + '.'
+        children = [(prefix + const.co_name, const)
+                    for const in co.co_consts if is_code(const)]
+        # Reversed so that children come off the stack in co_consts order.
+        stack.extend(reversed(children))
+        pass
+    return
+
+
+def analyze_code(name, code, version=PYTHON_VERSION, is_pypy=IS_PYPY,
+                 opcode_info=None, tracer=None):
+    """Analyze a single code object and return its CodeAnalysis.
+    `tracer`, a StructureTracer, follows its control structuring."""
+    analysis = CodeAnalysis(name, code)
+    try:
+        analysis.bb_mgr = basic_blocks(version, is_pypy, code, opcode_info)
+        analysis.cfg = cfg = ControlFlowGraph(analysis.bb_mgr)
+        analysis.dom = cfg.dom = DominatorTree(cfg)
+        analysis.cs = build_control_structure(cfg, cfg.entry_node, tracer)
+    except Exception as e:
+        analysis.error = e
+        pass
+    return analysis
+
+
+def analyze_module(source, tracer=None):
+    """Analyze a module and all of the code objects nested in it.
+
+    `source` is a module code object or the path of a .py or .pyc
+    file. The result maps each qualified name (see code_objects()) to
+    its CodeAnalysis, in the order the code objects were found.
+    If `tracer` is given, its begin() is called with each name.
+    """
+    version, is_pypy, code = load_code(source)
+    opcode_info = get_opcode_info(version, is_pypy)
+    result = OrderedDict()
+    for name, co in code_objects(code):
+        if tracer is not None:
+            tracer.begin(name)
+        result[name] = analyze_code(name, co, version, is_pypy, opcode_info,
+                                    tracer)
+        pass
+    return result
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+  Rendering dot files with Graphviz
+
+  Each dot file is rendered by running the Graphviz "dot" program,
+  with at most one process per worker thread running at a time. The
+  threads just wait on their process, so rendering many files takes
+  about as long as the slowest ones, not the sum of all of them.
+
+  Next to each picture is a stamp file with a hash of the dot text it
+  was made from. A dot file whose text hasn't changed since its
+  picture was made isn't rendered again.
+
+  :copyright: (c) 2018 by Rocky Bernstein
+"""
+
+from __future__ import print_function
+
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+
+replace = getattr(os, 'replace', os.rename)
+
+STAMP_SUFFIX = '.sha256'
+
+
+class RenderResult(object):
+    """
+      What happened to one dot file. ``rendered`` is False if the
+      picture was already up to date; ``error`` is a message if
+      rendering failed, and None otherwise.
+    """
+    __slots__ = ('dot_path', 'out_path', 'rendered', 'error')
+
+    def __init__(self, dot_path, out_path, rendered=False, error=None):
+        self.dot_path = dot_path
+        self.out_path = out_path
+        self.rendered = rendered
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            status = 'error=%r' % (self.error,)
+        else:
+            status = 'rendered' if self.rendered else 'up to date'
+        return 'RenderResult(%s, %s)' % (self.out_path, status)
+
+
+class Renderer(object):
+    """
+      Renders dot files to pictures of format `fmt`, such as "png" or
+      "svg", in a pool of `max_workers` threads, by default one per
+      core.
+
+      `program` is the command to run: the path of "dot", or a list of
+      arguments that starts something that takes the same options.
+
+      Use it in a ``with`` statement, or call close(), to wait for
+      everything submitted. ``failures`` collects the RenderResults of
+      the files that couldn't be rendered.
+    """
+
+    def __init__(self, max_workers=None, fmt='png', program='dot'):
+        if max_workers is None:
+            max_workers = cpu_count()
+        if isinstance(program, str):
+            program = [program]
+        self.fmt = fmt
+        self.program = list(program)
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.failures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def render(self, dot_path, out_path=None):
+        """Start rendering `dot_path` to `out_path`, by default the
+        same path with the format as its extension. Returns a Future
+        whose result is a RenderResult; failures are reported there
+        rather than raised."""
+        if out_path is None:
+            out_path = os.path.splitext(dot_path)[0] + '.' + self.fmt
+        return self.executor.submit(self.render_now, dot_path, out_path)
+
+    def digest(self, text):
+        """The hash that a picture made from dot `text` is stamped
+        with"""
+        h = hashlib.sha256()
+        h.update(('%s %s\n' % (' '.join(self.program), self.fmt)).encode('utf-8'))
+        h.update(text)
+        return h.hexdigest()
+
+    @staticmethod
+    def stamp(stamp_path, digest):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(stamp_path) or '.',
+                                        prefix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(digest)
+        replace(tmp_path, stamp_path)
+
+    def render_now(self, dot_path, out_path):
+        """Render `dot_path` to `out_path` in this thread, if it isn't
+        up to date, and return a RenderResult."""
+        result = RenderResult(dot_path, out_path)
+        stamp_path = out_path + STAMP_SUFFIX
+        try:
+            with open(dot_path, 'rb') as f:
+                digest = self.digest(f.read())
+            if os.path.exists(out_path):
+                try:
+                    with open(stamp_path) as f:
+                        if f.read() == digest:
+                            return result
+                except (IOError, OSError):
+                    pass
+                pass
+            # Don't leave a stamp for an old picture if this fails
+            if os.path.exists(stamp_path):
+                os.remove(stamp_path)
+            process = subprocess.Popen(
+                self.program + ['-T' + self.fmt, '-o', out_path, dot_path],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            output, errors = process.communicate()
+            if process.returncode != 0:
+                result.error = ('%s exited with status %d: %s'
+                                % (self.program[0], process.returncode,
+                                   errors.decode('utf-8', 'replace').strip()))
+            else:
+                self.stamp(stamp_path, digest)
+                result.rendered = True
+                pass
+        except (IOError, OSError) as e:
+            result.error = str(e)
+            pass
+        if result.error is not None:
+            self.failures.append(result)
+        return result
+
+
+def main(args=sys.argv[1:]):
+    """Render the dot files in `args` to png"""
+    with Renderer() as renderer:
+        futures = [renderer.render(path) for path in args]
+        for future in futures:
+            result = future.result()
+            if result.error is not None:
+                print("%s: %s" % (result.dot_path, result.error))
+            elif result.rendered:
+                print("%s written" % result.out_path)
+            else:
+                print("%s is up to date" % result.out_path)
+            pass
+        pass
+    return len(renderer.failures)
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
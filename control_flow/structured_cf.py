@@ -6,6 +6,7 @@ This code is ugly.
 
 """
 from __future__ import print_function
+from time import perf_counter
 from xdis.std import get_instructions
 from control_flow.graph import (BB_EXCEPT,
                                 BB_FINALLY, BB_END_FINALLY,
@@ -137,9 +138,113 @@ class Elif(ControlStructure):
   def __init__(self, block, elif_children):
       super(LoopControlStructure, self).__init__(block, 'elif', [elif_children])
 
-def build_control_structure(cfg, current):
+class StructureTracer(object):
+    """
+    Follows the building of control structures. Pass one to
+    build_control_structure() to be called back as blocks are
+    visited and classified; without one nothing is traced.
+
+    "depth" is how many structures down from the entry block the
+    call is.
+    """
+    def begin(self, name):
+        """Code object "name" is about to be structured. This is called
+        by analyze_code() and the batch driver, not by
+        build_control_structure()."""
+        pass
+
+    def visit(self, block, parent_kind, depth):
+        """"block" is reached from a structure of "parent_kind"."""
+        pass
+
+    def classify(self, block, kind, depth):
+        """"block" starts a structure of "kind"."""
+        pass
+
+    def leave(self, block, kind, depth):
+        """The structure of "kind" at "block" is finished."""
+        pass
+
+class PrintTracer(StructureTracer):
+    """Prints each block visited, to file "out" or to stdout"""
+    def __init__(self, out=None):
+        self.out = out
+
+    def visit(self, block, parent_kind, depth):
+        print("control_structure_iter: ", block, file=self.out)
+
+class StructureStats(StructureTracer):
+    """
+    Counts how often each kind of structure is chosen, the time spent
+    building structures of each kind, not counting the structures
+    nested in them, and the deepest nesting in each code object.
+    Stats from separate runs, say from batch workers, can be added
+    together with merge().
+    """
+    def __init__(self):
+        self.hits = {}
+        self.seconds = {}
+        self.max_depth = {}
+        self.name = None
+        # [start time, time in nested structures] of each structure
+        # being built
+        self.frames = []
+
+    def begin(self, name):
+        self.name = name
+        self.max_depth.setdefault(name, 0)
+        self.frames = []
+
+    def visit(self, block, parent_kind, depth):
+        if depth > self.max_depth.get(self.name, 0):
+            self.max_depth[self.name] = depth
+        self.frames.append([perf_counter(), 0.0])
+
+    def classify(self, block, kind, depth):
+        self.hits[kind] = self.hits.get(kind, 0) + 1
+
+    def leave(self, block, kind, depth):
+        start, nested = self.frames.pop()
+        elapsed = perf_counter() - start
+        self.seconds[kind] = self.seconds.get(kind, 0.0) + elapsed - nested
+        if self.frames:
+            self.frames[-1][1] += elapsed
+            pass
+        return
+
+    def merge(self, other):
+        """Add in the counts of StructureStats "other"."""
+        for kind, hits in other.hits.items():
+            self.hits[kind] = self.hits.get(kind, 0) + hits
+        for kind, seconds in other.seconds.items():
+            self.seconds[kind] = self.seconds.get(kind, 0.0) + seconds
+        for name, depth in other.max_depth.items():
+            self.max_depth[name] = max(depth, self.max_depth.get(name, 0))
+        return self
+
+    def summary(self, deepest=10):
+        """
+        A table of structure kinds, the most time first, then the
+        "deepest" code objects with the most nesting.
+        """
+        lines = ['%-32s %10s %10s %10s' % ('kind', 'hits', 'ms', 'us/hit')]
+        for kind in sorted(self.hits, key=lambda kind: (-self.seconds.get(kind, 0.0), kind)):
+            hits, seconds = self.hits[kind], self.seconds.get(kind, 0.0)
+            lines.append('%-32s %10d %10.3f %10.2f'
+                         % (kind, hits, seconds * 1e3, seconds * 1e6 / hits))
+            pass
+        lines.append('')
+        lines.append('%-54s %10s' % ('code object', 'max depth'))
+        names = sorted(self.max_depth, key=lambda name: (-self.max_depth[name], str(name)))
+        for name in names[:deepest]:
+            lines.append('%-54s %10d' % (name, self.max_depth[name]))
+            pass
+        return '\n'.join(lines) + '\n'
+
+def build_control_structure(cfg, current, tracer=None):
     cfg.seen_blocks = set()
-    cs, follow  = control_structure_iter(cfg, cfg.entry_node, None)
+    cs, follow  = control_structure_iter(cfg, cfg.entry_node, None,
+                                         tracer=tracer)
     # FIXME: assert that seen_blocks in control_stucture_short should
     # be all of blocks (except dead code)
     if follow:
@@ -147,11 +252,13 @@ def build_control_structure(cfg, current):
     # assert not set(cfg.blocks) - seen_blocks, "Some blocks not accounted for in structured cfg"
     return cs
 
-def loop_back(block):
-    predecessors = block.predecessors
+def loop_back(cfg, block):
+    flow = cfg.flow
+    v = block.number
     start_offset = block.index[0]
-    if len(predecessors) > 1:
-        for p in predecessors:
+    if flow.in_degree(v) > 1:
+        for p in flow.predecessors(v):
+            p = cfg.blocks[p]
             if p.index[0] > start_offset:
                 return p
             pass
@@ -166,8 +273,7 @@ def predecessor_pop_block(cfg, block):
     constructs
     """
     for jump_offset in block.jump_offsets:
-        jump_number = cfg.offset2block[jump_offset].bb.number
-        jump_block = cfg.blocks[jump_number]
+        jump_block = cfg.block_offsets[jump_offset]
         if (BB_STARTS_POP_BLOCK in jump_block.flags or
             BB_SINGLE_POP_BLOCK in jump_block.flags):
             return jump_block
@@ -175,24 +281,74 @@ def predecessor_pop_block(cfg, block):
     return None
 
 
-def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
-    print("control_structure_iter: ", current)
+def block_facts(cfg, block):
+    """
+    The things about "block" that structuring looks up, whichever
+    way it gets to the block: its follow block, a jump target that
+    pops a block (see predecessor_pop_block()) and a predecessor
+    that loops back to it (see loop_back()).
+    """
+    follow_block = None
+    if block.follow_offset is not None:
+        follow_block = cfg.block_offsets[block.follow_offset]
+    return (follow_block, predecessor_pop_block(cfg, block),
+            loop_back(cfg, block))
+
+
+def run_frames(frame):
+    """
+    Run generator "frame" to the end and return what it returns.
+    Instead of calling itself, a frame yields a new frame and is sent
+    back what that returns, so that nesting depth is limited by memory
+    rather than by the Python stack.
+    """
+    stack = [frame]
+    value = None
+    while stack:
+        try:
+            frame = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            continue
+        stack.append(frame)
+        value = None
+        pass
+    return value
+
+
+def control_structure_iter(cfg, current, parent, parent_kind='sequence',
+                           tracer=None):
+    """
+    Return the control structures starting at "current", and the
+    structure that follows them. "tracer" is a StructureTracer or None.
+    """
+    return run_frames(_structure(cfg, {}, tracer, 0, current, parent,
+                                 parent_kind))
+
+
+def _structure(cfg, facts, tracer, depth, current, parent, parent_kind):
+    # The body of control_structure_iter(). "facts" maps a block
+    # number to its block_facts().
+    if tracer is not None:
+        tracer.visit(current, parent_kind, depth)
 
     result = []
     follow = []
-    follow_block = None
     children = []
 
     cfg.seen_blocks.add(current)
     block = cfg.blocks[current.number]
+    dom = cfg.dominators(cfg.blocks)
 
     # Find follow block
-    if block.follow_offset is not None:
-        follow_number = cfg.offset2block[block.follow_offset].bb.number
-        follow_block = cfg.blocks[follow_number]
+    block_fact = facts.get(block.number)
+    if block_fact is None:
+        block_fact = facts[block.number] = block_facts(cfg, block)
+        pass
+    follow_block, ppb, loop_back_block = block_fact
 
     is_loop = BB_LOOP in current.flags
-    ppb = predecessor_pop_block(cfg, block)
     starts_pop_block = BB_STARTS_POP_BLOCK in block.flags
     if is_loop:
         kind = 'loop'
@@ -205,7 +361,7 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
     elif BB_END_FINALLY in current.flags:
         kind = 'end_finally'
     elif parent_kind == 'if':
-        children, follow = control_structure_iter(cfg, current, parent, 'sequence')
+        children, follow = yield _structure(cfg, facts, tracer, depth + 1, current, parent, 'sequence')
         kind = 'then'
     elif parent_kind == 'else':
         kind = 'sequence'
@@ -218,8 +374,7 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
         jump_offsets = list(block.jump_offsets)
         assert len(jump_offsets) == 1
         jump_offset = list(block.jump_offsets)[0]
-        jump_number = cfg.offset2block[jump_offset].bb.number
-        jump_block = cfg.blocks[jump_number]
+        jump_block = cfg.block_offsets[jump_offset]
         # For else blocks start with a POP_BLOCK and
         # do not end in an unconditional jump, but instead fall
         # through to the "for" end meet block.
@@ -240,7 +395,7 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
             kind = 'try_else_continue'
         else:
             kind = 'continue'
-    elif (parent_kind == 'loop' and loop_back(block) and ppb):
+    elif (parent_kind == 'loop' and loop_back_block and ppb):
         if BB_SINGLE_POP_BLOCK in ppb.flags:
             kind = 'while'
         else:
@@ -250,7 +405,7 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
         pass
     elif (parent_kind == 'try' and
           current.start_offset in parent.jump_offsets):
-        if parent in {node.bb for node in current.pdom_set}:
+        if dom.post_dominates(current, parent):
             kind = 'try meet'
         else:
             kind = 'try_else'
@@ -261,13 +416,15 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
         # FIXME: add others?
         kind = 'sequence'
 
+    if tracer is not None:
+        tracer.classify(current, kind, depth)
 
-    dominator_blocks = {n.bb for n in block.dom_set}
     if not children:
-        if BB_NOFOLLOW in current.flags or follow_block not in dominator_blocks:
+        if (BB_NOFOLLOW in current.flags or follow_block is None or
+            not dom.dominates(block, follow_block)):
             children = []
         else:
-            children, follow  = control_structure_iter(cfg, follow_block, current, kind)
+            children, follow  = yield _structure(cfg, facts, tracer, depth + 1, follow_block, current, kind)
             pass
         pass
 
@@ -289,11 +446,10 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
         result.append(ForElseControlStructure(block, children, []))
         pass
     elif kind == 'try':
-        for except_offset in sorted(block.exception_offsets | set(block.jump_offsets)):
-            except_number = cfg.offset2block[except_offset].bb.number
-            except_block = cfg.blocks[except_number]
+        for except_offset in sorted(set(block.exception_offsets) | set(block.jump_offsets)):
+            except_block = cfg.block_offsets[except_offset]
             if except_block not in cfg.seen_blocks:
-                except_children, follow  = control_structure_iter(cfg, except_block, current, kind)
+                except_children, follow  = yield _structure(cfg, facts, tracer, depth + 1, except_block, current, kind)
                 children.append(except_children)
             pass
         if children[-1] and children[-1][0] and children[-1][0].kind == 'try_else_continue':
@@ -313,7 +469,7 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
         result.append(FinallyControlStructure(block, children))
     elif kind == 'end_finally':
         # else block is fixed up below.
-        if follow_block in {node.bb for node in current.dom_set}:
+        if follow_block is not None and dom.dominates(current, follow_block):
             end_finally_block = SequenceControlStructure(follow_block, [])
         else:
             end_finally_block = []
@@ -328,7 +484,7 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
         result.append(IfControlStructure(block, children))
         pass
     elif kind == 'then':
-        if follow and current in {node.bb for node in parent.dom_set}:
+        if follow and dom.dominates(parent, current):
             children.append(follow)
             follow = None
             pass
@@ -349,16 +505,15 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
     #   we have already seen them; this happens in loop edges
     #   we do not dominate that block; here we defer to the encompassing dominator node
     for jump_offset in block.jump_offsets:
-        jump_number = cfg.offset2block[jump_offset].bb.number
-        jump_block = cfg.blocks[jump_number]
+        jump_block = cfg.block_offsets[jump_offset]
         # FIXME: may have to traverse in sequence, that is by dominator number or offset address?
-        if jump_block in dominator_blocks and jump_block not in cfg.seen_blocks:
+        if dom.dominates(block, jump_block) and jump_block not in cfg.seen_blocks:
             if kind == 'if':
                 if follow:
                     result.append(follow)
                     follow = []
                 # Is this "if else"?
-                if len(jump_block.predecessors) == 1:
+                if cfg.flow.in_degree(jump_block.number) == 1:
                     if (BB_STARTS_POP_BLOCK in jump_block.flags or
                         BB_SINGLE_POP_BLOCK in jump_block.flags):
                         # this is outside of the "if"
@@ -380,20 +535,16 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
                             follow = NoFollowControlStructure(jump_block)
                         else:
                             jump_kind = 'else'
-                            else_children, follow  = control_structure_iter(cfg, jump_block, current, jump_kind)
-                            jump_dominator_blocks = {n.bb for n in jump_block.dom_set}
-                            if follow and follow in jump_dominator_blocks:
-                                follow = None
-                                pass
+                            else_children, follow  = yield _structure(cfg, facts, tracer, depth + 1, jump_block, current, jump_kind)
                             result[0].children.append(
                                 ElseControlStructure(jump_block, else_children))
                             pass
                         pass
                     pass
                 else:
-                    assert len(jump_block.predecessors) != 0  # this would be dead code
+                    assert cfg.flow.in_degree(jump_block.number) != 0  # this would be dead code
                     jump_kind = 'sequence'
-                    children, follow  = control_structure_iter(cfg, jump_block, current, jump_kind)
+                    children, follow  = yield _structure(cfg, facts, tracer, depth + 1, jump_block, current, jump_kind)
                     if follow and jump_block.number != follow.block.number:
                         result[0].children.append(
                             SequenceControlStructure(jump_block, children))
@@ -404,7 +555,7 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
             else:
                 if kind not in ('then', 'else') or block.index[1] >= jump_offset:
                     # This is not quite right
-                    jump_children, follow = control_structure_iter(cfg, jump_block, current, kind)
+                    jump_children, follow = yield _structure(cfg, facts, tracer, depth + 1, jump_block, current, kind)
                     if kind in ['while_else', 'for_else']:
                         result[0].children[-1] = jump_children
                     elif len(jump_children) == 1:
@@ -417,27 +568,34 @@ def control_structure_iter(cfg, current, parent, parent_kind='sequence'):
                         pass
                 else:
                     jump_kind = 'sequence'
-                    follow, junk = control_structure_iter(cfg, jump_block, current, jump_kind)
+                    follow, junk = yield _structure(cfg, facts, tracer, depth + 1, jump_block, current, jump_kind)
                     assert not junk
                     pass
                 pass
             pass
         pass
+    if tracer is not None:
+        tracer.leave(current, kind, depth)
     return result, follow
 
 # FIXME: instead of or in additon to printing we need a structure
 # that can be used in a revised print_structured_flow.
 def cs_tree_to_str(cs_list, cs_marks, indent=''):
+    lines = []
+    run_frames(_cs_tree_lines(cs_list, cs_marks, indent, lines))
+    return ''.join(lines)
+
+def _cs_tree_lines(cs_list, cs_marks, indent, lines):
+    # The body of cs_tree_to_str(), adding to "lines"
 
     # pop(0), insert(0,x)
 
-    result = ''
     # FIXME: regularlize to pass in a list from the caller?
     if not isinstance(cs_list, list):
         cs_list = [cs_list]
 
     for cs in cs_list:
-        result += "%s%s %s\n" % (indent, cs.kind, cs.block)
+        lines.append("%s%s %s\n" % (indent, cs.kind, cs.block))
         if cs.kind in ('loop',
                        'while', 'while_else',
                        'for', 'for_else',
@@ -464,16 +622,16 @@ def cs_tree_to_str(cs_list, cs_marks, indent=''):
 
         for child in cs.children:
             if child and not cs.kind.startswith('sequence'):
-                result += cs_tree_to_str(child, cs_marks, indent + '  ')
+                yield _cs_tree_lines(child, cs_marks, indent + '  ', lines)
             else:
-                result += cs_tree_to_str(child, cs_marks, indent)
+                yield _cs_tree_lines(child, cs_marks, indent, lines)
                 pass
             pass
 
         if ((cs.children and cs.block.start_offset != cs.block.end_offset)
             or cs.kind == 'for'):
             assert cs.block.start_offset <= cs.block.end_offset
-            result += "%send %s\n" % (indent, cs.kind)
+            lines.append("%send %s\n" % (indent, cs.kind))
             pass
         pass
         if cs.kind in ('loop',
@@ -500,7 +658,7 @@ def cs_tree_to_str(cs_list, cs_marks, indent=''):
             offset_marks = cs_marks.get(end_offset, [])
             offset_marks.append('end_' + cs.kind)
             cs_marks[end_offset] = offset_marks
-    return result
+    return
 
 # FIXME: this will be redone to use the result of cs_tree_to_str
 def print_structured_flow(fn, cfg, current, cs_marks):
@@ -10,10 +10,16 @@
   :license: Apache 2, see LICENSE for more details.
 """
 
-from control_flow.graph import Edge
+from array import array
+from collections import deque
+from operator import attrgetter
 
 
 class EdgeVisitor(object):
+  """
+    Gets the edges that a Walker goes over. `visit` is called with
+    each Edge; if it returns True the walk stops there.
+  """
   def __init__(self):
     pass
 
@@ -23,11 +29,30 @@ class EdgeVisitor(object):
 
 class Walker(object):
   """
-    Traverses edges in the graph in DFS.
+    Traverses the edges of DiGraph `graph` reached from a node, calling
+    `visitor` with each edge once.
+
+    `order` is one of ORDERS:
+      "dfs": depth first, following the first edge of a node first,
+      "bfs": breadth first,
+      "rpo": the edges out of each node, with the nodes in reverse
+             post-order.
+    Edges of a kind in `skip_kinds`, such as 'exception', are neither
+    visited nor followed. The edges out of a node go in edge number
+    order.
+
+    Each edge and node is handled once, so a walk takes time linear in
+    the size of the graph.
   """
-  def __init__(self, graph, visitor):
+  ORDERS = ('dfs', 'bfs', 'rpo')
+
+  def __init__(self, graph, visitor, order='dfs', skip_kinds=()):
+    if order not in self.ORDERS:
+      raise ValueError("Unknown traversal order %r" % (order,))
     self._graph = graph
     self._visitor = visitor
+    self.order = order
+    self.skip_kinds = frozenset(skip_kinds)
     self.worklist = None
 
   @property
@@ -47,57 +72,144 @@ class Walker(object):
       self._visitor = value
       return
 
-  def traverse(self, root):
-      self.worklist = []
-      self.__run(root)
-      return
+  def out_edges(self):
+    """Map each node to the edges out of it that are followed"""
+    skip_kinds = self.skip_kinds
+    result = {}
+    for edge in sorted(self._graph.edges, key=attrgetter('id')):
+      if edge.kind not in skip_kinds:
+        result.setdefault(edge.source, []).append(edge)
+      pass
+    return result
 
-
-  def __run(self, root=None):
-    visited = set()
-    if root is not None:
-      self.__process(root)
-    while self.worklist:
-      current = self.worklist.pop(0)
-      if current in visited:
-        continue
-      self.__process(current)
-      visited.add(current)
-
-  def __process(self, current):
-    cur_node = None
-    if isinstance(current, Edge):
-      cur_node = current.dest
-      self.visitor.visit(current)
+  def traverse(self, root):
+    """Walk the graph from node `root`. Returns True if the visitor
+    stopped the walk."""
+    out_edges = self.out_edges()
+    if self.order == 'rpo':
+      return self.__run_rpo(root, out_edges)
+    return self.__run(root, out_edges)
+
+  def __run(self, root, out_edges):
+    visit = self._visitor.visit
+    depth_first = self.order == 'dfs'
+    self.worklist = worklist = deque()
+    reached = set([root])
+    no_edges = ()
+    if depth_first:
+      worklist.extend(reversed(out_edges.get(root, no_edges)))
+      pop = worklist.pop
     else:
-      cur_node = current
-
-    list_edges = cur_node.successors
-    for edge in list_edges:
-      self.worklist.insert(0, edge)
-
-
-# Recursive version of the post-order DFS, should only be used
-# when computing dominators on smallish CFGs
-
-# FIXME: This assumes the graph is strongly connected.
-# handle if it is a not.
-def dfs_postorder_nodes(graph, root, post_dom):
-    import sys
-    sys.setrecursionlimit(5000)
-    visited = set()
-
-    def _dfs(node, _visited):
-        _visited.add(node)
-        successors = node.predecessors if post_dom else node.successors
-        for dest_node in successors:
-            if dest_node not in _visited:
-                for child in _dfs(dest_node, _visited):
-                    yield child
-                    pass
-                pass
+      worklist.extend(out_edges.get(root, no_edges))
+      pop = worklist.popleft
+    while worklist:
+      edge = pop()
+      if visit(edge):
+        return True
+      dest = edge.dest
+      if dest not in reached:
+        reached.add(dest)
+        if depth_first:
+          worklist.extend(reversed(out_edges.get(dest, no_edges)))
+        else:
+          worklist.extend(out_edges.get(dest, no_edges))
+        pass
+      pass
+    return False
+
+  def __run_rpo(self, root, out_edges):
+    visit = self._visitor.visit
+    no_edges = ()
+    # Post-order of the nodes with an explicit stack
+    postorder = []
+    reached = set([root])
+    self.worklist = stack = deque([(root, iter(out_edges.get(root, no_edges)))])
+    while stack:
+      node, edges = stack[-1]
+      for edge in edges:
+        dest = edge.dest
+        if dest not in reached:
+          reached.add(dest)
+          stack.append((dest, iter(out_edges.get(dest, no_edges))))
+          break
+        pass
+      else:
+        stack.pop()
+        postorder.append(node)
+      pass
+    for node in reversed(postorder):
+      for edge in out_edges.get(node, no_edges):
+        if visit(edge):
+          return True
+        pass
+      pass
+    return False
+
+
+class DepthFirst(object):
+    """
+      A depth-first search of FlowGraph `graph` from vertex `root`. If
+      `post_dom` is true, edges are followed backwards.
+
+      ``preorder`` and ``postorder`` list the vertices reached.
+      ``pre_number``, ``post_number`` and ``rpo_number`` give the
+      position of each vertex in pre-order, post-order and reverse
+      post-order, and ``parent`` its parent in the depth-first tree;
+      all are -1 for a vertex not reached, and ``parent`` is -1 for
+      the root too.
+
+      The search uses an explicit stack, so it works on graphs of any
+      depth.
+    """
+    __slots__ = ('root', 'post_dom', 'preorder', 'postorder', 'parent',
+                 'pre_number', 'post_number', 'rpo_number')
+
+    def __init__(self, graph, root, post_dom=False):
+        self.root = root
+        self.post_dom = post_dom
+        if post_dom:
+            start, targets = graph.pred_start, graph.pred
+        else:
+            start, targets = graph.succ_start, graph.succ
+        n = graph.n
+        self.parent = parent = array('i', [-1]) * n
+        self.pre_number = pre_number = array('i', [-1]) * n
+        self.post_number = post_number = array('i', [-1]) * n
+        self.preorder = preorder = [root]
+        self.postorder = postorder = []
+        pre_number[root] = 0
+        # The vertices on the current path, and for each the index in
+        # targets of the next edge to look at
+        stack = [root]
+        edge_stack = [start[root]]
+        while stack:
+            v = stack[-1]
+            i = edge_stack[-1]
+            end = start[v+1]
+            while i < end:
+                w = targets[i]
+                i += 1
+                if pre_number[w] < 0:
+                    break
+            else:
+                post_number[v] = len(postorder)
+                postorder.append(v)
+                stack.pop()
+                edge_stack.pop()
+                continue
+            edge_stack[-1] = i
+            pre_number[w] = len(preorder)
+            parent[w] = v
+            preorder.append(w)
+            stack.append(w)
+            edge_stack.append(start[w])
+            pass
+
+        self.rpo_number = rpo_number = array('i', [-1]) * n
+        last = len(postorder) - 1
+        for v in postorder:
+            rpo_number[v] = last - post_number[v]
             pass
-        yield node
-        return
 
-    return [n for n in _dfs(root, visited)]
+    def reverse_postorder(self):
+        return self.postorder[::-1]
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+"""Time batch analysis of a directory with different numbers of
+worker processes. By default the "email" package of the standard
+library is used.
+
+Timings go to stderr.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+from multiprocessing import cpu_count
+from control_flow.batch import analyze_paths
+
+if len(sys.argv) > 1:
+    paths = sys.argv[1:]
+else:
+    paths = [os.path.join(os.path.dirname(os.__file__), 'email')]
+
+workers = 1
+base = None
+while workers <= cpu_count():
+    start = time.time()
+    count = sum(1 for result in analyze_paths(paths, max_workers=workers))
+    elapsed = time.time() - start
+    if base is None:
+        base = elapsed
+    print("%2d workers: %d code objects in %.2f s, speedup %.2fx"
+          % (workers, count, elapsed, base / elapsed), file=sys.stderr)
+    workers *= 2
+    pass
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""Measure memory used per basic block, with and without the
+control-flow graph built over the blocks."""
+from __future__ import print_function
+import sys
+import tracemalloc
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+
+def make_function(n):
+    lines = ['def big(a, b):', '    c = 0']
+    for i in range(n):
+        lines += ['    if a > %d:' % i,
+                  '        c += a',
+                  '    else:',
+                  '        c -= b',
+                  '    while b > %d:' % i,
+                  '        b -= 1']
+    lines.append('    return c')
+    ns = {}
+    exec('\n'.join(lines), ns)
+    return ns['big']
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+fn = make_function(n)
+
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+bb_mgr = basic_blocks(PYTHON_VERSION, IS_PYPY, fn)
+after_bb = tracemalloc.get_traced_memory()[0]
+cfg = ControlFlowGraph(bb_mgr)
+after_cfg = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+
+blocks = float(len(bb_mgr.bb_list))
+print("%d blocks" % blocks)
+print("basic blocks:        %7.1f bytes/block" % ((after_bb - before) / blocks))
+print("basic blocks + cfg:  %7.1f bytes/block" % ((after_cfg - before) / blocks))
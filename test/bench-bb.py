@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Time basic_blocks() against xdis_basic_blocks() on large
+generated functions."""
+from __future__ import print_function
+import sys
+import timeit
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks, xdis_basic_blocks
+
+def make_function(n):
+    """Build a function with roughly ``n`` if/while/for statements"""
+    lines = ['def big(a, b):', '    c = 0']
+    for i in range(n):
+        if i % 3 == 0:
+            lines += ['    if a > %d:' % i,
+                      '        c += a',
+                      '    else:',
+                      '        c -= b']
+        elif i % 3 == 1:
+            lines += ['    while b > %d:' % i,
+                      '        b -= 1',
+                      '        if b == a:',
+                      '            break']
+        else:
+            lines += ['    for x in range(%d):' % i,
+                      '        c += x']
+    lines.append('    return c')
+    ns = {}
+    exec('\n'.join(lines), ns)
+    return ns['big']
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+for n in sizes:
+    fn = make_function(n)
+    blocks = len(basic_blocks(PYTHON_VERSION, IS_PYPY, fn).bb_list)
+    repeat = max(1, 2000 // n)
+    slow = min(timeit.repeat(lambda: xdis_basic_blocks(PYTHON_VERSION, IS_PYPY, fn),
+                             number=repeat, repeat=3)) / repeat
+    fast = min(timeit.repeat(lambda: basic_blocks(PYTHON_VERSION, IS_PYPY, fn),
+                             number=repeat, repeat=3)) / repeat
+    print("%5d statements %6d blocks: xdis %8.3f ms  direct %8.3f ms  speedup %.1fx"
+          % (n, blocks, slow * 1000, fast * 1000, slow / fast))
+
+# Per-call overhead matters when there are many tiny functions
+def tiny(a):
+    if a:
+        return 1
+    return 2
+
+number = 20000
+per_call = min(timeit.repeat(lambda: basic_blocks(PYTHON_VERSION, IS_PYPY, tiny),
+                             number=number, repeat=3)) / number
+print("tiny function: %.1f us per basic_blocks() call" % (per_call * 1e6))
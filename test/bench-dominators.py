@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Time the CHK and SEMI-NCA dominator engines on generated functions
+of increasing size, to see where each one wins. The "auto" engine
+switches at dominators.SEMI_NCA_MIN_BLOCKS. Then time keeping the
+dominators up to date through small edits against computing them
+again."""
+from __future__ import print_function
+import random
+import sys
+import time
+import timeit
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.dominators import (
+    chk_dominators, semi_nca_dominators, SEMI_NCA_MIN_BLOCKS)
+
+def make_function(n, depth):
+    """Build a function with ``n`` statements, loops and ifs nested
+    ``depth`` deep"""
+    lines = ['def big(a, b):', '    c = 0']
+    for i in range(n):
+        indent = '    ' * (1 + i % depth)
+        if i % depth == depth - 1 or i % 2:
+            lines += [indent + 'if a > %d:' % i,
+                      indent + '    c += a',
+                      indent + 'else:',
+                      indent + '    c -= b']
+        else:
+            lines += [indent + 'while b > %d:' % i,
+                      indent + '    b -= 1',
+                      indent + '    if b == a:',
+                      indent + '        break']
+    lines.append('    return c')
+    ns = {}
+    exec('\n'.join(lines), ns)
+    return ns['big']
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [2, 5, 10, 20, 50, 100, 300, 1000]
+print("auto uses SEMI-NCA from %d blocks" % SEMI_NCA_MIN_BLOCKS)
+for depth in (1, 8):
+    for n in sizes:
+        cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY,
+                                            make_function(n, depth)))
+        graph = cfg.flow
+        entry, exit = cfg.entry_node.number, cfg.exit_node.number
+
+        def chk():
+            chk_dominators(graph, entry, False, cfg.blocks)
+            chk_dominators(graph, exit, True, cfg.blocks)
+
+        def semi_nca():
+            semi_nca_dominators(graph, entry, False)
+            semi_nca_dominators(graph, exit, True)
+
+        number = max(1, 20000 // graph.n)
+        chk_time = min(timeit.repeat(chk, number=number, repeat=3)) / number
+        semi_time = min(timeit.repeat(semi_nca, number=number, repeat=3)) / number
+        print("depth %d %5d statements %6d blocks: CHK %8.3f ms  SEMI-NCA %8.3f ms  %s"
+              % (depth, n, graph.n, chk_time * 1000, semi_time * 1000,
+                 'CHK' if chk_time < semi_time else 'SEMI-NCA'))
+
+rnd = random.Random(1)
+for n in sizes:
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY,
+                                        make_function(n, 8)))
+    graph, blocks = cfg.flow, cfg.blocks
+    entry, exit = cfg.entry_node.number, cfg.exit_node.number
+    cfg.dominators(blocks).start_edits()
+    edits = 100
+    start = time.time()
+    for i in range(edits):
+        # A nearby jump, as a patch would add or take away
+        source = rnd.randrange(len(blocks))
+        dest = min(len(blocks) - 1, source + rnd.randint(1, 10))
+        source, dest = blocks[source], blocks[dest]
+        if dest.number in source.successor_numbers:
+            cfg.remove_edge(source, dest)
+        else:
+            cfg.add_edge(source, dest)
+        pass
+    edit_time = (time.time() - start) / edits
+    start = time.time()
+    semi_nca_dominators(graph, entry, False, exact=True)
+    semi_nca_dominators(graph, exit, True, exact=True)
+    build_time = time.time() - start
+    print("%6d blocks: edit %8.3f ms  rebuild %8.3f ms"
+          % (graph.n, edit_time * 1000, build_time * 1000))
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""Time writing the flow graph of generated functions in dot format,
+up to about 20000 blocks, to a file and as a string. The time per
+block should stay about the same."""
+from __future__ import print_function
+import os
+import sys
+import time
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+
+def make_function(n):
+    """Build a function with ``n`` if statements in a row"""
+    lines = ['def big(a):']
+    for i in range(n):
+        lines += ['    if a == %d:' % i, '        a += 1']
+    lines.append('    return a')
+    ns = {}
+    exec('\n'.join(lines), ns)
+    return ns['big']
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [1250, 2500, 5000, 10000]
+for n in sizes:
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, make_function(n)))
+    graph = cfg.graph
+    blocks = len(cfg.blocks)
+    start = time.time()
+    with open(os.devnull, 'w') as out:
+        graph.to_dot(False, out=out)
+    file_time = time.time() - start
+    start = time.time()
+    graph.to_dot(False)
+    string_time = time.time() - start
+    print("%6d blocks: file %8.3f ms, %5.2f us per block; string %8.3f ms"
+          % (blocks, file_time * 1000, file_time * 1e6 / blocks,
+             string_time * 1000))
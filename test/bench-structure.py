@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""Time building control structures for generated functions of
+increasing size, up to about 5000 blocks. The time per block should
+stay about the same."""
+from __future__ import print_function
+import sys
+import time
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.dominators import DominatorTree
+from control_flow.structured_cf import build_control_structure
+
+def make_function(n, shape):
+    """Build a function with ``n`` tests, either in a row or as an
+    elif chain"""
+    lines = ['def big(a):']
+    for i in range(n):
+        if shape == 'elif':
+            lines += ['    %s a == %d:' % ('elif' if i else 'if', i),
+                      '        a += %d' % i]
+        else:
+            lines += ['    if a == %d:' % i, '        a += 1']
+    lines.append('    return a')
+    ns = {}
+    exec('\n'.join(lines), ns)
+    return ns['big']
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [300, 600, 1250, 2500]
+for shape in ('if', 'elif'):
+    for n in sizes:
+        cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY,
+                                            make_function(n, shape)))
+        cfg.dom = DominatorTree(cfg)
+        start = time.time()
+        build_control_structure(cfg, cfg.entry_node)
+        elapsed = time.time() - start
+        print("%-4s %5d blocks: %8.3f ms, %6.2f us per block"
+              % (shape, len(cfg.blocks), elapsed * 1000,
+                 elapsed * 1e6 / len(cfg.blocks)))
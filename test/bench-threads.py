@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""Time batch analysis in a thread pool with different numbers of
+threads. Threads only speed things up on a free-threaded (no-GIL)
+Python build; with the GIL, expect no speedup. By default the "email"
+package of the standard library is used.
+
+Timings go to stderr.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+from multiprocessing import cpu_count
+from control_flow.batch import analyze_paths
+
+if len(sys.argv) > 1:
+    paths = sys.argv[1:]
+else:
+    paths = [os.path.join(os.path.dirname(os.__file__), 'email')]
+
+gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+print("GIL %s, %d CPUs" % ('enabled' if gil else 'disabled', cpu_count()),
+      file=sys.stderr)
+
+threads = 1
+base = None
+while threads <= cpu_count():
+    start = time.time()
+    count = sum(1 for result in analyze_paths(paths, max_workers=threads,
+                                              use_threads=True))
+    elapsed = time.time() - start
+    if base is None:
+        base = elapsed
+    print("%2d threads: %d code objects in %.2f s, speedup %.2fx"
+          % (threads, count, elapsed, base / elapsed), file=sys.stderr)
+    threads *= 2
+    pass
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Check that basic_blocks(), which decodes co_code directly, gives
+the same basic blocks as the xdis Instruction-based
+xdis_basic_blocks()."""
+import sys
+import os.path as osp
+from glob import glob
+from types import CodeType
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks, xdis_basic_blocks
+
+def code_objects(co):
+    yield co
+    for const in co.co_consts:
+        if isinstance(const, CodeType):
+            for child in code_objects(const):
+                yield child
+
+def block_info(fn, co):
+    try:
+        bb_mgr = fn(PYTHON_VERSION, IS_PYPY, co)
+    except Exception as e:
+        # Both should fail in the same way
+        return type(e)
+    return [(bb.number, bb.index, sorted(bb.flags), bb.follow_offset,
+             bb.loop_offset, sorted(bb.jump_offsets),
+             sorted(bb.exception_offsets), bb.edge_count)
+            for bb in bb_mgr.bb_list]
+
+if len(sys.argv) == 1:
+    mydir = osp.dirname(osp.abspath(__file__))
+    files = (glob(mydir + '/../examples/*.py') +
+             glob(mydir + '/../control_flow/*.py'))
+else:
+    files = sys.argv[1:]
+    pass
+
+total = count = 0
+for filename in files:
+    module_code = compile(open(filename).read(), filename, 'exec')
+    for co in code_objects(module_code):
+        got = block_info(basic_blocks, co)
+        want = block_info(xdis_basic_blocks, co)
+        if got != want:
+            print("%s: %s differs" % (filename, co.co_name))
+        else:
+            count += 1
+        total += 1
+        pass
+    pass
+
+print("%d code objects, %d same." % (total, count))
+assert count == total
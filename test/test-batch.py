@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Check that batch analysis gives the same records and structuring
+stats as analyzing each module in turn."""
+import os.path as osp
+from control_flow.batch import analyze_paths, find_files, make_chunks
+from control_flow.module import analyze_module, analysis_record
+from control_flow.structured_cf import StructureStats
+
+mydir = osp.dirname(osp.abspath(__file__))
+example_dir = osp.join(mydir, '..', 'examples')
+
+chunks = make_chunks([(size, 'x') for size in (10, 5000, 300, 4000, 20)], 4096)
+assert [[size for size, x in chunk] for chunk in chunks] == [[5000], [4000, 300], [20, 10]]
+
+want = {}
+want_hits = {}
+want_depth = {}
+for path in find_files([example_dir]):
+    stats = StructureStats()
+    for name, analysis in analyze_module(path, stats).items():
+        want[path, name] = analysis_record(analysis)
+    for kind, hits in stats.hits.items():
+        want_hits[kind] = want_hits.get(kind, 0) + hits
+    for name, depth in stats.max_depth.items():
+        want_depth['%s: %s' % (path, name)] = depth
+    pass
+
+got = {}
+got_stats = StructureStats()
+for path, name, record in analyze_paths([example_dir], max_workers=2,
+                                        stats=got_stats):
+    got[path, name] = record
+
+assert sorted(got.keys()) == sorted(want.keys())
+for key in want:
+    assert got[key] == want[key], key
+assert got_stats.hits == want_hits
+assert got_stats.max_depth == want_depth
+assert sorted(got_stats.seconds) == sorted(got_stats.hits)
+assert sum(got_stats.hits.values()) > len(got)
+summary = got_stats.summary(3).splitlines()
+assert len(summary) == 1 + len(got_stats.hits) + 2 + 3
+print("%d code objects checked." % len(got))
@@ -15,4 +15,4 @@ filename = sys.argv[1]
 exec(open(filename).read())
 short = osp.basename(filename)[0:-3]
 
-doit(testing, short)  # NOQA
+doit(testing, short, verbose=True)  # NOQA
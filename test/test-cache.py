@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Check the on-disk analysis cache, on its own and in batch runs."""
+import os.path as osp
+import shutil
+import tempfile
+from control_flow.batch import analyze_paths
+from control_flow.cache import AnalysisCache, code_key
+
+cache_dir = tempfile.mkdtemp()
+try:
+    cache = AnalysisCache(cache_dir)
+    assert cache.get('ab' * 32) is None
+    cache.put('ab' * 32, {'name': 'x', 'blocks': [1, 2, 3]})
+    assert cache.get('ab' * 32, 'y') == {'name': 'y', 'blocks': [1, 2, 3]}
+
+    # Same bytecode, same key; different bytecode, different key.
+    def f(a):
+        return a + 1
+    def g(b):
+        return b + 1
+    def h(a):
+        return a - 1
+    assert code_key(f.__code__, 3.7, False) == code_key(g.__code__, 3.7, False)
+    assert code_key(f.__code__, 3.7, False) != code_key(h.__code__, 3.7, False)
+    assert code_key(f.__code__, 3.7, False) != code_key(f.__code__, 3.6, False)
+
+    # Eviction keeps the cache size bounded
+    small = AnalysisCache(cache_dir, max_size=2000)
+    for i in range(50):
+        small.put('%064x' % i, {'data': 'x' * 100})
+    assert small.total_size() <= 2000
+    assert small.get('%064x' % 49) is not None
+    assert small.get('%064x' % 0) is None
+
+    # A warm batch run is all cache hits and gives the same records.
+    example_dir = osp.join(osp.dirname(osp.abspath(__file__)), '..', 'examples')
+    cache = AnalysisCache(cache_dir)
+    cold = sorted(analyze_paths([example_dir], max_workers=2, cache=cache))
+    assert cache.hits == 0
+    cache = AnalysisCache(cache_dir)
+    warm = sorted(analyze_paths([example_dir], max_workers=2, cache=cache))
+    assert cache.misses == 0 and cache.hits == len(warm)
+    assert warm == cold
+
+    # Overlapping paths reach the same file twice; it is analyzed once.
+    cache = AnalysisCache(tempfile.mkdtemp(dir=cache_dir))
+    loops_path = osp.join(example_dir, '..', 'control_flow', 'loops.py')
+    overlapping = sorted(analyze_paths([loops_path, example_dir, loops_path],
+                                       max_workers=2, cache=cache,
+                                       use_threads=True))
+    alone = sorted(analyze_paths([loops_path], max_workers=2, use_threads=True))
+    assert [r for r in overlapping if r[0] == loops_path] == alone
+    assert len(overlapping) == len(alone) + len(cold)
+finally:
+    shutil.rmtree(cache_dir)
+print("cache checks passed.")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Check strongly connected components and their condensation against
+reachability, drawing with cycles collapsed, and that deep graphs are
+handled without recursion."""
+import glob
+import os.path as osp
+import random
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.components import StrongComponents
+from control_flow.graph import FlowGraph
+
+def reachable(graph, v):
+    seen = set([v])
+    work = [v]
+    while work:
+        for w in graph.successors(work.pop()):
+            if w not in seen:
+                seen.add(w)
+                work.append(w)
+    return seen
+
+def check(graph, where):
+    n = graph.n
+    scc = StrongComponents(graph)
+    reach = [reachable(graph, v) for v in range(n)]
+    for v in range(n):
+        for w in range(n):
+            same = w in reach[v] and v in reach[w]
+            assert same == (scc.component[v] == scc.component[w]), where
+    assert sorted(scc.blocks) == list(range(n)), where
+    for c in range(scc.count):
+        members = list(scc.members(c))
+        assert members == sorted(members) and len(members) == scc.size(c), where
+        assert all(scc.component[v] == c for v in members), where
+        v = members[0]
+        assert scc.is_cyclic(c) == any(v in graph.successors(u) for u in members), where
+        # Condensation edges go forward in topological order
+        for d in scc.dag.successors(c):
+            assert c < d, where
+        expected = set(scc.component[w] for u in members
+                       for w in graph.successors(u)) - set([c])
+        assert list(scc.dag.successors(c)) == sorted(expected), where
+        pass
+    return scc
+
+#   0 -> 1 <-> 2 -> 3 -> 3
+#              |
+#              4 -> 5 -> 4
+scc = check(FlowGraph([[1], [2], [1, 3, 4], [3], [5], [4]]), 'example')
+assert scc.count == 4
+assert [list(scc.members(c)) for c in range(4)] == [[0], [1, 2], [4, 5], [3]]
+assert [scc.is_cyclic(c) for c in range(4)] == [False, True, True, True]
+
+rnd = random.Random(19)
+for i in range(500):
+    n = rnd.randint(1, 20)
+    successors = [sorted(set(rnd.randrange(n) for j in range(rnd.choice([0, 1, 1, 2, 3]))))
+                  for v in range(n)]
+    check(FlowGraph(successors), i)
+    pass
+
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+    scc = cfg.components()
+    assert scc is cfg.components()
+    check(cfg.flow, path)
+    # A loop's blocks are all in one cycle
+    loops = cfg.loops()
+    for h in loops.headers:
+        assert len(set(scc.component[v] for v in loops.body(h))) == 1, path
+    dot = cfg.graph.to_dot(False, scc)
+    for c in range(scc.count):
+        if scc.size(c) > 1:
+            assert dot.count('  cycle_%d [shape' % c) == 1, path
+            assert 'block_%d ' % scc.members(c)[0] not in dot, path
+        pass
+    assert cfg.graph.to_dot(False).count(' -> ') >= dot.count(' -> '), path
+    pass
+
+# A cycle far longer than the recursion limit
+n = 100000
+scc = StrongComponents(FlowGraph([[v + 1] for v in range(n - 1)] + [[0]]))
+assert scc.count == 1 and scc.is_cyclic(0)
+print("%d examples checked." % len(paths))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Check that bytecode of other Python versions is analyzed the same
+way whatever version of Python runs the analysis."""
+import binascii
+from control_flow.bb import basic_blocks, xdis_basic_blocks, get_opcode_info
+from control_flow.graph import BB_EXCEPT, BB_BREAK
+from control_flow.module import analyze_code
+
+# co_code of this function, as compiled by Python 2.7 and 3.6:
+#
+# def f(a):
+#     while a:
+#         try:
+#             a = a - 1
+#         except ValueError:
+#             break
+#     return a
+CO_CODE = {
+    2.7: ('782d007c0000722f00790e007c0000640100187d000057710300047400006b0a00'
+          '722b000101015071030058710300577c000053'),
+    3.6: ('782c7c00722c790c7c00640118007d0057007102040074006b0a72280100010001'
+          '005000590071025800710257007c005300'),
+}
+
+# Start offset of the exception handler
+EXCEPT_OFFSET = {2.7: 36, 3.6: 36}
+
+
+class Code(object):
+    """Just enough of a code object for basic_blocks()"""
+    def __init__(self, co_code):
+        self.co_code = co_code
+        self.co_consts = ()
+        self.co_flags = 0
+
+
+for version, co_code in sorted(CO_CODE.items()):
+    code = Code(binascii.unhexlify(co_code))
+    bb_mgr = basic_blocks(version, False, code)
+    blocks = [repr(bb) for bb in bb_mgr.bb_list]
+    assert blocks == [repr(bb) for bb in
+                      xdis_basic_blocks(version, False, code).bb_list], version
+    except_blocks = [bb.start_offset for bb in bb_mgr.bb_list
+                     if BB_EXCEPT in bb.flags]
+    assert except_blocks == [EXCEPT_OFFSET[version]], (version, except_blocks)
+    assert any(BB_BREAK in bb.flags for bb in bb_mgr.bb_list), version
+
+    analysis = analyze_code('f', code, version, False)
+    assert analysis.error is None, (version, analysis.error)
+    print("%s: %d blocks" % (version, len(blocks)))
+    pass
+
+for version in (2.6, 2.7, 3.4, 3.5, 3.6, 3.7):
+    for is_pypy in (False, True):
+        opcode_info = get_opcode_info(version, is_pypy)
+        assert opcode_info.opcode.version == version
+        pass
+    pass
+
+try:
+    get_opcode_info(3.3, False)
+except RuntimeError:
+    pass
+else:
+    assert False, "3.3 bytecode should not be supported"
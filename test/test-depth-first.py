@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Check the depth-first numberings, and that deep flow graphs and
+dominator trees are handled without recursion."""
+import sys
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.dominators import (
+    DominatorTree, IndexTree, UNSET, dfs_forest, build_dom_set)
+from control_flow.graph import FlowGraph
+from control_flow.traversals import DepthFirst
+
+recursion_limit = sys.getrecursionlimit()
+
+#   0 -> 1 -> 3
+#    \-> 2 -/
+#   4 is not reached
+g = FlowGraph([[1, 2], [3], [3], [], [0]])
+dfs = DepthFirst(g, 0)
+assert dfs.preorder == [0, 1, 3, 2]
+assert dfs.postorder == [3, 1, 2, 0]
+assert dfs.reverse_postorder() == [0, 2, 1, 3]
+assert list(dfs.pre_number) == [0, 1, 3, 2, -1]
+assert list(dfs.post_number) == [3, 1, 2, 0, -1]
+assert list(dfs.rpo_number) == [0, 2, 1, 3, -1]
+assert list(dfs.parent) == [-1, 0, 0, 1, -1]
+dfs = DepthFirst(g, 3, post_dom=True)
+assert dfs.preorder == [3, 1, 0, 4, 2]
+
+# Index tree orders, children in block number order
+tree = IndexTree([0, 0, 0, 1, UNSET, 3])
+assert tree.preorder == [0, 1, 3, 5, 2]
+assert list(tree.postorder()) == [5, 3, 1, 2, 0]
+assert list(tree.parent) == [-1, 0, 0, 1, -1, 3]
+
+# A long chain is far deeper than the recursion limit
+n = 100000
+dfs = DepthFirst(FlowGraph([[v + 1] for v in range(n - 1)] + [[]]), 0)
+assert dfs.postorder == list(range(n - 1, -1, -1))
+
+# As is the dominator tree of many statements in a row
+lines = ['def long(a):']
+for i in range(600):
+    lines += ['    if a == %d:' % i, '        a += 1']
+lines.append('    return a')
+ns = {}
+exec('\n'.join(lines), ns)
+cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['long']))
+assert cfg.depth_first() is cfg.depth_first()
+dom = DominatorTree(cfg)
+for do_pdoms in (False, True):
+    t = dom.tree(do_pdoms)
+    dfs_forest(t, do_pdoms)
+    build_dom_set(t, do_pdoms)
+    assert len(list(t.postorder_traverse())) == len(t.nodes)
+    assert len(list(t.preorder_traverse())) == len(t.nodes)
+    tree = dom.index_tree(do_pdoms)
+    assert sorted(tree.postorder()) == sorted(tree.preorder) == list(range(len(cfg.blocks)))
+    pass
+cfg.dom = dom
+assert cfg.dom_tree is cfg.dom_tree and cfg.pdom_tree is cfg.pdom_tree
+assert len(cfg.entry_node.dom_set) == len(cfg.blocks)
+assert len(cfg.exit_node.pdom_set) == len(cfg.blocks)
+assert cfg.entry_node.reach_offset == cfg.exit_node.end_offset
+
+assert sys.getrecursionlimit() == recursion_limit
+print("%d blocks handled." % len(cfg.blocks))
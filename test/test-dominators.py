@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""Check that the SEMI-NCA dominator engine gives the same results as
+CHK, on the examples and on random graphs, and that dominance and
+nearest common dominator queries agree with the dominator sets."""
+import glob
+import os.path as osp
+from array import array
+import random
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.dominators import (
+    DominatorTree, IndexTree, UNSET, build_dom_set, chk_dominators,
+    dfs_forest, semi_nca_dominators)
+from control_flow.graph import FlowGraph
+
+def dom_numbers(doms):
+    return [(b.number, d if d is None else d.number) for b, d in doms.items()]
+
+def ancestors(idom, v):
+    """v and the blocks above it in the tree, nearest first"""
+    result = [v]
+    while idom[v] >= 0 and idom[v] != v:
+        v = idom[v]
+        result.append(v)
+    return result
+
+def naive_nca(idom, a, b):
+    if idom[a] == UNSET or idom[b] == UNSET:
+        return -1
+    above_b = set(ancestors(idom, b))
+    for v in ancestors(idom, a):
+        if v in above_b:
+            return v
+    return -1
+
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+    chk = DominatorTree(cfg, 'chk')
+    semi_nca = DominatorTree(cfg, 'semi-nca')
+    assert dom_numbers(chk.doms) == dom_numbers(semi_nca.doms), path
+    assert dom_numbers(chk.pdoms) == dom_numbers(semi_nca.pdoms), path
+
+    for do_pdoms in (False, True):
+        t = chk.tree(do_pdoms)
+        dfs_forest(t, do_pdoms)
+        build_dom_set(t, do_pdoms)
+        pass
+    for a in cfg.blocks:
+        dom_set = set(node.bb for node in a.dom_set)
+        pdom_set = set(node.bb for node in getattr(a, 'pdom_set', ()))
+        for b in cfg.blocks:
+            assert chk.dominates(a, b) == (b in dom_set), (path, a, b)
+            assert chk.post_dominates(a, b) == (b in pdom_set), (path, a, b)
+            assert chk.strictly_dominates(a, b) == (b in dom_set and a is not b)
+            for post_dom in (False, True):
+                idom = chk.ipdom if post_dom else chk.idom
+                v = naive_nca(idom, a.number, b.number)
+                assert (chk.nearest_common_dominator([a, b], post_dom) ==
+                        (cfg.blocks[v] if v >= 0 else None)), (path, a, b)
+                pass
+            pass
+        pass
+    reached = list(chk.doms)
+    assert chk.nearest_common_dominator(reached) is cfg.entry_node
+    assert chk.nearest_common_dominator([]) is None
+    pass
+
+# Nearest common ancestors in random forests
+rnd = random.Random(16)
+for i in range(300):
+    n = rnd.randint(1, 40)
+    idom = array('i', [UNSET]) * n
+    for v in range(n):
+        choice = rnd.random()
+        if choice < 0.1:
+            idom[v] = v
+        elif choice < 0.9 and v:
+            d = rnd.randrange(v)
+            if idom[d] != UNSET:
+                idom[v] = d
+        pass
+    tree = IndexTree(idom)
+    for k in range(50):
+        a, b = rnd.randrange(n), rnd.randrange(n)
+        assert tree.nca(a, b) == naive_nca(idom, a, b), (i, a, b)
+        pass
+    pass
+
+# Preorder interval numbering; 4 is unreachable and 6 dominates itself only
+#     0
+#    / \
+#   1   2
+#   |
+#   3 - 5
+tree = IndexTree([0, 0, 0, 1, UNSET, 3, 6])
+assert tree.preorder == [0, 1, 3, 5, 2, 6]
+assert list(tree.pre_number) == [0, 1, 4, 2, -1, 3, 5]
+assert list(tree.end_number) == [4, 3, 4, 3, -1, 3, 5]
+assert tree.contains(1, 5) and tree.contains(0, 2) and not tree.contains(2, 3)
+assert not tree.contains(4, 4) and not tree.contains(0, 4) and not tree.contains(0, 6)
+
+# Random graphs, irreducible ones included
+rnd = random.Random(10)
+compared = 0
+for i in range(2000):
+    n = rnd.randint(1, 30)
+    successors = [set(rnd.randrange(n) for j in range(rnd.choice([0, 1, 2, 2, 3])))
+                  for v in range(n)]
+    graph = FlowGraph([sorted(dests) for dests in successors])
+    blocks = list(range(n))
+    for post_dom in (False, True):
+        entry = rnd.randrange(n) if post_dom else 0
+        result = semi_nca_dominators(graph, entry, post_dom)
+        if result is None:
+            # CHK has its own answer here
+            assert post_dom
+            continue
+        idom, order = chk_dominators(graph, entry, post_dom, blocks)
+        assert (list(idom), order) == (list(result[0]), result[1]), (i, post_dom)
+        compared += 1
+        pass
+    pass
+
+try:
+    DominatorTree(cfg, 'fastest')
+except ValueError:
+    pass
+else:
+    assert False, "Unknown engine should be rejected"
+print("%d examples and %d random graphs agree." % (len(paths), compared))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""Check that dominators kept up to date through edge insertions and
+deletions match the dominators computed again from scratch."""
+import glob
+import os.path as osp
+import random
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.components import StrongComponents
+from control_flow.dominators import DynamicDominators, semi_nca_dominators
+from control_flow.graph import FlowGraph, EDGE2NAME
+from control_flow.loops import LoopForest
+from control_flow.traversals import DepthFirst
+
+def check(dynamic, graph, root, post_dom, where):
+    idom = semi_nca_dominators(graph, root, post_dom, exact=True)[0]
+    assert list(dynamic.idom) == list(idom), where
+    fresh = DynamicDominators(graph, root, post_dom)
+    assert list(dynamic.depth) == list(fresh.depth), where
+    assert ([sorted(kids) for kids in dynamic.kids] ==
+            [sorted(kids) for kids in fresh.kids]), where
+
+# Random graphs and random edits, irreducible ones included
+rnd = random.Random(15)
+updates = 0
+for i in range(300):
+    n = rnd.randint(2, 30)
+    successors = [sorted(set(rnd.randrange(n) for j in range(rnd.choice([0, 1, 1, 2, 3]))))
+                  for v in range(n)]
+    graph = FlowGraph(successors)
+    edges = set((v, w) for v in range(n) for w in successors[v])
+    root = rnd.randrange(n)
+    trees = [DynamicDominators(graph, root, post_dom) for post_dom in (False, True)]
+    for k in range(40):
+        if edges and rnd.random() < 0.5:
+            v, w = rnd.choice(sorted(edges))
+            edges.remove((v, w))
+            graph.remove_edge(v, w)
+            trees[0].delete(v, w)
+            trees[1].delete(w, v)
+        else:
+            v, w = rnd.randrange(n), rnd.randrange(n)
+            if (v, w) in edges:
+                continue
+            edges.add((v, w))
+            graph.insert_edge(v, w)
+            trees[0].insert(v, w)
+            trees[1].insert(w, v)
+            pass
+        for post_dom in (False, True):
+            check(trees[post_dom], graph, root, post_dom, (i, k, post_dom))
+            pass
+        updates += 1
+        pass
+    pass
+
+# The FlowGraph arrays after edits are those of a new FlowGraph
+graph = FlowGraph([[1, 2], [2], [0]])
+graph.insert_edge(2, 1)
+graph.insert_edge(0, 0)
+graph.remove_edge(0, 2)
+fresh = FlowGraph([[1, 0], [2], [0, 1]])
+for v in range(3):
+    assert list(graph.successors(v)) == list(fresh.successors(v))
+    assert list(graph.predecessors(v)) == list(fresh.predecessors(v))
+    pass
+for name in ('succ_start', 'succ', 'pred_start', 'pred'):
+    assert getattr(graph, name) == getattr(fresh, name), name
+graph.add_edge(0, 1, 1)
+graph.add_edge(1, 2, 2)
+graph.add_edge(0, 1, 3)
+graph.start_edits()
+graph.add_edge(2, 0, 4)
+assert graph.remove_edges(0, 1) == [1, 3]
+assert list(graph.edges()) == [(1, 2, 2), (2, 0, 4)]
+try:
+    graph.remove_edge(1, 0)
+except ValueError:
+    pass
+else:
+    assert False, "Removing a missing edge should fail"
+
+# Edits through a ControlFlowGraph
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+    dom = cfg.dominators(cfg.blocks)
+    blocks = cfg.blocks
+    cfg.graph, cfg.dom_tree, cfg.pdom_tree, cfg.loops(), cfg.components()
+    for k in range(10):
+        source, dest = rnd.choice(blocks), rnd.choice(blocks)
+        if dest.number in source.successor_numbers:
+            cfg.remove_edge(source, dest)
+        else:
+            cfg.add_edge(source, dest)
+            pass
+        for block in blocks:
+            assert tuple(cfg.flow.successors(block.number)) == block.successor_numbers
+            assert tuple(cfg.flow.predecessors(block.number)) == block.predecessor_numbers
+            pass
+        for post_dom, doms in ((False, dom.doms), (True, dom.pdoms)):
+            root = cfg.exit_node if post_dom else cfg.entry_node
+            idom = semi_nca_dominators(cfg.flow, root.number, post_dom, exact=True)[0]
+            assert dict((b.number, d.number) for b, d in doms.items()) == dict(
+                (v, d) for v, d in enumerate(idom) if d >= 0), (path, k, post_dom)
+            pass
+        assert dom.dominates(cfg.entry_node, dest) == (dest in dom.doms)
+
+        # What was kept through the edit is what would be made again
+        entry = cfg.entry_node.number
+        for post_dom in (False, True):
+            root = cfg.exit_node.number if post_dom else entry
+            fresh = DepthFirst(cfg.flow, root, post_dom)
+            assert cfg.depth_first(post_dom).preorder == fresh.preorder, (path, k)
+        fresh = LoopForest(cfg.flow, entry)
+        loops = cfg.loops()
+        assert (loops.headers, list(loops.depth), loops.exits) == (
+            fresh.headers, list(fresh.depth), fresh.exits), (path, k)
+        # The same components, maybe numbered in another topological order
+        condensations = []
+        for scc in (cfg.components(), StrongComponents(cfg.flow)):
+            members = [tuple(scc.members(c)) for c in range(scc.count)]
+            condensations.append(sorted(
+                (members[c], scc.is_cyclic(c),
+                 sorted(members[d] for d in scc.dag.successors(c)))
+                for c in range(scc.count)))
+            assert all(c < d for c in range(scc.count)
+                       for d in scc.dag.successors(c)), (path, k)
+        assert condensations[0] == condensations[1], (path, k)
+        assert sorted((e.source.number, e.dest.number, e.kind)
+                      for e in cfg.graph.edges) == sorted(
+            (v, w, EDGE2NAME[kind]) for v, w, kind in cfg.flow.edges()), (path, k)
+        for post_dom in (False, True):
+            assert sorted((e.source.number, e.dest.number)
+                          for e in cfg.tree_graph(post_dom).edges) == sorted(
+                (e.source.number, e.dest.number)
+                for e in dom.tree(post_dom).edges), (path, k, post_dom)
+        pass
+    pass
+print("%d updates and %d examples checked." % (updates, len(paths)))
@@ -2,6 +2,7 @@
 import sys
 import os.path as osp
 from control_flow.main import doit
+from control_flow.render import Renderer
 from glob import glob
 
 def testing():
@@ -16,6 +17,8 @@ else:
     pass
 
 total = count = 0
+# One renderer for all the graphs, so that they are drawn in parallel
+renderer = Renderer()
 for filename in files:
 
     # FIXME: redo with import module
@@ -23,7 +26,7 @@ for filename in files:
 
     short = osp.basename(filename)[0:-3]
 
-    cs = doit(testing, short)  # NOQA
+    cs = doit(testing, short, renderer=renderer)  # NOQA
     got = cs.strip()
     # want = expect().strip()  # NOQA
     print("filename %s fails" % filename)
@@ -38,7 +41,9 @@ for filename in files:
         pass
     total += 1
     pass
-
+renderer.close()
+for result in renderer.failures:
+    print("%s: %s" % (result.dot_path, result.error))
 
 print("%d tests, %d passed." % (total, count))
 assert count == total
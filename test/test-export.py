@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Check that records exported as JSON lines and in binary, read back
+from a memory-mapped file, are the records that were written."""
+import io
+import mmap
+import os.path as osp
+import shutil
+import tempfile
+from control_flow.batch import analyze_paths, error_record
+from control_flow.export import (
+    decode_binary, export_record, iter_binary, main, read_json_lines,
+    write_binary, write_json_lines)
+
+def by_name(record):
+    return record['path'], record['name']
+
+mydir = osp.dirname(osp.abspath(__file__))
+example_dir = osp.join(mydir, '..', 'examples')
+
+results = list(analyze_paths([example_dir], max_workers=2))
+results.append(('missing.py', None, error_record(None, IOError("no such file"))))
+want = [export_record(record, path) for path, name, record in results]
+assert all(len(record['loop_depth']) == len(record['blocks'])
+           for record in want if record['error'] is None)
+assert any(max(record['loop_depth']) > 0
+           for record in want if record['error'] is None)
+
+out = io.StringIO()
+write_json_lines(results, out)
+assert out.getvalue().count('\n') == len(results)
+assert list(read_json_lines(io.StringIO(out.getvalue()))) == want
+
+out = io.BytesIO()
+write_binary(results, out)
+assert [decode_binary(*arrays) for arrays in iter_binary(out.getvalue())] == want
+
+tmpdir = tempfile.mkdtemp()
+try:
+    # Through the command line, and a memory-mapped file
+    path = osp.join(tmpdir, 'records.bin')
+    assert main(['--binary', path, example_dir]) == 0
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        got = []
+        for strings, arrays in iter_binary(mapped):
+            doms = arrays['doms']
+            assert isinstance(doms, memoryview) and doms.obj is mapped
+            got.append(decode_binary(strings, arrays))
+            del doms, arrays
+            pass
+        mapped.close()
+    assert sorted(got, key=by_name) == sorted(want[:-1], key=by_name)
+
+    path = osp.join(tmpdir, 'records.jsonl')
+    assert main([path, example_dir]) == 0
+    with open(path) as f:
+        assert sorted(read_json_lines(f), key=by_name) == sorted(want[:-1], key=by_name)
+finally:
+    shutil.rmtree(tmpdir)
+
+try:
+    list(iter_binary(b'not a binary export'))
+except ValueError:
+    pass
+else:
+    assert False, "A file that isn't an export should be rejected"
+print("%d records exported." % len(results))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""Check the FlowGraph of a ControlFlowGraph against its basic blocks
+and the DiGraph made from it, and writing the DiGraph in dot format."""
+import glob
+import os.path as osp
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.graph import EDGE2NAME, FlowGraph
+
+# Predecessors come out in source order whatever order the edges are in.
+g = FlowGraph([[2, 1], [2], [0]])
+assert list(g.successors(0)) == [2, 1]
+assert list(g.predecessors(2)) == [0, 1]
+assert list(g.predecessors(0)) == [2]
+assert g.out_degree(1) == 1 and g.in_degree(1) == 1
+
+class Writes(object):
+    """A file that keeps each write"""
+    def __init__(self):
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(text)
+
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+    flow = cfg.flow
+    assert flow.n == len(cfg.blocks)
+    for block in cfg.blocks:
+        v = block.number
+        assert tuple(flow.successors(v)) == block.successor_numbers, path
+        assert tuple(flow.predecessors(v)) == block.predecessor_numbers, path
+        pass
+
+    edges = sorted((e.id, e.source.number, e.dest.number, e.kind)
+                   for e in cfg.graph.edges)
+    assert edges == [(i + 1, source, dest, EDGE2NAME[kind])
+                     for i, (source, dest, kind) in enumerate(flow.edges())]
+    for block, node in cfg.block_nodes.items():
+        assert node.bb is block
+        pass
+    assert cfg.offset2block is cfg.offset2block
+    for offset, node in cfg.offset2block.items():
+        assert node.bb.start_offset == offset, path
+        pass
+
+    # Written a line or so at a time, the same as the string
+    out = Writes()
+    assert cfg.graph.to_dot(True, out=out) is None
+    assert ''.join(out.writes) == cfg.graph.to_dot(True), path
+    assert len(out.writes) > len(cfg.graph.nodes) + len(cfg.graph.edges), path
+    pass
+print("%d flow graphs checked." % len(paths))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""Check dominance frontiers and iterated dominance frontiers against
+their definitions, on random graphs and on the examples."""
+import glob
+import os.path as osp
+import random
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.dominators import (
+    DominatorTree, IndexTree, UNSET,
+    dominance_frontiers, iterated_frontier)
+from control_flow.graph import FlowGraph
+
+def true_idom(successors, entry):
+    """Immediate dominators by the set definition"""
+    n = len(successors)
+    preds = [[] for v in range(n)]
+    for v, dests in enumerate(successors):
+        for w in dests:
+            preds[w].append(v)
+    reached = set([entry])
+    stack = [entry]
+    while stack:
+        v = stack.pop()
+        for w in successors[v]:
+            if w not in reached:
+                reached.add(w)
+                stack.append(w)
+    dom = dict((v, set(reached)) for v in reached)
+    dom[entry] = set([entry])
+    changed = True
+    while changed:
+        changed = False
+        for v in reached - set([entry]):
+            new = set.intersection(*[dom[p] for p in preds[v] if p in reached])
+            new.add(v)
+            if new != dom[v]:
+                dom[v] = new
+                changed = True
+    idom = [UNSET] * n
+    idom[entry] = entry
+    for v in reached - set([entry]):
+        strict = dom[v] - set([v])
+        idom[v] = [d for d in strict if dom[d] == strict][0]
+    return idom, dom
+
+def frontier_by_definition(successors, dom):
+    """DF(x) is the set of y where x dominates a predecessor of y
+    but doesn't strictly dominate y"""
+    df = dict((v, set()) for v in dom)
+    for p in dom:
+        for y in successors[p]:
+            for x in dom[p]:
+                if x == y or x not in dom[y]:
+                    df[x].add(y)
+    return df
+
+def iterated_by_definition(df, nodes):
+    result = set()
+    work = list(nodes)
+    while work:
+        for y in df.get(work.pop(), ()):
+            if y not in result:
+                result.add(y)
+                work.append(y)
+    return result
+
+rnd = random.Random(12)
+for i in range(1000):
+    n = rnd.randint(1, 25)
+    successors = [sorted(set(rnd.randrange(n) for j in range(rnd.choice([0, 1, 2, 2, 3]))))
+                  for v in range(n)]
+    graph = FlowGraph(successors)
+    for post_dom in (False, True):
+        if post_dom:
+            flow = [list(graph.predecessors(v)) for v in range(n)]
+        else:
+            flow = successors
+        idom, dom = true_idom(flow, rnd.randrange(n))
+        tree = IndexTree(idom)
+        frontiers = dominance_frontiers(graph, idom, post_dom, tree)
+        expected = frontier_by_definition(flow, dom)
+        for v in range(n):
+            assert sorted(frontiers[v]) == sorted(expected.get(v, ())), (i, post_dom, v)
+            pass
+        for k in range(3):
+            nodes = rnd.sample(range(n), rnd.randint(1, n))
+            assert (iterated_frontier(graph, idom, nodes, post_dom, tree) ==
+                    sorted(iterated_by_definition(expected, nodes))), (i, post_dom, nodes)
+            pass
+        pass
+    pass
+
+tree = IndexTree([0, 0, 0, 1, UNSET, 3])
+assert list(tree.level) == [0, 1, 1, 2, -1, 3]
+assert tree.roots == [0]
+assert list(tree.children[tree.child_start[0]:tree.child_start[1]]) == [1, 2]
+
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+    dom = DominatorTree(cfg)
+    successors = [list(cfg.flow.successors(v)) for v in range(cfg.flow.n)]
+    idom, doms = true_idom(successors, cfg.entry_node.number)
+    assert list(dom.idom) == idom, path
+    expected = frontier_by_definition(successors, doms)
+    blocks = cfg.blocks
+    assert dom.df == dict((blocks[v], set(blocks[y] for y in frontier))
+                          for v, frontier in expected.items()), path
+    assert set(dom.pdf) == set(dom.pdoms), path
+    assert dom.iterated_frontier(blocks[:1]) == [
+        blocks[y] for y in sorted(iterated_by_definition(expected, [0]))], path
+    pass
+print("%d examples checked." % len(paths))
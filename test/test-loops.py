@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Check loop nesting forests against natural loops on reducible
+graphs, irreducible loop detection, and that deep graphs are handled
+without recursion."""
+import glob
+import os.path as osp
+import random
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.dominators import semi_nca_dominators
+from control_flow.graph import FlowGraph
+from control_flow.loops import (
+    LoopForest, LOOP_NONE, LOOP_SELF, LOOP_REDUCIBLE, LOOP_IRREDUCIBLE)
+from control_flow.traversals import DepthFirst
+
+def dominates(idom, a, b):
+    while b != a:
+        if idom[b] == b or idom[b] < 0:
+            return False
+        b = idom[b]
+    return True
+
+def natural_loop(graph, source, header, reached):
+    """The header plus the reached blocks that reach `source` without
+    going through `header`"""
+    body = set([header, source])
+    work = [source]
+    while work:
+        v = work.pop()
+        if v == header:
+            continue
+        for p in graph.predecessors(v):
+            if p not in body and reached[p] >= 0:
+                body.add(p)
+                work.append(p)
+    return body
+
+def check(graph, root, where):
+    n = graph.n
+    loops = LoopForest(graph, root)
+    dfs = DepthFirst(graph, root)
+    idom = semi_nca_dominators(graph, root, False, exact=True)[0]
+    reducible = all(dominates(idom, w, v) for v, w in loops.back_edges)
+    assert reducible == (LOOP_IRREDUCIBLE not in loops.kind), where
+
+    for v, w in loops.back_edges:
+        assert loops.is_header(w), where
+    for v in range(n):
+        if dfs.pre_number[v] < 0:
+            assert loops.loop[v] == -1 and loops.depth[v] == 0, where
+            continue
+        # Depth counts the headers of the loops around v
+        h, depth = loops.loop[v], 0
+        while h >= 0:
+            assert loops.in_loop(v, h), where
+            depth += 1
+            h = loops.parent_loop[h]
+        assert loops.depth[v] == depth, where
+    for h in loops.headers:
+        body = set(loops.body(h))
+        assert all(loops.in_loop(v, h) for v in body), where
+        expected = [(v, w) for v in sorted(body) for w in graph.successors(v)
+                    if w not in body]
+        assert sorted(loops.exits[h]) == expected, where
+        if loops.kind[h] == LOOP_SELF:
+            assert body == set([h]), where
+        if reducible:
+            natural = set()
+            for v, w in loops.back_edges:
+                if w == h:
+                    natural |= natural_loop(graph, v, h, dfs.pre_number)
+            assert body == natural, where
+            assert loops.kind[h] in (LOOP_SELF, LOOP_REDUCIBLE), where
+        pass
+    return reducible
+
+#   0 -> 1 -> 2 -> 3 -> 4
+#        ^    ^----/    |
+#        \-------------/
+# with 5 a self loop, and 6 -> 7 -> 6 entered at both 6 and 7
+graph = FlowGraph([[1, 5, 6, 7], [2], [3], [2, 4], [1], [5], [7], [6]])
+loops = LoopForest(graph, 0)
+assert loops.headers == [1, 2, 5, 6]
+assert [loops.kind[v] for v in (0, 1, 2, 5, 6, 7)] == [
+    LOOP_NONE, LOOP_REDUCIBLE, LOOP_REDUCIBLE, LOOP_SELF, LOOP_IRREDUCIBLE, LOOP_NONE]
+assert list(loops.loop) == [-1, 1, 2, 2, 1, 5, 6, 6]
+assert list(loops.parent_loop) == [-1, -1, 1, -1, -1, -1, -1, -1]
+assert list(loops.depth) == [0, 1, 2, 2, 1, 1, 1, 1]
+assert loops.body(1) == [1, 2, 3, 4]
+assert loops.exits == {1: [], 2: [(3, 4)], 5: [], 6: []}
+assert loops.is_irreducible(6) and not loops.is_irreducible(1)
+assert not loops.in_loop(0, 1) and not loops.in_loop(1, 0)
+
+rnd = random.Random(18)
+irreducible = 0
+for i in range(2000):
+    n = rnd.randint(1, 25)
+    successors = [sorted(set(rnd.randrange(n) for j in range(rnd.choice([0, 1, 1, 2, 3]))))
+                  for v in range(n)]
+    if not check(FlowGraph(successors), rnd.randrange(n), i):
+        irreducible += 1
+    pass
+assert 0 < irreducible < 2000
+
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+    assert cfg.loops() is cfg.loops()
+    check(cfg.flow, cfg.entry_node.number, path)
+    # The body of while-break1 always breaks, so it never loops
+    name = osp.basename(path)
+    if ('while' in name or 'for' in name) and name != 'while-break1.py':
+        assert cfg.loops().headers, path
+    pass
+
+# Loops nested far deeper than the recursion limit
+n = 30000
+successors = [[v + 1] for v in range(n - 1)] + [[]]
+for v in range(1, n // 2):
+    successors[n - v].append(v)
+graph = FlowGraph(successors)
+loops = LoopForest(graph, 0)
+assert loops.depth[n // 2] == n // 2 - 1
+print("%d examples checked." % len(paths))
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""Check analyze_module() over a small module with nested code objects."""
+from control_flow.module import analyze_module, code_objects
+
+SOURCE = '''
+class A:
+    def f(self, x):
+        g = lambda y: [z for z in y]
+        def inner():
+            return x
+        return inner
+def f(a):
+    if a:
+        return 1
+    return 2
+def f(a):
+    return 3
+'''
+
+module_code = compile(SOURCE, '<test>', 'exec')
+names = [name for name, co in code_objects(module_code)]
+assert names == ['<module>', 'A', 'A.f',
+                 'A.f.<locals>.<lambda>',
+                 'A.f.<locals>.<lambda>.<locals>.<listcomp>',
+                 'A.f.<locals>.inner', 'f', 'f#2'], names
+
+result = analyze_module(module_code)
+assert list(result.keys()) == names
+for name, analysis in result.items():
+    assert analysis.error is None, (name, analysis.error)
+    assert analysis.cfg.blocks is analysis.bb_mgr.bb_list
+    pass
+# The code objects of the two "f"s have different shapes
+assert len(result['f'].bb_mgr.bb_list) > len(result['f#2'].bb_mgr.bb_list)
+print("%d code objects analyzed." % len(result))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Check rendering dot files in parallel, skipping unchanged ones and
+reporting failures, with a stand-in for Graphviz dot."""
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import time
+from control_flow.render import Renderer, STAMP_SUFFIX
+
+# Takes dot's -T, -o options and the input file. It copies the input,
+# after a pause, and fails on input saying "fail".
+FAKE_DOT = '''
+import sys, time
+fmt, out_path, dot_path = sys.argv[1][2:], sys.argv[3], sys.argv[4]
+text = open(dot_path).read()
+time.sleep(%f)
+if "fail" in text:
+    sys.stderr.write("syntax error")
+    sys.exit(1)
+open(out_path, "w").write(fmt + ":" + text)
+'''
+
+PAUSE = 0.3
+workers = 4
+tmpdir = tempfile.mkdtemp()
+try:
+    fake_dot = osp.join(tmpdir, 'fake_dot.py')
+    with open(fake_dot, 'w') as f:
+        f.write(FAKE_DOT % PAUSE)
+    program = [sys.executable, fake_dot]
+
+    def write(name, text):
+        path = osp.join(tmpdir, name + '.dot')
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    paths = [write('g%d' % i, 'digraph G%d {}' % i) for i in range(2 * workers)]
+    bad = write('bad', 'fail')
+
+    def render_all(fmt='png'):
+        start = time.time()
+        with Renderer(workers, fmt, program) as renderer:
+            futures = [renderer.render(path) for path in paths + [bad]]
+        results = [future.result() for future in futures]
+        return results, renderer.failures, time.time() - start
+
+    results, failures, elapsed = render_all()
+    for path, result in zip(paths, results):
+        assert result.rendered and result.error is None, result
+        assert result.out_path == path[:-len('.dot')] + '.png'
+        assert open(result.out_path).read() == 'png:' + open(path).read()
+        assert osp.exists(result.out_path + STAMP_SUFFIX)
+    # A failure is reported, not raised, and leaves no stamp
+    assert failures == [results[-1]]
+    assert 'syntax error' in failures[0].error
+    assert not osp.exists(failures[0].out_path + STAMP_SUFFIX)
+    # Bounded by the number of workers, not the number of files
+    assert elapsed < (len(paths) + 1) * PAUSE * 0.75, elapsed
+
+    # Nothing changed, so nothing is rendered but the failure
+    results, failures, elapsed = render_all()
+    assert [result.rendered for result in results] == [False] * (len(paths) + 1)
+    assert len(failures) == 1
+
+    # A changed file is rendered again, as is a new format
+    write('g0', 'digraph changed {}')
+    results, failures, elapsed = render_all()
+    assert [result.rendered for result in results[:2]] == [True, False]
+    results, failures, elapsed = render_all('svg')
+    assert all(result.rendered for result in results[:-1])
+
+    # A missing program is a failure too
+    with Renderer(1, 'png', osp.join(tmpdir, 'no-such-dot')) as renderer:
+        os.remove(paths[1][:-len('.dot')] + '.png')
+        result = renderer.render(paths[1]).result()
+    assert not result.rendered and result.error and renderer.failures == [result]
+finally:
+    shutil.rmtree(tmpdir)
+print("%d files rendered." % len(paths))
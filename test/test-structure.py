@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Check that building control structures is silent unless traced,
+and that structures of long functions are built, printed and recorded
+without recursion."""
+import contextlib
+import glob
+import io
+import os.path as osp
+import sys
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.module import structure_record
+from control_flow.structured_cf import (
+    build_control_structure, cs_tree_to_str, PrintTracer, StructureTracer)
+
+recursion_limit = sys.getrecursionlimit()
+
+def structure(lines):
+    ns = {}
+    exec('\n'.join(lines), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['long']))
+    return cfg, build_control_structure(cfg, cfg.entry_node)
+
+class Recorder(StructureTracer):
+    def __init__(self):
+        self.events = []
+
+    def visit(self, block, parent_kind, depth):
+        self.events.append(('visit', block.number, parent_kind, depth))
+
+    def classify(self, block, kind, depth):
+        self.events.append(('classify', block.number, kind, depth))
+
+def kinds(record):
+    """The kinds in a structure record, in the order cs_tree_to_str()
+    shows them"""
+    result = []
+    stack = [record]
+    while stack:
+        record = stack.pop()
+        if isinstance(record, list):
+            stack.extend(reversed(record))
+        elif record is not None:
+            result.append(record['kind'])
+            stack.extend(reversed(record['children']))
+    return result
+
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    structures = []
+    for tracer in (None, Recorder(), PrintTracer(io.StringIO())):
+        cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            cs = build_control_structure(cfg, cfg.entry_node, tracer)
+        assert out.getvalue() == '', path
+        structures.append(cs_tree_to_str(cs, {}))
+        if isinstance(tracer, Recorder):
+            events = tracer.events
+        elif tracer is not None:
+            trace = tracer.out.getvalue().splitlines()
+        pass
+    # Tracing doesn't change the result
+    assert structures[0] == structures[1] == structures[2], path
+    visits = [event for event in events if event[0] == 'visit']
+    assert len(trace) == len(visits), path
+    assert visits[0] == ('visit', cfg.entry_node.number, 'sequence', 0), path
+    # Each visit is classified, after any visits it makes first
+    assert sorted(event[1] for event in events if event[0] == 'classify') == sorted(
+        event[1] for event in visits), path
+    pass
+
+# An elif chain nests each test inside the one before
+n = 1500
+lines = ['def long(a):']
+for i in range(n):
+    lines += ['    %s a == %d:' % ('elif' if i else 'if', i), '        a += %d' % i]
+lines.append('    return a')
+cfg, cs = structure(lines)
+assert len(cfg.blocks) > 2 * n
+cs_marks = {}
+text = cs_tree_to_str(cs, cs_marks)
+shown = [line.split()[0] for line in text.splitlines()
+         if not line.lstrip().startswith('end ')]
+assert kinds(structure_record(cs)) == shown
+assert shown.count('if') == sum(marks.count('if') for marks in cs_marks.values())
+depth = max(len(line) - len(line.lstrip()) for line in text.splitlines()) // 2
+assert depth > recursion_limit, depth
+
+# Many statements in a row
+lines = ['def long(a):']
+for i in range(n):
+    lines += ['    if a == %d:' % i, '        a += 1']
+lines.append('    return a')
+cfg, cs = structure(lines)
+assert kinds(structure_record(cs))[0] == cs_tree_to_str(cs, {}).split()[0]
+
+assert sys.getrecursionlimit() == recursion_limit
+print("%d blocks structured." % len(cfg.blocks))
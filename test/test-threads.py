@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""Check that analyses running concurrently in threads don't interfere
+with each other: block, node and edge numbering is per analysis."""
+import os.path as osp
+from concurrent.futures import ThreadPoolExecutor
+from control_flow.batch import analyze_paths, find_files
+from control_flow.module import analyze_module, analysis_record
+
+mydir = osp.dirname(osp.abspath(__file__))
+files = list(find_files([osp.join(mydir, '..', 'examples'),
+                         osp.join(mydir, '..', 'control_flow')]))
+
+def records(path):
+    result = analyze_module(path)
+    edge_ids = {}
+    for name, analysis in result.items():
+        if analysis.cfg is not None:
+            edge_ids[name] = sorted(edge.id for edge in analysis.cfg.graph.edges)
+    return ([(name, analysis_record(analysis)) for name, analysis in result.items()],
+            edge_ids)
+
+want = [records(path) for path in files]
+with ThreadPoolExecutor(8) as executor:
+    for i in range(3):
+        got = list(executor.map(records, files))
+        assert got == want
+        pass
+
+for ids_by_name in [edge_ids for r, edge_ids in want]:
+    for ids in ids_by_name.values():
+        assert ids == list(range(1, len(ids) + 1))
+
+threaded = sorted(analyze_paths(files, max_workers=4, use_threads=True))
+processes = sorted(analyze_paths(files, max_workers=2))
+assert threaded == processes
+print("%d files checked." % len(files))
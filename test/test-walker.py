@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Check the orders that Walker goes over edges in, edge kind
+filtering and stopping early, and that big graphs are walked
+quickly."""
+import glob
+import os.path as osp
+from xdis import PYTHON_VERSION, IS_PYPY
+from control_flow.bb import basic_blocks
+from control_flow.cfg import ControlFlowGraph
+from control_flow.graph import DiGraph
+from control_flow.traversals import EdgeVisitor, Walker
+
+
+class Block(object):
+    """Just enough of a basic block for a Node"""
+    def __init__(self, number):
+        self.number = number
+        self.flags = set()
+
+
+class Recorder(EdgeVisitor):
+    def __init__(self, stop_at=None):
+        self.edges = []
+        self.ids = []
+        self.stop_at = stop_at
+
+    def visit(self, edge):
+        self.edges.append((edge.source.number, edge.dest.number))
+        self.ids.append(edge.id)
+        return edge.dest.number == self.stop_at
+
+
+def make_graph(n, edges):
+    g = DiGraph()
+    nodes = [g.make_add_node(Block(v)) for v in range(n)]
+    for source, dest, kind in edges:
+        g.make_add_edge(nodes[source], nodes[dest], kind)
+    return g, nodes
+
+#   0 -> 1 -> 3 -> 1
+#    \-> 2 -/
+#   2 -> 4 is an exception edge
+g, nodes = make_graph(5, [(0, 1, 'forward'), (0, 2, 'forward'),
+                          (1, 3, 'forward'), (2, 3, 'forward'),
+                          (3, 1, 'backward'), (2, 4, 'exception')])
+
+def walk(order, skip_kinds=(), stop_at=None):
+    recorder = Recorder(stop_at)
+    stopped = Walker(g, recorder, order, skip_kinds).traverse(nodes[0])
+    return recorder.edges, stopped
+
+assert walk('dfs') == ([(0, 1), (1, 3), (3, 1), (0, 2), (2, 3), (2, 4)], False)
+assert walk('bfs') == ([(0, 1), (0, 2), (1, 3), (2, 3), (2, 4), (3, 1)], False)
+assert walk('rpo') == ([(0, 1), (0, 2), (2, 3), (2, 4), (1, 3), (3, 1)], False)
+assert walk('bfs', skip_kinds=['exception'])[0] == [(0, 1), (0, 2), (1, 3), (2, 3), (3, 1)]
+assert walk('dfs', stop_at=3) == ([(0, 1), (1, 3)], True)
+assert walk('rpo', stop_at=4) == ([(0, 1), (0, 2), (2, 3), (2, 4)], True)
+try:
+    Walker(g, Recorder(), 'random')
+except ValueError:
+    pass
+else:
+    assert False, "Unknown order should be rejected"
+
+# Each edge reached is visited once in every order
+my_dir = osp.dirname(osp.abspath(__file__))
+paths = sorted(glob.glob(osp.join(my_dir, '..', 'examples', '*.py')))
+for path in paths:
+    ns = {}
+    exec(open(path).read(), ns)
+    cfg = ControlFlowGraph(basic_blocks(PYTHON_VERSION, IS_PYPY, ns['testing']))
+    entry = cfg.block_nodes[cfg.entry_node]
+    results = []
+    for order in Walker.ORDERS:
+        recorder = Recorder()
+        Walker(cfg.graph, recorder, order).traverse(entry)
+        assert len(recorder.ids) == len(set(recorder.ids)), (path, order)
+        results.append(sorted(recorder.ids))
+        pass
+    assert results[0] == results[1] == results[2], path
+    pass
+
+# A ladder with 60000 edges, far deeper than the recursion limit
+n = 30000
+g, nodes = make_graph(n, [(v, v + d, 'forward') for v in range(n - 2) for d in (1, 2)])
+for order in Walker.ORDERS:
+    recorder = Recorder()
+    Walker(g, recorder, order).traverse(nodes[0])
+    assert len(recorder.edges) == 2 * (n - 2), order
+    pass
+print("%d examples walked." % len(paths))